@@ -0,0 +1,212 @@
+"""
+Resolved agent configuration cache.
+
+Resolving a SessionAgent into an orchestrator.AgentNode (effective prompt,
+model, temperature, tool bindings, provider credentials) joins SessionAgent →
+Agent → skills → tools (+ skills_tools.config) → LLM → Provider. `resolve`
+keeps the result in an LRU with a TTL (GPOST_AGENT_CACHE_SIZE /
+GPOST_AGENT_CACHE_TTL), so a chat turn only runs that join for session agents
+it has not seen recently.
+
+Every entry is tagged with the ids of the rows it was built from; the write
+routes call `invalidate(<id>)` after committing. With
+GPOST_AGENT_CACHE_REDIS_URL set (requires the `redis` package), invalidations
+are also published on a Redis channel so every uvicorn worker drops the
+entries — otherwise other workers see the change once the TTL expires.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import jsoncodec, models
+from .orchestrator import AgentNode, resolve_agent
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: only needed for cross-process invalidation
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+AGENT_CACHE_SIZE = int(os.getenv("GPOST_AGENT_CACHE_SIZE", "1024"))
+AGENT_CACHE_TTL = float(os.getenv("GPOST_AGENT_CACHE_TTL", "300"))
+AGENT_CACHE_REDIS_URL = os.getenv("GPOST_AGENT_CACHE_REDIS_URL", "")
+INVALIDATION_CHANNEL = os.getenv("GPOST_AGENT_CACHE_CHANNEL", "gpost:agent-cache")
+
+RESOLVE_OPTIONS = (
+    selectinload(models.SessionAgent.original_agent)
+    .selectinload(models.Agent.skills).selectinload(models.Skill.tools),
+    selectinload(models.SessionAgent.original_agent)
+    .joinedload(models.Agent.model).joinedload(models.LLM.provider),
+)
+
+_MISSING = object()
+_WORKER_ID = uuid.uuid4().hex
+
+
+class _Entry:
+    __slots__ = ("node", "tags", "expires")
+
+    def __init__(self, node: Optional[AgentNode], tags: Set[str], expires: float):
+        self.node = node
+        self.tags = tags
+        self.expires = expires
+
+
+_entries: "OrderedDict[str, _Entry]" = OrderedDict()
+_by_tag: Dict[str, Set[str]] = {}
+# Bumped by every invalidation; a resolve that started before one does not cache its result
+_generation = 0
+_redis = None
+_listener: Optional[asyncio.Task] = None
+
+
+def _tags(session_agent) -> Set[str]:
+    tags = {session_agent.id}
+    agent = session_agent.original_agent
+    if agent is not None:
+        tags.add(agent.id)
+        for skill in agent.skills:
+            tags.add(skill.id)
+            tags.update(tool.id for tool in skill.tools)
+        if agent.model is not None:
+            tags.add(agent.model.id)
+            tags.add(agent.model.provider_id)
+    return tags
+
+
+def _drop(key: str):
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    for tag in entry.tags:
+        keys = _by_tag.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _by_tag[tag]
+
+
+def get(session_agent_id: str):
+    """Cached AgentNode (or None for an unusable agent), or _MISSING."""
+    entry = _entries.get(session_agent_id)
+    if entry is None:
+        return _MISSING
+    if entry.expires < time.monotonic():
+        _drop(session_agent_id)
+        return _MISSING
+    _entries.move_to_end(session_agent_id)
+    return entry.node
+
+
+def put(session_agent_id: str, node: Optional[AgentNode], tags: Set[str], generation: int):
+    if generation != _generation:
+        return
+    _drop(session_agent_id)
+    _entries[session_agent_id] = _Entry(node, tags, time.monotonic() + AGENT_CACHE_TTL)
+    for tag in tags:
+        _by_tag.setdefault(tag, set()).add(session_agent_id)
+    while len(_entries) > AGENT_CACHE_SIZE:
+        _drop(next(iter(_entries)))
+
+
+def invalidate_local(tags: Iterable[str]):
+    global _generation
+    _generation += 1
+    for tag in tags:
+        for key in list(_by_tag.get(tag, ())):
+            _drop(key)
+
+
+async def invalidate(*tags: str):
+    """Drop every entry built from one of these row ids, here and (if configured) in other workers."""
+    invalidate_local(tags)
+    if _redis is not None:
+        try:
+            await _redis.publish(INVALIDATION_CHANNEL, jsoncodec.dumps({"origin": _WORKER_ID, "tags": list(tags)}))
+        except Exception as e:
+            logger.warning("Agent cache invalidation not published: %s", e)
+
+
+async def resolve(db: AsyncSession, session_agents: list) -> List[AgentNode]:
+    """Runnable AgentNodes of these session agents, in order; unusable ones are left out."""
+    found: Dict[str, Optional[AgentNode]] = {}
+    misses = []
+    for sa in session_agents:
+        node = get(sa.id)
+        if node is _MISSING:
+            misses.append(sa.id)
+        else:
+            found[sa.id] = node
+
+    if misses:
+        generation = _generation
+        rows = await db.scalars(
+            select(models.SessionAgent).options(*RESOLVE_OPTIONS)
+            .where(models.SessionAgent.id.in_(misses))
+            .execution_options(populate_existing=True)
+        )
+        rows = rows.all()
+        skill_ids = {skill.id for sa in rows if sa.original_agent for skill in sa.original_agent.skills}
+        tool_configs = {}
+        if skill_ids:
+            bindings = await db.execute(
+                select(models.skills_tools.c.skill_id, models.skills_tools.c.tool_id, models.skills_tools.c.config)
+                .where(models.skills_tools.c.skill_id.in_(skill_ids), models.skills_tools.c.config.isnot(None))
+            )
+            tool_configs = {(skill_id, tool_id): config for skill_id, tool_id, config in bindings}
+        for sa in rows:
+            node = found[sa.id] = resolve_agent(sa, tool_configs)
+            put(sa.id, node, _tags(sa), generation)
+
+    return [found[sa.id] for sa in session_agents if found.get(sa.id) is not None]
+
+
+async def _listen():
+    while True:
+        try:
+            pubsub = _redis.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = jsoncodec.loads(message["data"])
+                if data.get("origin") != _WORKER_ID:
+                    invalidate_local(data.get("tags") or [])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Entries may be stale while disconnected; flush them once reconnected
+            logger.warning("Agent cache invalidation channel lost, reconnecting: %s", e)
+            await asyncio.sleep(1)
+            invalidate_local(list(_by_tag))
+
+
+async def start():
+    """Connect the cross-process invalidation channel, if configured (app startup)."""
+    global _redis, _listener
+    if not AGENT_CACHE_REDIS_URL:
+        return
+    if aioredis is None:
+        raise RuntimeError("GPOST_AGENT_CACHE_REDIS_URL is set but the redis package is not installed")
+    _redis = aioredis.from_url(AGENT_CACHE_REDIS_URL)
+    _listener = asyncio.create_task(_listen())
+
+
+async def stop():
+    global _redis, _listener
+    if _listener is not None:
+        _listener.cancel()
+        await asyncio.gather(_listener, return_exceptions=True)
+        _listener = None
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,86 @@
+"""
+One agent reply streamed from the provider (a cache miss) versus replayed
+from the completion cache's memory and disk tiers.
+
+    uvicorn backend.stub_llm:app --port 9999
+    python -m backend.benchmarks.completion_cache --turns 5
+
+Runs orchestrator._stream_agent for a temperature-0 agent with
+cache_completions set, against the stub LLM (or any OpenAI-compatible
+--base-url), with a throwaway cache file. Every turn sends a new prompt
+(miss), then the same prompt again (memory hit), then again with the memory
+tier emptied (disk hit). Reports time to first chunk and to the full reply;
+hits are paced by GPOST_COMPLETION_CACHE_CHUNK_DELAY, or --chunk-delay.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from backend import completion_cache, orchestrator, provider_clients
+from backend.orchestrator import AgentNode
+from backend.streaming import TextChunk
+
+
+async def _turn(node: AgentNode, messages: list):
+    out: asyncio.Queue = asyncio.Queue()
+    started = time.perf_counter()
+    task = asyncio.create_task(orchestrator._stream_agent(node, messages, out))
+    first = None
+    while not task.done() or not out.empty():
+        try:
+            ev = await asyncio.wait_for(out.get(), 0.05)
+        except asyncio.TimeoutError:
+            continue
+        if first is None and isinstance(ev, TextChunk):
+            first = time.perf_counter() - started
+    text = await task
+    return first or 0.0, time.perf_counter() - started, text
+
+
+def _row(label: str, samples: list):
+    firsts = [s[0] * 1000 for s in samples]
+    totals = [s[1] * 1000 for s in samples]
+    print(f"  {label:<12} first chunk {statistics.median(firsts):8.1f} ms   full reply {statistics.median(totals):8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:9999/v1")
+    parser.add_argument("--model", default="stub-0")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--chunk-delay", type=float, default=None)
+    args = parser.parse_args()
+    if args.chunk_delay is not None:
+        completion_cache.COMPLETION_CACHE_CHUNK_DELAY = args.chunk_delay
+
+    node = AgentNode("bench", "bench", "Bench", args.model, 0.0, "Answer exactly.", args.base_url, "x",
+                     provider_id="bench", cache_completions=True)
+    results = {"miss": [], "memory hit": [], "disk hit": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        completion_cache.COMPLETION_CACHE_PATH = os.path.join(tmp, "completions.db")
+        for turn in range(args.turns):
+            messages = [{"role": "system", "content": node.system_prompt},
+                        {"role": "user", "content": f"question {turn}"}]
+            first, total, text = await _turn(node, messages)
+            results["miss"].append((first, total))
+            first, total, cached = await _turn(node, messages)
+            results["memory hit"].append((first, total))
+            completion_cache._memory.clear()
+            completion_cache._memory_bytes = 0
+            first, total, from_disk = await _turn(node, messages)
+            results["disk hit"].append((first, total))
+            assert text == cached == from_disk
+        print(f"{args.turns} turns, replay chunk delay {completion_cache.COMPLETION_CACHE_CHUNK_DELAY * 1000:.1f} ms")
+        for label, samples in results.items():
+            _row(label, samples)
+        stats = await completion_cache.stats()
+        print({k: stats[k] for k in ("memory_hits", "disk_hits", "misses", "stores", "hit_ratio")})
+        completion_cache.stop()
+    await provider_clients.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Regression check: the statement count of the agent and skill listings must
+not grow with the number of rows (an N+1 query came back). `check` raises
+AssertionError when it does; run as a script, it prints the counts and exits
+non-zero.
+
+    python -m backend.benchmarks.listing_queries --small 5 --large 50
+    pnpm check:queries
+
+Runs in a throwaway SQLite database migrated to head. Each fixture has the
+given number of agents, each with its own skills and tools, a model and a
+provider, and the listings are requested through the app (GET /api/agents,
+/api/agents?view=slim, /api/skills) while every statement sent to the
+database is counted.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+ROUTES = ("/api/agents", "/api/agents?view=slim", "/api/skills")
+
+
+async def _fill(SessionLocal, models, agents: int, skills_per_agent: int, tools_per_skill: int):
+    async with SessionLocal() as db:
+        provider = models.Provider(name="bench", base_url="http://127.0.0.1:9/v1")
+        db.add(provider)
+        await db.flush()
+        for i in range(agents):
+            llm = models.LLM(provider_id=provider.id, remote_id=f"model-{i}", is_llm=True)
+            skills = []
+            for j in range(skills_per_agent):
+                tools = [models.Tool(name=f"tool-{i}-{j}-{k}", schema={"type": "object"})
+                         for k in range(tools_per_skill)]
+                skills.append(models.Skill(name=f"skill-{i}-{j}", prompt="p", tools=tools))
+            db.add(models.Agent(name=f"agent-{i}", model=llm, skills=skills))
+        await db.commit()
+
+
+async def _count(client, engines) -> dict:
+    from sqlalchemy import event
+
+    counts = {}
+    for route in ROUTES:
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for engine in engines:
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+        try:
+            response = await client.get(route)
+            response.raise_for_status()
+        finally:
+            for engine in engines:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+        counts[route] = (len(statements), len(response.json()))
+    return counts
+
+
+async def _run(small: int, large: int, skills: int, tools: int) -> list:
+    import httpx
+    from sqlalchemy import delete
+
+    from backend import models
+    from backend.database import SessionLocal, engine, init_db, read_engine
+    from backend.main import app
+
+    await init_db()
+    engines = [engine] if read_engine is engine else [engine, read_engine]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for agents in (small, large):
+            async with SessionLocal() as db:
+                for table in (models.agents_skills, models.skills_tools):
+                    await db.execute(delete(table))
+                for model in (models.Agent, models.Skill, models.Tool, models.LLM, models.Provider):
+                    await db.execute(delete(model))
+                await db.commit()
+            await _fill(SessionLocal, models, agents, skills, tools)
+            results.append(await _count(client, engines))
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+    return results
+
+
+def measure(small: int = 5, large: int = 50, skills: int = 3, tools: int = 2) -> list:
+    """{route: (statements, rows)} for each fixture size, in a throwaway database."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # the app's database lives in the working directory
+        try:
+            return asyncio.run(_run(small, large, skills, tools))
+        finally:
+            os.chdir(cwd)
+
+
+def assert_constant(results: list, large: int, skills: int):
+    """Raise AssertionError if a listing's statement count differs between the two fixtures."""
+    expected_rows = {"/api/agents": large, "/api/agents?view=slim": large, "/api/skills": large * skills}
+    for route in ROUTES:
+        (small_count, _), (large_count, large_rows) = results[0][route], results[1][route]
+        if large_rows != expected_rows[route]:
+            raise AssertionError(f"{route} returned {large_rows} rows, expected {expected_rows[route]}")
+        if large_count != small_count:
+            raise AssertionError(f"{route} sent {small_count} statements for the small fixture "
+                                 f"and {large_count} for the large one")
+
+
+def check(small: int = 5, large: int = 50, skills: int = 3, tools: int = 2) -> list:
+    """Measure both fixtures and assert that no listing's statement count grows with them."""
+    results = measure(small, large, skills, tools)
+    assert_constant(results, large, skills)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--small", type=int, default=5, help="agents in the small fixture")
+    parser.add_argument("--large", type=int, default=50, help="agents in the large fixture")
+    parser.add_argument("--skills", type=int, default=3, help="skills per agent")
+    parser.add_argument("--tools", type=int, default=2, help="tools per skill")
+    args = parser.parse_args()
+    results = measure(args.small, args.large, args.skills, args.tools)
+    print(f"{'route':<26} {'statements (rows)':>20} {'statements (rows)':>20}")
+    for route in ROUTES:
+        (small, small_rows), (large, large_rows) = results[0][route], results[1][route]
+        print(f"{route:<26} {small:>10} ({small_rows:>6}) {large:>10} ({large_rows:>6})")
+    try:
+        assert_constant(results, args.large, args.skills)
+    except AssertionError as e:
+        sys.exit(f"FAIL: {e}")
+    print("OK: statement counts do not grow with the number of agents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Query plans and latency of the hot chat/listing queries before and after the
+0003 index migration.
+
+    python -m backend.benchmarks.message_indexes --messages 1000000
+
+Builds a throwaway SQLite database migrated to 0002 (the pre-index schema),
+fills it with synthetic sessions and messages, measures each query, then
+upgrades to head and measures again.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from alembic import command
+from alembic.config import Config
+
+from backend.database import ALEMBIC_INI
+
+QUERIES = {
+    "chat history (session tail)": (
+        "SELECT * FROM messages WHERE session_id = :session_id AND msg_type = 'text' "
+        "ORDER BY created_at DESC LIMIT 20"
+    ),
+    "messages page (keyset)": (
+        "SELECT * FROM messages WHERE session_id = :session_id AND (created_at > :created_at "
+        "OR (created_at = :created_at AND id > :id)) ORDER BY created_at, id LIMIT 51"
+    ),
+    "session agents": "SELECT * FROM session_agents WHERE session_id = :session_id",
+    "sessions of a user": (
+        "SELECT * FROM sessions WHERE user_id = :user_id ORDER BY created_at, id LIMIT 51"
+    ),
+    "llms of a provider": "SELECT * FROM llms WHERE provider_id = :provider_id",
+}
+
+
+def _alembic(path: str, revision: str):
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    command.upgrade(cfg, revision)
+
+
+def _fill(conn: sqlite3.Connection, n_messages: int, n_sessions: int, n_users: int, n_providers: int):
+    rnd = random.Random(0)
+    start = datetime(2025, 1, 1)
+    providers = [str(uuid.uuid4()) for _ in range(n_providers)]
+    conn.executemany("INSERT INTO providers (id, name) VALUES (?, ?)", [(p, p[:8]) for p in providers])
+    conn.executemany(
+        "INSERT INTO llms (id, provider_id, remote_id, is_llm, created_at) VALUES (?, ?, ?, 1, ?)",
+        [(str(uuid.uuid4()), p, f"model-{i}", start) for p in providers for i in range(50)],
+    )
+    sessions = [str(uuid.uuid4()) for _ in range(n_sessions)]
+    conn.executemany(
+        "INSERT INTO sessions (id, title, user_id, status, created_at, updated_at) VALUES (?, ?, ?, 'active', ?, ?)",
+        [(s, s[:8], f"user-{rnd.randrange(n_users)}", start + timedelta(minutes=i), start)
+         for i, s in enumerate(sessions)],
+    )
+    conn.executemany(
+        "INSERT INTO session_agents (id, session_id) VALUES (?, ?)",
+        [(str(uuid.uuid4()), s) for s in sessions for _ in range(3)],
+    )
+    batch = []
+    for i in range(n_messages):
+        batch.append((
+            str(uuid.uuid4()), rnd.choice(sessions), "user" if i % 2 else "assistant",
+            f"message {i}", "text", (start + timedelta(seconds=i)).isoformat(sep=" "),
+        ))
+        if len(batch) == 50_000:
+            conn.executemany(
+                "INSERT INTO messages (id, session_id, role, content, msg_type, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO messages (id, session_id, role, content, msg_type, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+    conn.commit()
+    return sessions, providers
+
+
+def _measure(conn: sqlite3.Connection, params: dict, runs: int) -> dict:
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        timings = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=5_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--providers", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _alembic(path, "0002")
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        sessions, providers = _fill(conn, args.messages, args.sessions, args.users, args.providers)
+        print(f"filled {args.messages:,} messages / {args.sessions:,} sessions in {time.perf_counter() - t0:.1f}s")
+
+        session_id = sessions[len(sessions) // 2]
+        first = conn.execute(
+            "SELECT created_at, id FROM messages WHERE session_id = ? ORDER BY created_at, id LIMIT 1", (session_id,)
+        ).fetchone()
+        params = {
+            "session_id": session_id, "created_at": first[0], "id": first[1],
+            "user_id": "user-1", "provider_id": providers[0],
+        }
+
+        before = _measure(conn, params, args.runs)
+        conn.close()
+        _alembic(path, "head")
+        conn = sqlite3.connect(path)
+        conn.execute("ANALYZE")
+        after = _measure(conn, params, args.runs)
+        conn.close()
+
+    for name in QUERIES:
+        (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+        print(f"\n{name}: {ms_before:.3f} ms -> {ms_after:.3f} ms ({ms_before / max(ms_after, 1e-6):.0f}x)")
+        print(f"  before: {plan_before}")
+        print(f"  after:  {plan_after}")
+
+
+if __name__ == "__main__":
+    main()
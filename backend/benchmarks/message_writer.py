@@ -0,0 +1,79 @@
+"""
+Message persistence throughput: one commit per message (the old chat path)
+against message_writer's batched transactions, in both durability modes.
+
+    python -m backend.benchmarks.message_writer --sessions 50 --turns 20
+
+Runs in a throwaway SQLite database migrated to head. Every session writes
+its turns one after another (a user message, then the reply), and all
+sessions run concurrently, like parallel chats.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def _run(args):
+    from sqlalchemy import func, select
+
+    from backend import message_writer, models
+    from backend.database import SessionLocal, engine, init_db
+
+    await init_db()
+    async with SessionLocal() as db:
+        sessions = [models.Session(title=f"bench {i}") for i in range(args.sessions)]
+        db.add_all(sessions)
+        await db.commit()
+        session_ids = [s.id for s in sessions]
+
+    async def per_message(session_id: str):
+        for turn in range(args.turns):
+            for role in ("user", "assistant"):
+                async with SessionLocal() as db:
+                    db.add(models.Message(session_id=session_id, role=role, content=f"{role} {turn}", msg_type="text"))
+                    await db.commit()
+
+    async def batched(session_id: str, durable: bool):
+        for turn in range(args.turns):
+            for role in ("user", "assistant"):
+                row = message_writer.message_row(session_id, role, f"{role} {turn}")
+                await message_writer.write([row], durable=durable)
+
+    async def measure(label: str, make):
+        before = message_writer.stats()["batches"]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(make(s) for s in session_ids))
+        await asyncio.gather(*(message_writer.wait_session(s) for s in session_ids))
+        elapsed = time.perf_counter() - t0
+        count = args.sessions * args.turns * 2
+        commits = message_writer.stats()["batches"] - before or count
+        print(f"  {label:<24} {elapsed * 1000:7.0f} ms  {count / elapsed:8.0f} msgs/s  {commits:5d} commits")
+
+    print(f"{args.sessions} sessions x {args.turns} turns, flush interval "
+          f"{message_writer.MESSAGE_FLUSH_INTERVAL * 1000:g} ms")
+    await measure("commit per message", per_message)
+    message_writer.start()
+    await measure("writer, sync", lambda s: batched(s, True))
+    await measure("writer, async", lambda s: batched(s, False))
+    await message_writer.stop()
+
+    async with SessionLocal() as db:
+        total = await db.scalar(select(func.count()).select_from(models.Message))
+    print(f"  {total} messages stored")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # the app's database lives in the working directory
+        asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
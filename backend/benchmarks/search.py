@@ -0,0 +1,158 @@
+"""
+Full-text search (search.py, migration 0008) against the LIKE scan it
+replaces, on a synthetic SQLite history.
+
+    python -m backend.benchmarks.search --messages 1000000
+
+Builds a throwaway database migrated to head and fills it with messages of
+10-40 words drawn from a Zipf-distributed vocabulary, through the same
+triggers that index the app's writes (the fill rate includes indexing; the
+rate without the index is measured on a 0007 database for comparison). Then
+times ranked first pages for rare, mid-frequency and common words, an AND
+of two words, a prefix and a session-scoped query, next to
+`content LIKE '%word%'` for the same words.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from alembic import command
+from alembic.config import Config
+
+from backend import search
+from backend.database import ALEMBIC_INI
+
+VOCABULARY = 20_000
+PAGE = 20
+LIKE_SQL = (
+    "SELECT id FROM messages WHERE content LIKE :pattern {session_filter} "
+    "ORDER BY created_at DESC LIMIT :limit"
+)
+
+
+def _alembic(path: str, revision: str):
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    command.upgrade(cfg, revision)
+
+
+def _words():
+    rnd = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    seen = set()
+    while len(seen) < VOCABULARY:
+        seen.add("".join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))))
+    words = sorted(seen)
+    rnd.shuffle(words)
+    return words
+
+
+def _fill(conn: sqlite3.Connection, n_messages: int, n_sessions: int, words: list) -> list:
+    rnd = random.Random(0)
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    start = datetime(2025, 1, 1)
+    sessions = [str(uuid.uuid4()) for _ in range(n_sessions)]
+    conn.executemany(
+        "INSERT INTO sessions (id, title, user_id, status, created_at, updated_at) VALUES (?, ?, 'u', 'active', ?, ?)",
+        [(s, s[:8], start, start) for s in sessions],
+    )
+    batch = []
+    for i in range(n_messages):
+        content = " ".join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(10, 40)))
+        batch.append((
+            str(uuid.uuid4()), rnd.choice(sessions), "user" if i % 2 else "assistant",
+            content, "text", (start + timedelta(seconds=i)).isoformat(sep=" "),
+        ))
+        if len(batch) == 20_000 or i == n_messages - 1:
+            conn.executemany(
+                "INSERT INTO messages (id, session_id, role, content, msg_type, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.commit()
+            batch = []
+    return sessions
+
+
+def _time(conn: sqlite3.Connection, sql: str, params: dict, runs: int):
+    timings, rows = [], 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        rows = len(conn.execute(sql, params).fetchall())
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings), rows
+
+
+def _fill_rate(n: int, words: list, revision: str) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rate.db")
+        _alembic(path, revision)
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        _fill(conn, n, 100, words)
+        elapsed = time.perf_counter() - t0
+        conn.close()
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rate-sample", type=int, default=100_000, help="messages for the write-rate comparison")
+    args = parser.parse_args()
+    words = _words()
+
+    plain = _fill_rate(args.rate_sample, words, "0007")
+    indexed = _fill_rate(args.rate_sample, words, "head")
+    print(f"write rate ({args.rate_sample:,} messages): {plain:,.0f} msgs/s without the index, "
+          f"{indexed:,.0f} msgs/s with it ({plain / indexed:.1f}x slower)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _alembic(path, "head")
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        sessions = _fill(conn, args.messages, args.sessions, words)
+        print(f"filled {args.messages:,} messages in {time.perf_counter() - t0:.0f}s, "
+              f"database {os.path.getsize(path) / 2 ** 20:,.0f} MB")
+        conn.execute("INSERT INTO search_fts(search_fts) VALUES ('optimize')")
+        conn.commit()
+
+        session_id = sessions[0]
+        cases = [
+            (f"rare word ({words[15_000]})", words[15_000], None),
+            (f"mid word ({words[500]})", words[500], None),
+            (f"common word ({words[3]})", words[3], None),
+            (f"two words ({words[40]} {words[90]})", f"{words[40]} {words[90]}", None),
+            (f"prefix ({words[200][:3]}*)", words[200][:3], None),
+            (f"common word in a session ({words[3]})", words[3], session_id),
+        ]
+        print(f"\nfirst page of {PAGE}, median of {args.runs} runs")
+        for label, query, scope in cases:
+            fts_sql = search._SQLITE["message"].format(
+                score=search._SQLITE_SCORE, session_filter="AND m.session_id = :session_id" if scope else "",
+            )
+            params = {"match": search.fts5_match("message", query), "limit": PAGE, "offset": 0,
+                      "session_id": scope}
+            fts_ms, hits = _time(conn, fts_sql, params, args.runs)
+            like_sql = LIKE_SQL.format(session_filter="AND session_id = :session_id" if scope else "")
+            like_params = {"pattern": f"%{query.split()[0]}%", "limit": PAGE, "session_id": scope}
+            like_ms, _ = _time(conn, like_sql, like_params, max(1, args.runs // 2))
+            matches = conn.execute("SELECT count(*) FROM search_fts WHERE search_fts MATCH ?", (params["match"],)).fetchone()[0]
+            print(f"  {label:<42} {matches:>9,} matches  fts {fts_ms:8.2f} ms  like {like_ms:9.2f} ms "
+                  f"({like_ms / max(fts_ms, 1e-6):,.0f}x)  {hits} rows")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Throughput of skill code execution through skill_runner's warm pool, against
+starting a fresh process per call, and the cost of passing a large input
+through the pipe versus shared memory.
+
+    GPOST_SKILL_EXECUTION=1 python -m backend.benchmarks.skill_runner --calls 200 --concurrency 20 --input-mb 64
+
+The skill sums a list argument; the large-input run hands it --input-mb of
+bytes as `data`, and the skill reads the last byte.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from backend import skill_runner
+
+CODE = """
+def run(arguments, data):
+    if data is not None:
+        return data[-1]
+    return sum(arguments["xs"])
+"""
+
+
+def _cold_call(xs):
+    namespace = {}
+    exec(compile(CODE, "<skill>", "exec"), namespace)
+    return namespace["run"]({"xs": xs}, None)
+
+
+async def _cold(calls: int, concurrency: int) -> float:
+    ctx = skill_runner._mp_context()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            process = ctx.Process(target=_cold_call, args=([i, 1],))
+            await asyncio.to_thread(process.start)
+            await asyncio.to_thread(process.join)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - t0
+
+
+async def _warm(calls: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await skill_runner.run(CODE, {"xs": [i, 1]})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - t0
+
+
+async def _large(data: bytes, threshold: int, runs: int) -> float:
+    skill_runner.SKILL_SHM_THRESHOLD = threshold
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        await skill_runner.run(CODE, {}, data=data)
+    return (time.perf_counter() - t0) / runs
+
+
+async def _run(args):
+    await skill_runner.start()
+    await skill_runner.run(CODE, {"xs": [0]})  # compile and load once
+    print(f"{args.calls} calls, {args.concurrency} at a time, {skill_runner.SKILL_WORKERS} workers")
+    cold = await _cold(args.calls, args.concurrency)
+    warm = await _warm(args.calls, args.concurrency)
+    print(f"  process per call: {cold * 1000:.0f} ms ({args.calls / cold:.0f} calls/s)")
+    print(f"  warm pool:        {warm * 1000:.0f} ms ({args.calls / warm:.0f} calls/s, {cold / warm:.0f}x)")
+
+    data = bytes(args.input_mb << 20)
+    pipe = await _large(data, len(data) + 1, args.runs)
+    shared = await _large(data, 0, args.runs) if not skill_runner._CHROOTED else pipe
+    print(f"{args.input_mb} MB input")
+    print(f"  through the pipe:   {pipe * 1000:.1f} ms/call")
+    if skill_runner._CHROOTED:
+        print("  shared memory:      n/a, chrooted workers take every input through the pipe")
+    else:
+        print(f"  shared memory:      {shared * 1000:.1f} ms/call ({pipe / shared:.1f}x)")
+    print(skill_runner.stats())
+    await skill_runner.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--input-mb", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,120 @@
+"""
+Mixed read/write load on a SQLite file under the "basic" and "production"
+storage profiles (GPOST_SQLITE_PROFILE, see backend/database.py).
+
+    python -m backend.benchmarks.sqlite_profile --seconds 5 --writers 8 --readers 16
+
+Writers commit one message per transaction, like chat turns saving replies;
+readers page through a session's latest messages, like the chat window. Each
+profile runs in its own process (the engines are built at import) against a
+fresh database migrated to head.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def _workload(args) -> dict:
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+
+    from backend import models
+    from backend.database import ReadSessionLocal, SessionLocal, engine, init_db, read_engine
+
+    await init_db()
+    async with SessionLocal() as db:
+        sessions = [models.Session(title=f"bench {i}") for i in range(args.writers)]
+        db.add_all(sessions)
+        await db.commit()
+        session_ids = [s.id for s in sessions]
+
+    deadline = time.perf_counter() + args.seconds
+    writes, errors, read_latencies = [0], [0], []
+
+    async def writer(session_id: str):
+        n = 0
+        while time.perf_counter() < deadline:
+            try:
+                async with SessionLocal() as db:
+                    db.add(models.Message(session_id=session_id, role="assistant", content=f"reply {n} " * 20))
+                    await db.commit()
+                writes[0] += 1
+            except OperationalError:  # "database is locked"
+                errors[0] += 1
+            n += 1
+
+    async def reader(i: int):
+        session_id = session_ids[i % len(session_ids)]
+        query = (
+            select(models.Message)
+            .where(models.Message.session_id == session_id)
+            .order_by(models.Message.created_at.desc())
+            .limit(50)
+        )
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                async with ReadSessionLocal() as db:
+                    (await db.execute(query)).scalars().all()
+                read_latencies.append(time.perf_counter() - t0)
+            except OperationalError:
+                errors[0] += 1
+
+    await asyncio.gather(
+        *(writer(s) for s in session_ids),
+        *(reader(i) for i in range(args.readers)),
+    )
+    async with engine.connect() as conn:
+        journal = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+    await engine.dispose()
+    await read_engine.dispose()
+    read_latencies.sort()
+    return {
+        "journal": journal,
+        "writes": writes[0] / args.seconds,
+        "reads": len(read_latencies) / args.seconds,
+        "read_p50": statistics.median(read_latencies) * 1000 if read_latencies else 0,
+        "read_p99": read_latencies[int(len(read_latencies) * 0.99)] * 1000 if read_latencies else 0,
+        "errors": errors[0],
+    }
+
+
+def _run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, GPOST_SQLITE_PROFILE=profile,
+                   GPOST_DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env.pop("GPOST_DATABASE_READ_URL", None)
+        out = subprocess.run(
+            [sys.executable, "-m", "backend.benchmarks.sqlite_profile", "--child",
+             "--seconds", str(args.seconds), "--writers", str(args.writers), "--readers", str(args.readers)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(_workload(args))))
+        return
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g} s per profile")
+    for profile in ("basic", "production"):
+        r = _run_profile(profile, args)
+        print(f"  {profile:<11} journal={r['journal']:<7} {r['writes']:7.0f} commits/s  {r['reads']:7.0f} reads/s  "
+              f"read p50 {r['read_p50']:6.1f} ms  p99 {r['read_p99']:7.1f} ms  {r['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Wall time of one round of tool calls, run one after another (the old
+behavior) versus concurrently through tool_executor.execute.
+
+    python -m backend.benchmarks.tool_executor --calls 8 --seconds 0.2 --limit 4
+
+Every call goes to the local fake.sleep handler. With --limit, calls share one
+tool bound with that max_concurrency, so the concurrent run takes about
+ceil(calls / limit) * seconds; without it each call uses its own tool.
+"""
+import argparse
+import asyncio
+import time
+
+from backend import tool_executor
+from backend.tool_executor import ToolBinding
+
+
+def _setup(calls: int, seconds: float, limit: int):
+    bindings = {}
+    requests = []
+    for i in range(calls):
+        name = "sleep" if limit else f"sleep_{i}"
+        if name not in bindings:
+            config = {"handler": "fake.sleep", "max_concurrency": limit or 1}
+            bindings[name] = ToolBinding(f"tool-{name}", name, {}, config)
+        requests.append({"id": f"call_{i}", "name": name, "arguments": f'{{"seconds": {seconds}}}'})
+    return bindings, requests
+
+
+async def _noop(ev):
+    pass
+
+
+async def _sequential(bindings, calls):
+    for call in calls:
+        await tool_executor.run_one(bindings.get(call["name"]), call)
+
+
+async def _run(args):
+    bindings, calls = _setup(args.calls, args.seconds, args.limit)
+
+    t0 = time.perf_counter()
+    await _sequential(bindings, calls)
+    sequential = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    results = await tool_executor.execute(bindings, calls, None, _noop)
+    concurrent = time.perf_counter() - t0
+
+    errors = sum(1 for r in results if r.is_error)
+    print(f"{args.calls} calls of {args.seconds}s, max_concurrency={args.limit or 'per call'}")
+    print(f"  sequential: {sequential * 1000:.0f} ms")
+    print(f"  concurrent: {concurrent * 1000:.0f} ms ({sequential / concurrent:.1f}x, {errors} errors)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=0.2)
+    parser.add_argument("--limit", type=int, default=0, help="max_concurrency of a single shared tool")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
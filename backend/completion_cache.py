@@ -0,0 +1,270 @@
+"""
+Completion cache for deterministic agents.
+
+An agent with cache_completions set and a temperature of 0 gets the same
+completion for the same request: same provider endpoint, model, parameters
+(tool definitions included) and messages, hashed by `key`. The orchestrator
+looks every such request up here before calling the provider, and records
+the completion of a call whose stream ran to the end (`put`). A hit is
+replayed (`replay`) in the chunks the provider sent, with
+GPOST_COMPLETION_CACHE_CHUNK_DELAY seconds between them, so it streams to
+the client like a live reply and is coalesced into frames the same way.
+Tool calls of a cached completion still run: only the provider call is
+skipped.
+
+Two tiers: an LRU in process memory (GPOST_COMPLETION_CACHE_MEMORY_MB) in
+front of a SQLite file (GPOST_COMPLETION_CACHE_PATH, shared by the workers
+of a host; empty to keep the cache in memory only) capped at
+GPOST_COMPLETION_CACHE_DISK_MB, least recently used first out. Entries older
+than GPOST_COMPLETION_CACHE_TTL seconds are dropped from both. `stats`
+reports the hit, miss, store and eviction counters of this process.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from . import jsoncodec
+from .streaming import ChatEvent, TextChunk, Thinking
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_CACHE = os.getenv("GPOST_COMPLETION_CACHE", "1") == "1"
+COMPLETION_CACHE_TTL = float(os.getenv("GPOST_COMPLETION_CACHE_TTL", str(7 * 86400)))
+COMPLETION_CACHE_MEMORY_MB = float(os.getenv("GPOST_COMPLETION_CACHE_MEMORY_MB", "64"))
+COMPLETION_CACHE_PATH = os.getenv("GPOST_COMPLETION_CACHE_PATH", "./gpost_completion_cache.db")
+COMPLETION_CACHE_DISK_MB = float(os.getenv("GPOST_COMPLETION_CACHE_DISK_MB", "512"))
+# Pause between replayed chunks; 0 replays a hit at once (still coalesced into frames)
+COMPLETION_CACHE_CHUNK_DELAY = float(os.getenv("GPOST_COMPLETION_CACHE_CHUNK_DELAY", "0.005"))
+
+# Part of every key: bump it when the request or entry format changes
+KEY_VERSION = 1
+
+_MEMORY_BYTES = int(COMPLETION_CACHE_MEMORY_MB * 2 ** 20)
+_DISK_BYTES = int(COMPLETION_CACHE_DISK_MB * 2 ** 20)
+
+
+class Completion:
+    """A recorded completion: its stream chunks and the tool calls it asked for."""
+    __slots__ = ("chunks", "tool_calls")
+
+    def __init__(self, chunks: List[list], tool_calls: List[dict]):
+        self.chunks = chunks  # [kind, text], kind "text" or "thinking", in stream order
+        self.tool_calls = tool_calls  # {"id", "name", "arguments"}, by index
+
+    def encode(self) -> bytes:
+        return jsoncodec.dumpb({"chunks": self.chunks, "tool_calls": self.tool_calls})
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "Completion":
+        data = jsoncodec.loads(raw)
+        return cls(data["chunks"], data["tool_calls"])
+
+
+_counters: Dict[str, int] = dict.fromkeys(
+    ("memory_hits", "disk_hits", "misses", "stores", "memory_evictions", "disk_evictions", "disk_errors"), 0
+)
+# key -> (completion, encoded size, created_at as a unix time)
+_memory: "OrderedDict[str, Tuple[Completion, int, float]]" = OrderedDict()
+_memory_bytes = 0
+_conn: Optional[sqlite3.Connection] = None
+# The disk tier runs in worker threads, over one connection
+_lock = threading.Lock()
+
+
+def key(node, messages: List[dict], params: dict) -> Optional[str]:
+    """Cache key of a completion request of `node` (an AgentNode), or None if the agent does not use the cache."""
+    if not COMPLETION_CACHE or not node.cache_completions or node.temperature != 0:
+        return None
+    request = {
+        "v": KEY_VERSION,
+        "base_url": node.base_url or "",
+        "model": node.model,
+        "params": params,
+        "messages": messages,
+    }
+    return hashlib.sha256(jsoncodec.canonical(request)).hexdigest()
+
+
+# --- Memory tier ---
+
+def _memory_drop(k: str):
+    global _memory_bytes
+    entry = _memory.pop(k, None)
+    if entry is not None:
+        _memory_bytes -= entry[1]
+
+
+def _memory_get(k: str) -> Optional[Completion]:
+    entry = _memory.get(k)
+    if entry is None:
+        return None
+    if time.time() - entry[2] > COMPLETION_CACHE_TTL:
+        _memory_drop(k)
+        return None
+    _memory.move_to_end(k)
+    return entry[0]
+
+
+def _memory_put(k: str, completion: Completion, size: int, created_at: float):
+    global _memory_bytes
+    _memory_drop(k)
+    if size > _MEMORY_BYTES:
+        return
+    _memory[k] = (completion, size, created_at)
+    _memory_bytes += size
+    while _memory_bytes > _MEMORY_BYTES:
+        _memory_drop(next(iter(_memory)))
+        _counters["memory_evictions"] += 1
+
+
+# --- Disk tier ---
+
+def _open() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(COMPLETION_CACHE_PATH, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_completions_used_at ON completions (used_at)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _disk_get(k: str) -> Optional[Tuple[bytes, float]]:
+    with _lock:
+        conn = _open()
+        row = conn.execute("SELECT value, created_at FROM completions WHERE key = ?", (k,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > COMPLETION_CACHE_TTL:
+            conn.execute("DELETE FROM completions WHERE key = ?", (k,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE completions SET used_at = ? WHERE key = ?", (now, k))
+        conn.commit()
+        return row
+
+
+def _disk_put(k: str, raw: bytes, created_at: float) -> int:
+    """Store an entry, then evict expired and over-budget ones; returns how many were evicted."""
+    with _lock:
+        conn = _open()
+        conn.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                     (k, raw, len(raw), created_at, created_at))
+        evicted = conn.execute("DELETE FROM completions WHERE created_at < ?",
+                               (created_at - COMPLETION_CACHE_TTL,)).rowcount
+        # Keep the most recently used entries that fit in the budget
+        evicted += conn.execute(
+            "DELETE FROM completions WHERE key IN (SELECT key FROM ("
+            "SELECT key, sum(size) OVER (ORDER BY used_at DESC, key) AS total FROM completions"
+            ") WHERE total > ?)",
+            (_DISK_BYTES,),
+        ).rowcount
+        conn.commit()
+        return evicted
+
+
+def _disk_stats() -> Tuple[int, int]:
+    with _lock:
+        return _open().execute("SELECT count(*), coalesce(sum(size), 0) FROM completions").fetchone()
+
+
+def _disk_clear():
+    with _lock:
+        conn = _open()
+        conn.execute("DELETE FROM completions")
+        conn.commit()
+
+
+async def _disk(fn, *args):
+    """Run a disk tier call in a thread; a failing cache file only costs hits."""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except sqlite3.Error as e:
+        _counters["disk_errors"] += 1
+        logger.warning("Completion cache file %s: %s", COMPLETION_CACHE_PATH, e)
+        return None
+
+
+# --- API ---
+
+async def get(k: str) -> Optional[Completion]:
+    completion = _memory_get(k)
+    if completion is not None:
+        _counters["memory_hits"] += 1
+        return completion
+    row = await _disk(_disk_get, k) if COMPLETION_CACHE_PATH else None
+    if row is not None:
+        raw, created_at = row
+        completion = Completion.decode(raw)
+        _memory_put(k, completion, len(raw), created_at)
+        _counters["disk_hits"] += 1
+        return completion
+    _counters["misses"] += 1
+    return None
+
+
+async def put(k: str, chunks: List[list], tool_calls: List[dict]):
+    """Record the completion of a request that missed (call once its stream has ended)."""
+    completion = Completion(chunks, tool_calls)
+    raw = completion.encode()
+    created_at = time.time()
+    _memory_put(k, completion, len(raw), created_at)
+    _counters["stores"] += 1
+    if COMPLETION_CACHE_PATH:
+        _counters["disk_evictions"] += await _disk(_disk_put, k, raw, created_at) or 0
+
+
+async def replay(completion: Completion) -> AsyncIterator[ChatEvent]:
+    """The events of a cached completion, paced like a stream."""
+    for i, (kind, text) in enumerate(completion.chunks):
+        if i and COMPLETION_CACHE_CHUNK_DELAY > 0:
+            await asyncio.sleep(COMPLETION_CACHE_CHUNK_DELAY)
+        yield TextChunk(text) if kind == "text" else Thinking(text)
+
+
+async def stats() -> dict:
+    disk_entries, disk_bytes = (await _disk(_disk_stats) or (0, 0)) if COMPLETION_CACHE_PATH else (0, 0)
+    lookups = _counters["memory_hits"] + _counters["disk_hits"] + _counters["misses"]
+    return {
+        "enabled": COMPLETION_CACHE,
+        **_counters,
+        "hit_ratio": (lookups - _counters["misses"]) / lookups if lookups else 0.0,
+        "memory_entries": len(_memory),
+        "memory_bytes": _memory_bytes,
+        "memory_max_bytes": _MEMORY_BYTES,
+        "disk_path": COMPLETION_CACHE_PATH or None,
+        "disk_entries": disk_entries,
+        "disk_bytes": disk_bytes,
+        "disk_max_bytes": _DISK_BYTES if COMPLETION_CACHE_PATH else 0,
+        "ttl": COMPLETION_CACHE_TTL,
+    }
+
+
+async def clear():
+    """Drop every entry from both tiers (the counters are kept)."""
+    global _memory_bytes
+    _memory.clear()
+    _memory_bytes = 0
+    if COMPLETION_CACHE_PATH:
+        await _disk(_disk_clear)
+
+
+def stop():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
@@ -0,0 +1,259 @@
+"""
+Token-budgeted prompt context per session agent.
+
+Each SessionAgent keeps a running summary of the conversation in
+memory_context, together with the (created_at, id) of the last message the
+summary covers:
+
+    {"summary": "...", "checkpoint": ["2025-01-01T10:00:00", "<message id>"], "summarized": 42}
+
+`prepare` reads only the messages after the checkpoint (at most
+CONTEXT_TAIL_LIMIT rows, newest first, off ix_messages_session_created_at_id)
+and keeps the newest ones that fit CONTEXT_TOKENS next to the summary, so a
+prompt costs the same on turn 100 and turn 100k. After a turn, `compact` folds
+the messages that no longer fit into the summary and moves the checkpoint
+past them. Unsummarized messages older than that tail (a bulk import, a long
+backlog) are folded in first, CONTEXT_TAIL_LIMIT at a time, so the checkpoint
+never skips a row. Summaries are extractive by default; GPOST_SUMMARIZER=llm
+asks the agent's own model to rewrite them, falling back to extractive on
+errors.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import message_writer, models, pagination, provider_clients, versions
+from .database import ReadSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKENS = int(os.getenv("GPOST_CONTEXT_TOKENS", "3000"))
+SUMMARY_TOKENS = int(os.getenv("GPOST_SUMMARY_TOKENS", "500"))
+CONTEXT_TAIL_LIMIT = int(os.getenv("GPOST_CONTEXT_TAIL_LIMIT", "200"))
+SUMMARIZER = os.getenv("GPOST_SUMMARIZER", "extractive")  # extractive | llm
+SUMMARY_TIMEOUT = float(os.getenv("GPOST_SUMMARY_TIMEOUT", "30"))
+
+# Per-message cap of the extractive summarizer, in characters
+_EXTRACT_CHARS = 240
+
+_compacting = set()
+_tasks = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class Memory:
+    """Parsed memory_context of one session agent."""
+
+    def __init__(self, summary: str = "", checkpoint: Optional[Tuple[datetime, str]] = None, summarized: int = 0):
+        self.summary = summary
+        self.checkpoint = checkpoint
+        self.summarized = summarized
+
+    @classmethod
+    def from_column(cls, value) -> "Memory":
+        if isinstance(value, str):
+            return cls(summary=value)
+        if not isinstance(value, dict):
+            return cls()
+        checkpoint = value.get("checkpoint")
+        if checkpoint:
+            checkpoint = (datetime.fromisoformat(checkpoint[0]), checkpoint[1])
+        return cls(value.get("summary") or "", checkpoint, value.get("summarized") or 0)
+
+    def to_column(self) -> dict:
+        checkpoint = [self.checkpoint[0].isoformat(), self.checkpoint[1]] if self.checkpoint else None
+        return {"summary": self.summary, "checkpoint": checkpoint, "summarized": self.summarized}
+
+    def covers(self, message) -> bool:
+        return self.checkpoint is not None and (message.created_at, message.id) <= self.checkpoint
+
+
+def _conversation(session_id: str, after: Optional[Tuple[datetime, str]]):
+    q = select(models.Message).where(
+        models.Message.session_id == session_id,
+        models.Message.msg_type == "text",
+        models.Message.role.in_(("user", "assistant")),
+    )
+    if after:
+        q = q.where(pagination.after(models.Message, *after))
+    return q
+
+
+async def load_tail(db: AsyncSession, session_id: str, after: Optional[Tuple[datetime, str]]) -> list:
+    """Conversation messages after `after`, oldest first, at most CONTEXT_TAIL_LIMIT of the newest."""
+    await message_writer.wait_session(session_id)
+    q = _conversation(session_id, after)
+    q = q.order_by(models.Message.created_at.desc(), models.Message.id.desc()).limit(CONTEXT_TAIL_LIMIT)
+    return list(reversed((await db.scalars(q)).all()))
+
+
+async def load_range(db: AsyncSession, session_id: str, after: Optional[Tuple[datetime, str]],
+                     before: Tuple[datetime, str], limit: int) -> list:
+    """The oldest `limit` conversation messages after `after` and before `before`, oldest first."""
+    q = _conversation(session_id, after).where(pagination.after(models.Message, *before, descending=True))
+    q = q.order_by(models.Message.created_at, models.Message.id).limit(limit)
+    return list((await db.scalars(q)).all())
+
+
+def window(memory: Memory, tail: list, budget: int = CONTEXT_TOKENS) -> Tuple[list, list]:
+    """Split the messages after the checkpoint into (kept, overflow): the newest that fit the budget, and the rest."""
+    rows = [m for m in tail if not memory.covers(m)]
+    remaining = budget - (estimate_tokens(_summary_text(memory.summary)) if memory.summary else 0)
+    cut = len(rows)
+    while cut > 0:
+        cost = estimate_tokens(rows[cut - 1].content or "")
+        if cost > remaining:
+            break
+        remaining -= cost
+        cut -= 1
+    return rows[cut:], rows[:cut]
+
+
+def _summary_text(summary: str) -> str:
+    return f"Summary of the earlier conversation:\n{summary}"
+
+
+def build_context(memory: Memory, kept: list) -> List[dict]:
+    messages = []
+    if memory.summary:
+        messages.append({"role": "system", "content": _summary_text(memory.summary)})
+    messages.extend({"role": m.role, "content": m.content or ""} for m in kept)
+    return messages
+
+
+def _oldest_checkpoint(memories) -> Optional[Tuple[datetime, str]]:
+    checkpoints = [memory.checkpoint for memory in memories]
+    if not checkpoints or None in checkpoints:
+        return None
+    return min(checkpoints)
+
+
+async def prepare(db: AsyncSession, session_id: str, session_agents: list) -> Dict[str, List[dict]]:
+    """Prompt context of every session agent (by SessionAgent.id), with one query for all of them."""
+    memories = {sa.id: Memory.from_column(sa.memory_context) for sa in session_agents}
+    tail = await load_tail(db, session_id, _oldest_checkpoint(memories.values()))
+    return {sa_id: build_context(memory, window(memory, tail)[0]) for sa_id, memory in memories.items()}
+
+
+def _extract(summary: str, overflow: list) -> str:
+    lines = summary.splitlines() if summary else []
+    for m in overflow:
+        text = " ".join((m.content or "").split())
+        if len(text) > _EXTRACT_CHARS:
+            text = text[:_EXTRACT_CHARS].rstrip() + "…"
+        lines.append(f"{m.role}: {text}")
+    # Oldest lines go first once the summary outgrows its budget
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_TOKENS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+async def _summarize_llm(summary: str, overflow: list, node) -> str:
+    transcript = "\n".join(f"{m.role}: {m.content or ''}" for m in overflow)
+    async with provider_clients.lease(node.provider_id, node.base_url, node.api_key) as client:
+        response = await client.chat.completions.create(
+            model=node.model,
+            messages=[
+                {"role": "system", "content": (
+                    "Update the running summary of a conversation with the new messages. "
+                    "Keep facts, decisions and open questions; reply with the summary only."
+                )},
+                {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+            max_tokens=SUMMARY_TOKENS,
+            timeout=SUMMARY_TIMEOUT,
+        )
+    return (response.choices[0].message.content or "").strip()
+
+
+async def summarize(summary: str, overflow: list, node=None) -> str:
+    if SUMMARIZER == "llm" and node is not None:
+        try:
+            text = await _summarize_llm(summary, overflow, node)
+            if text:
+                return text
+        except Exception as e:
+            logger.warning("LLM summary failed for %s, using extractive: %s", node.agent_name, e)
+    return _extract(summary, overflow)
+
+
+async def compact(session_id: str, nodes: dict):
+    """Fold the messages that fell out of each agent's window into its summary. `nodes`: SessionAgent.id -> AgentNode."""
+    if session_id in _compacting:
+        return  # the running pass, or the next turn's, picks these messages up
+    _compacting.add(session_id)
+    try:
+        async with ReadSessionLocal() as db:
+            session_agents = (await db.scalars(
+                select(models.SessionAgent).where(models.SessionAgent.id.in_(list(nodes)))
+            )).all()
+            memories = {sa.id: Memory.from_column(sa.memory_context) for sa in session_agents}
+            start = _oldest_checkpoint(memories.values())
+            tail = await load_tail(db, session_id, start)
+        # Summaries may take a model call: no connection is held meanwhile
+        changed = set()
+
+        def fold(sa_id: str, rows: list):
+            changed.add(sa_id)
+            memory = memories[sa_id]
+            memory.checkpoint = (rows[-1].created_at, rows[-1].id)
+            memory.summarized += len(rows)
+
+        # A full tail may hide older unsummarized messages: fold those in first, oldest batch first
+        if tail and len(tail) >= CONTEXT_TAIL_LIMIT:
+            boundary = (tail[0].created_at, tail[0].id)
+            cursor = start
+            while True:
+                async with ReadSessionLocal() as db:
+                    batch = await load_range(db, session_id, cursor, boundary, CONTEXT_TAIL_LIMIT)
+                for sa in session_agents:
+                    rows = [m for m in batch if not memories[sa.id].covers(m)]
+                    if rows:
+                        memories[sa.id].summary = await summarize(memories[sa.id].summary, rows, nodes.get(sa.id))
+                        fold(sa.id, rows)
+                if len(batch) < CONTEXT_TAIL_LIMIT:
+                    break
+                cursor = (batch[-1].created_at, batch[-1].id)
+
+        for sa in session_agents:
+            memory = memories[sa.id]
+            _, overflow = window(memory, tail)
+            if overflow:
+                memory.summary = await summarize(memory.summary, overflow, nodes.get(sa.id))
+                fold(sa.id, overflow)
+        updates = {sa_id: memories[sa_id].to_column() for sa_id in changed}
+        if updates:
+            async with SessionLocal() as db:
+                for sa_id, value in updates.items():
+                    await db.execute(
+                        update(models.SessionAgent).where(models.SessionAgent.id == sa_id).values(memory_context=value)
+                    )
+                await db.commit()
+            await versions.bump(versions.session_scope(session_id, "agents"))  # memory_context is in the session detail
+    finally:
+        _compacting.discard(session_id)
+
+
+def schedule_compaction(session_id: str, nodes):
+    """Run `compact` for the given AgentNodes in the background, after the reply has been delivered."""
+    nodes = {node.node_id: node for node in nodes}
+    if not nodes:
+        return
+    task = asyncio.create_task(compact(session_id, nodes))
+    _tasks.add(task)
+
+    def _done(t: asyncio.Task):
+        _tasks.discard(t)
+        if not t.cancelled() and t.exception():
+            logger.warning("Context compaction failed for session %s: %s", session_id, t.exception())
+
+    task.add_done_callback(_done)
@@ -0,0 +1,29 @@
+"""
+JSON encoding for the database JSON columns, schemas, cursors and SSE frames (orjson).
+
+Every load returns a fresh object. Hot parsed values are cached further up,
+where their owners know when they change: compiled graphs by graph_version
+(topology.py), resolved tool schemas by agent_cache.
+"""
+from typing import Any
+
+import orjson
+
+JSONDecodeError = orjson.JSONDecodeError
+
+
+def dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def dumpb(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def canonical(obj: Any) -> bytes:
+    """Encoding with sorted keys, for hashing: equal values give equal bytes."""
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+def loads(raw) -> Any:
+    return orjson.loads(raw)
@@ -1,20 +1,43 @@
 import asyncio
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional, AsyncGenerator
-import json
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from pydantic import TypeAdapter
+from typing import Annotated, List, Optional, AsyncGenerator, Tuple
+import time
 import uuid
-from openai import OpenAI
+from datetime import datetime, timedelta, timezone
+
+from . import (
+    agent_cache, completion_cache, context_window, jsoncodec, message_writer, models, orchestrator, pagination, probing, provider_clients, schemas,
+    runs, search, skill_runner, streaming, topology, versions,
+)
+from .database import ReadSessionLocal, SessionLocal, get_db, get_read_db, init_db
 
-from . import models, schemas
-from .database import engine, get_db
 
-# Create Tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create Tables
+    await init_db()
+    await agent_cache.start()
+    await versions.start()
+    await skill_runner.start()
+    message_writer.start()
+    yield
+    await runs.stop_all()
+    await message_writer.stop()
+    await skill_runner.stop()
+    await agent_cache.stop()
+    await versions.stop()
+    await provider_clients.close_all()
+    completion_cache.stop()
 
-app = FastAPI(title="GPost Agent Orchestration API")
+
+app = FastAPI(title="GPost Agent Orchestration API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,312 +45,780 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, "ETag"],
+)
+
+# --- Loader options ---
+# The async session cannot lazy-load, so every query that feeds a nested
+# response schema (or a relationship assignment) loads what it needs up front.
+# Each relationship level costs one extra SELECT for the whole result set
+# (selectin) or none (joined), so listings issue a fixed number of statements
+# however many rows they return.
+
+AGENT_OPTIONS = (
+    selectinload(models.Agent.skills).selectinload(models.Skill.tools),
+    joinedload(models.Agent.model),
 )
+AGENT_SLIM_OPTIONS = (
+    selectinload(models.Agent.skills).load_only(models.Skill.id, models.Skill.name, models.Skill.description),
+    joinedload(models.Agent.model),
+)
+SKILL_OPTIONS = (selectinload(models.Skill.tools),)
+
+# `?view=slim` skips nested tools. Slim results are serialized here rather than
+# through the route's response_model, which describes the full view.
+ListView = Annotated[str, Query(pattern="^(full|slim)$", description="'slim' omits nested tools")]
+_agents_slim = TypeAdapter(List[schemas.AgentSlim])
+_skills_slim = TypeAdapter(List[schemas.SkillSlim])
+
+
+def _slim_response(adapter: TypeAdapter, rows, response: Response, next_cursor: Optional[str] = None) -> Response:
+    """`response` is the route's injected one: its headers (ETag) carry over."""
+    slim = Response(content=adapter.dump_json(adapter.validate_python(rows, from_attributes=True)),
+                    media_type="application/json", headers=dict(response.headers))
+    _set_next_cursor(slim, next_cursor)
+    return slim
+
+
+def _set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+
+
+# --- Conditional GETs ---
+# Read routes declare the version scopes (versions.py) their response is built
+# from; the write routes bump those scopes after committing. The ETag is
+# derived from the counters before the route runs, so a matching
+# If-None-Match is answered with 304 before any query.
+
+def _conditional(*scopes: str, session_parts: Tuple[str, ...] = ()):
+    async def check(request: Request, response: Response):
+        all_scopes = scopes
+        if session_parts:
+            session_id = request.path_params["session_id"]
+            if "messages" in session_parts:
+                # Queued writes bump the version when they commit
+                await message_writer.wait_session(session_id)
+            all_scopes += tuple(versions.session_scope(session_id, part) for part in session_parts)
+        tag = await versions.etag(*all_scopes, variant=f"{request.url.path}?{request.url.query}")
+        # no-cache: browsers keep the body and revalidate every time, sending If-None-Match themselves
+        headers = {"ETag": tag, "Cache-Control": "no-cache"}
+        if versions.matches(request.headers.get("if-none-match"), tag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+    return Depends(check)
+
+
+SESSION_PARTS = ("meta", "agents", "messages")
+
+
+# populate_existing: after a write the identity map may hold the row with stale
+# or unloaded relationships, so these re-read them in full.
+
+async def _get_agent(db: AsyncSession, agent_id: str) -> Optional[models.Agent]:
+    result = await db.execute(
+        select(models.Agent).options(*AGENT_OPTIONS)
+        .where(models.Agent.id == agent_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+
+async def _get_skill(db: AsyncSession, skill_id: str) -> Optional[models.Skill]:
+    result = await db.execute(
+        select(models.Skill).options(*SKILL_OPTIONS)
+        .where(models.Skill.id == skill_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
 
 # --- Agents ---
 
-@app.get("/api/agents", response_model=List[schemas.Agent])
-def get_agents(db: Session = Depends(get_db)):
-    return db.query(models.Agent).all()
+@app.get("/api/agents", response_model=List[schemas.Agent],
+         dependencies=[_conditional("agents", "skills", "tools", "llms")])
+async def get_agents(
+    response: Response,
+    view: ListView = "full",
+    role: Optional[str] = Query(None),
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    q = select(models.Agent).options(*(AGENT_SLIM_OPTIONS if view == "slim" else AGENT_OPTIONS))
+    if role:
+        q = q.where(models.Agent.role == role)
+    agents, next_cursor = await pagination.fetch_page(db, q, models.Agent, limit, cursor)
+    if view == "slim":
+        return _slim_response(_agents_slim, agents, response, next_cursor)
+    _set_next_cursor(response, next_cursor)
+    return agents
 
 @app.post("/api/agents", response_model=schemas.Agent)
-def create_agent(agent: schemas.AgentCreate, db: Session = Depends(get_db)):
+async def create_agent(agent: schemas.AgentCreate, db: AsyncSession = Depends(get_db)):
     db_agent = models.Agent(**agent.dict(exclude={'skill_ids'}))
-    
+    db_agent.skills = []
+
     # Handle Skill binding
     if agent.skill_ids:
-        skills = db.query(models.Skill).filter(models.Skill.id.in_(agent.skill_ids)).all()
-        db_agent.skills = skills
-        
-    db.add(db_agent)
-    db.commit()
-    db.refresh(db_agent)
-    return db_agent
+        skills = await db.scalars(select(models.Skill).where(models.Skill.id.in_(agent.skill_ids)))
+        db_agent.skills = list(skills)
 
-@app.get("/api/agents/{agent_id}", response_model=schemas.Agent)
-def get_agent(agent_id: str, db: Session = Depends(get_db)):
-    agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+    db.add(db_agent)
+    await db.commit()
+    await versions.bump("agents")
+    return await _get_agent(db, db_agent.id)
+
+@app.get("/api/agents/{agent_id}", response_model=schemas.Agent,
+         dependencies=[_conditional("agents", "skills", "tools", "llms")])
+async def get_agent(agent_id: str, db: AsyncSession = Depends(get_read_db)):
+    agent = await _get_agent(db, agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     return agent
 
 @app.put("/api/agents/{agent_id}", response_model=schemas.Agent)
-def update_agent(agent_id: str, agent_update: schemas.AgentCreate, db: Session = Depends(get_db)):
-    db_agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+async def update_agent(agent_id: str, agent_update: schemas.AgentCreate, db: AsyncSession = Depends(get_db)):
+    db_agent = await _get_agent(db, agent_id)
     if not db_agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    
+
     # Update fields
     for key, value in agent_update.dict(exclude={'skill_ids'}).items():
         setattr(db_agent, key, value)
-    
+
     # Update skills relation
     if agent_update.skill_ids is not None:
-        skills = db.query(models.Skill).filter(models.Skill.id.in_(agent_update.skill_ids)).all()
-        db_agent.skills = skills
+        skills = await db.scalars(select(models.Skill).where(models.Skill.id.in_(agent_update.skill_ids)))
+        db_agent.skills = list(skills)
 
-    db.commit()
-    db.refresh(db_agent)
-    return db_agent
+    await db.commit()
+    await agent_cache.invalidate(agent_id)
+    await versions.bump("agents")
+    return await _get_agent(db, agent_id)
 
 @app.delete("/api/agents/{agent_id}")
-def delete_agent(agent_id: str, db: Session = Depends(get_db)):
-    db_agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+async def delete_agent(agent_id: str, db: AsyncSession = Depends(get_db)):
+    db_agent = await _get_agent(db, agent_id)
     if not db_agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    db.delete(db_agent)
-    db.commit()
+    await db.delete(db_agent)
+    await db.commit()
+    await agent_cache.invalidate(agent_id)
+    await versions.bump("agents")
     return {"ok": True}
 
 # --- Skills ---
 
-@app.get("/api/skills", response_model=List[schemas.Skill])
-def get_skills(db: Session = Depends(get_db)):
-    return db.query(models.Skill).all()
+@app.get("/api/skills", response_model=List[schemas.Skill], dependencies=[_conditional("skills", "tools")])
+async def get_skills(response: Response, view: ListView = "full", db: AsyncSession = Depends(get_read_db)):
+    if view == "slim":
+        result = await db.execute(select(models.Skill))
+        return _slim_response(_skills_slim, result.scalars().all(), response)
+    result = await db.execute(select(models.Skill).options(*SKILL_OPTIONS))
+    return result.scalars().all()
+
+def _check_skill_code(code: Optional[str]):
+    if code:
+        try:
+            skill_runner.compile_code(code)
+        except skill_runner.SkillError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/skills", response_model=schemas.Skill)
-def create_skill(skill: schemas.SkillCreate, db: Session = Depends(get_db)):
+async def create_skill(skill: schemas.SkillCreate, db: AsyncSession = Depends(get_db)):
+    _check_skill_code(skill.code)
     db_skill = models.Skill(**skill.dict(exclude={'tool_ids'}))
-    
+    db_skill.tools = []
+
     # Handle Tool binding
     if skill.tool_ids:
-        tools = db.query(models.Tool).filter(models.Tool.id.in_(skill.tool_ids)).all()
-        db_skill.tools = tools
-        
+        tools = await db.scalars(select(models.Tool).where(models.Tool.id.in_(skill.tool_ids)))
+        db_skill.tools = list(tools)
+
     db.add(db_skill)
-    db.commit()
-    db.refresh(db_skill)
-    return db_skill
+    await db.commit()
+    await versions.bump("skills")
+    return await _get_skill(db, db_skill.id)
 
 @app.put("/api/skills/{skill_id}", response_model=schemas.Skill)
-def update_skill(skill_id: str, skill_update: schemas.SkillCreate, db: Session = Depends(get_db)):
-    db_skill = db.query(models.Skill).filter(models.Skill.id == skill_id).first()
+async def update_skill(skill_id: str, skill_update: schemas.SkillCreate, db: AsyncSession = Depends(get_db)):
+    db_skill = await _get_skill(db, skill_id)
     if not db_skill:
         raise HTTPException(status_code=404, detail="Skill not found")
-        
+    _check_skill_code(skill_update.code)
+
     for key, value in skill_update.dict(exclude={'tool_ids'}).items():
         setattr(db_skill, key, value)
-        
+
     if skill_update.tool_ids is not None:
-        tools = db.query(models.Tool).filter(models.Tool.id.in_(skill_update.tool_ids)).all()
-        db_skill.tools = tools
+        tools = await db.scalars(select(models.Tool).where(models.Tool.id.in_(skill_update.tool_ids)))
+        db_skill.tools = list(tools)
+
+    await db.commit()
+    await agent_cache.invalidate(skill_id)
+    await versions.bump("skills")
+    return await _get_skill(db, skill_id)
+
+@app.post("/api/skills/{skill_id}/run", response_model=schemas.SkillRunResult)
+async def run_skill(skill_id: str, request: schemas.SkillRunRequest, db: AsyncSession = Depends(get_read_db)):
+    """Run the skill's code once in the skill worker pool (for trying a skill out)."""
+    skill = await db.get(models.Skill, skill_id)
+    if not skill:
+        raise HTTPException(status_code=404, detail="Skill not found")
+    if not skill.code:
+        raise HTTPException(status_code=400, detail="Skill has no code")
+    started = time.perf_counter()
+    try:
+        result = await skill_runner.run(skill.code, request.arguments)
+    except skill_runner.SkillDisabled as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except skill_runner.SkillTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except skill_runner.SkillError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": result, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+def _skill_tool_binding(skill_id: str, tool_id: str):
+    return select(models.skills_tools.c.config).where(
+        models.skills_tools.c.skill_id == skill_id, models.skills_tools.c.tool_id == tool_id
+    )
 
-    db.commit()
-    db.refresh(db_skill)
-    return db_skill
+@app.get("/api/skills/{skill_id}/tools/{tool_id}/config", response_model=schemas.ToolBindingConfig)
+async def get_skill_tool_config(skill_id: str, tool_id: str, db: AsyncSession = Depends(get_read_db)):
+    result = (await db.execute(_skill_tool_binding(skill_id, tool_id))).first()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Tool is not bound to this skill")
+    return result.config if isinstance(result.config, dict) else {}
+
+@app.put("/api/skills/{skill_id}/tools/{tool_id}/config", response_model=schemas.ToolBindingConfig)
+async def update_skill_tool_config(skill_id: str, tool_id: str, config: schemas.ToolBindingConfig,
+                                   db: AsyncSession = Depends(get_db)):
+    """Set how this skill runs the tool: handler, timeout, max_concurrency (see tool_executor)."""
+    if (await db.execute(_skill_tool_binding(skill_id, tool_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Tool is not bound to this skill")
+    value = config.model_dump(exclude_none=True)
+    await db.execute(
+        models.skills_tools.update()
+        .where(models.skills_tools.c.skill_id == skill_id, models.skills_tools.c.tool_id == tool_id)
+        .values(config=value or None)
+    )
+    await db.commit()
+    await agent_cache.invalidate(skill_id, tool_id)
+    await versions.bump("skills")
+    return value
 
 # --- Tools ---
 
-@app.get("/api/tools", response_model=List[schemas.Tool])
-def get_tools(db: Session = Depends(get_db)):
-    return db.query(models.Tool).all()
+@app.get("/api/tools", response_model=List[schemas.Tool], dependencies=[_conditional("tools")])
+async def get_tools(
+    response: Response,
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    tools, next_cursor = await pagination.fetch_page(db, select(models.Tool), models.Tool, limit, cursor)
+    _set_next_cursor(response, next_cursor)
+    return tools
 
 @app.post("/api/tools", response_model=schemas.Tool)
-def create_tool(tool: schemas.ToolCreate, db: Session = Depends(get_db)):
-    # Convert dicts to json strings for storage
-    tool_data = tool.dict()
-    if tool_data.get('schema'):
-        tool_data['schema'] = json.dumps(tool_data['schema'])
-    if tool_data.get('credential_config'):
-        tool_data['credential_config'] = json.dumps(tool_data['credential_config'])
-        
-    db_tool = models.Tool(**tool_data)
+async def create_tool(tool: schemas.ToolCreate, db: AsyncSession = Depends(get_db)):
+    db_tool = models.Tool(**tool.dict())
     db.add(db_tool)
-    db.commit()
-    db.refresh(db_tool)
+    await db.commit()
+    await db.refresh(db_tool)
+    await versions.bump("tools")
     return db_tool
 
 @app.put("/api/tools/{tool_id}", response_model=schemas.Tool)
-def update_tool(tool_id: str, tool: schemas.ToolCreate, db: Session = Depends(get_db)):
-    db_tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
+async def update_tool(tool_id: str, tool: schemas.ToolCreate, db: AsyncSession = Depends(get_db)):
+    db_tool = await db.get(models.Tool, tool_id)
     if not db_tool:
         raise HTTPException(status_code=404, detail="Tool not found")
-    tool_data = tool.dict()
-    if tool_data.get('schema'):
-        tool_data['schema'] = json.dumps(tool_data['schema'])
-    if tool_data.get('credential_config'):
-        tool_data['credential_config'] = json.dumps(tool_data['credential_config'])
-    for key, value in tool_data.items():
+    for key, value in tool.dict().items():
         setattr(db_tool, key, value)
-    db.commit()
-    db.refresh(db_tool)
+    await db.commit()
+    await agent_cache.invalidate(tool_id)
+    await versions.bump("tools")
     return db_tool
 
 @app.delete("/api/tools/{tool_id}")
-def delete_tool(tool_id: str, db: Session = Depends(get_db)):
-    db_tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
+async def delete_tool(tool_id: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.Tool).options(selectinload(models.Tool.skills)).where(models.Tool.id == tool_id)
+    )
+    db_tool = result.scalars().first()
     if not db_tool:
         raise HTTPException(status_code=404, detail="Tool not found")
-    db.delete(db_tool)
-    db.commit()
+    await db.delete(db_tool)
+    await db.commit()
+    await agent_cache.invalidate(tool_id)
+    await versions.bump("tools", "skills")  # also unbound from its skills
     return {"ok": True}
 
 # --- Providers ---
 
-@app.get("/api/providers", response_model=List[schemas.Provider])
-def get_providers(db: Session = Depends(get_db)):
-    return db.query(models.Provider).all()
+@app.get("/api/providers", response_model=List[schemas.Provider], dependencies=[_conditional("providers")])
+async def get_providers(db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(models.Provider))
+    return result.scalars().all()
 
 @app.post("/api/providers", response_model=schemas.Provider)
-def create_provider(provider: schemas.ProviderCreate, db: Session = Depends(get_db)):
+async def create_provider(provider: schemas.ProviderCreate, db: AsyncSession = Depends(get_db)):
     db_provider = models.Provider(**provider.dict())
     db.add(db_provider)
-    db.commit()
-    db.refresh(db_provider)
+    await db.commit()
+    await db.refresh(db_provider)
+    await versions.bump("providers")
     return db_provider
 
+@app.get("/api/providers/clients", response_model=List[schemas.ProviderClientStats])
+async def get_provider_clients():
+    """Connection pool metrics of the pooled provider clients (provider_clients.py)."""
+    return provider_clients.stats()
+
+@app.get("/api/completion-cache", response_model=schemas.CompletionCacheStats)
+async def get_completion_cache():
+    """Hit/miss counters and tier sizes of the completion cache (completion_cache.py)."""
+    return await completion_cache.stats()
+
+@app.delete("/api/completion-cache")
+async def clear_completion_cache():
+    await completion_cache.clear()
+    return {"ok": True}
+
 @app.put("/api/providers/{provider_id}", response_model=schemas.Provider)
-def update_provider(provider_id: str, provider: schemas.ProviderCreate, db: Session = Depends(get_db)):
-    db_provider = db.query(models.Provider).filter(models.Provider.id == provider_id).first()
+async def update_provider(provider_id: str, provider: schemas.ProviderCreate, db: AsyncSession = Depends(get_db)):
+    db_provider = await db.get(models.Provider, provider_id)
     if not db_provider:
         raise HTTPException(status_code=404, detail="Provider not found")
+    reconnect = (provider.base_url, provider.api_key) != (db_provider.base_url, db_provider.api_key)
     for key, value in provider.dict().items():
         setattr(db_provider, key, value)
-    db.commit()
-    db.refresh(db_provider)
+    await db.commit()
+    await agent_cache.invalidate(provider_id)
+    await versions.bump("providers")
+    if reconnect:
+        await provider_clients.discard(provider_id)
     return db_provider
 
 @app.delete("/api/providers/{provider_id}")
-def delete_provider(provider_id: str, db: Session = Depends(get_db)):
-    db_provider = db.query(models.Provider).filter(models.Provider.id == provider_id).first()
+async def delete_provider(provider_id: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.Provider).options(selectinload(models.Provider.llms)).where(models.Provider.id == provider_id)
+    )
+    db_provider = result.scalars().first()
     if not db_provider:
         raise HTTPException(status_code=404, detail="Provider not found")
-    db.delete(db_provider)
-    db.commit()
+    await db.delete(db_provider)
+    await db.commit()
+    await agent_cache.invalidate(provider_id)
+    await versions.bump("providers", "llms")  # its LLMs go with it
+    await provider_clients.discard(provider_id)
     return {"ok": True}
 
-def _fetch_llms_from_provider(db_provider) -> list:
-    """Fetch LLM list from remote provider API."""
-    client = OpenAI(
-        api_key=db_provider.api_key or "",
-        base_url=db_provider.base_url
-    )
-    llm_models = []
-    remote_models = client.models.list()
-    for model in remote_models:
-        model_id = model.id
-        try:
-            client.chat.completions.create(
-                model=model_id,
-                messages=[{"role": "user", "content": "say 1"}],
-                max_tokens=1,
-                timeout=5
-            )
-            llm_models.append({"remote_id": model_id, "is_llm": True})
-        except Exception:
-            continue
-    return llm_models
-
-
-@app.get("/api/llms", response_model=List[schemas.LLM])
-def get_all_llms(provider_id: Optional[str] = Query(None), db: Session = Depends(get_db)):
+async def _load_probe_cache(base_url: Optional[str], remote_ids: List[str]) -> dict:
+    """Unexpired probe verdicts for these remote models: {remote_id: is_llm}."""
+    async with ReadSessionLocal() as db:
+        now = datetime.utcnow()
+        rows = await db.scalars(select(models.ModelProbe).where(
+            models.ModelProbe.base_url == (base_url or ""),
+            models.ModelProbe.remote_id.in_(remote_ids),
+        ))
+        fresh = {}
+        for row in rows:
+            ttl = probing.PROBE_TTL if row.is_llm else probing.PROBE_NEGATIVE_TTL
+            if row.probed_at and (now - row.probed_at).total_seconds() < ttl:
+                fresh[row.remote_id] = row.is_llm
+        return fresh
+
+
+async def _save_probe_results(job: probing.ProbeJob, base_url: Optional[str]):
+    """
+    Write new verdicts to the probe cache and upsert the provider's LLM rows.
+    Rows are updated in place so Agent.model_id keeps pointing at them; a row
+    that is no longer a chat model is only deleted when no agent uses it.
+    Models without a verdict (transient errors, deadline) are left untouched.
+    """
+    async with SessionLocal() as db:
+        now = datetime.utcnow()
+        verdicts = {remote_id: True for remote_id in job.models}
+        verdicts.update({remote_id: False for remote_id in job.rejected})
+
+        new_verdicts = {k: v for k, v in verdicts.items() if k not in job.cached_ids}
+        if new_verdicts:
+            cached_rows = {
+                row.remote_id: row
+                for row in await db.scalars(select(models.ModelProbe).where(
+                    models.ModelProbe.base_url == (base_url or ""),
+                    models.ModelProbe.remote_id.in_(list(new_verdicts)),
+                ))
+            }
+            for remote_id, is_llm in new_verdicts.items():
+                row = cached_rows.get(remote_id)
+                if row is None:
+                    db.add(models.ModelProbe(base_url=base_url or "", remote_id=remote_id, is_llm=is_llm, probed_at=now))
+                else:
+                    row.is_llm = is_llm
+                    row.probed_at = now
+
+        listed = set(job.remote_ids)
+        existing = {
+            db_llm.remote_id: db_llm
+            for db_llm in await db.scalars(select(models.LLM).where(models.LLM.provider_id == job.provider_id))
+        }
+        in_use = set(await db.scalars(select(models.Agent.model_id).where(
+            models.Agent.model_id.in_([db_llm.id for db_llm in existing.values()])
+        )))
+        for remote_id, db_llm in existing.items():
+            if remote_id in listed and verdicts.get(remote_id) is not False:
+                db_llm.is_llm = True
+            elif db_llm.id in in_use:
+                db_llm.is_llm = False
+            else:
+                await db.delete(db_llm)
+        for remote_id in job.models:
+            if remote_id not in existing:
+                db.add(models.LLM(provider_id=job.provider_id, remote_id=remote_id, is_llm=True))
+        await db.commit()
+    await agent_cache.invalidate(job.provider_id)
+    await versions.bump("llms")
+
+
+@app.get("/api/llms", response_model=List[schemas.LLM], dependencies=[_conditional("llms")])
+async def get_all_llms(
+    response: Response,
+    provider_id: Optional[str] = Query(None),
+    is_llm: Optional[bool] = Query(None),
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    db: AsyncSession = Depends(get_read_db),
+):
     """Get all LLMs, optionally filtered by provider_id."""
-    q = db.query(models.LLM)
+    q = select(models.LLM)
     if provider_id:
-        q = q.filter(models.LLM.provider_id == provider_id)
-    return q.all()
+        q = q.where(models.LLM.provider_id == provider_id)
+    if is_llm is not None:
+        q = q.where(models.LLM.is_llm == is_llm)
+    llms, next_cursor = await pagination.fetch_page(db, q, models.LLM, limit, cursor)
+    _set_next_cursor(response, next_cursor)
+    return llms
 
 
 @app.get("/api/providers/{provider_id}/models", response_model=List[schemas.LLM])
-def get_provider_models(provider_id: str, db: Session = Depends(get_db)):
+async def get_provider_models(provider_id: str, db: AsyncSession = Depends(get_read_db)):
     """Get LLMs from DB for this provider."""
-    db_provider = db.query(models.Provider).filter(models.Provider.id == provider_id).first()
+    db_provider = await db.get(models.Provider, provider_id)
     if not db_provider:
         raise HTTPException(status_code=404, detail="Provider not found")
-    return db.query(models.LLM).filter(models.LLM.provider_id == provider_id).all()
+    result = await db.execute(select(models.LLM).where(models.LLM.provider_id == provider_id))
+    return result.scalars().all()
 
 
-@app.post("/api/providers/{provider_id}/models/refresh")
-def refresh_provider_models(provider_id: str, db: Session = Depends(get_db)):
-    """Fetch LLMs from remote provider and sync to DB."""
-    db_provider = db.query(models.Provider).filter(models.Provider.id == provider_id).first()
+@app.post(
+    "/api/providers/{provider_id}/models/refresh",
+    response_model=schemas.ProbeJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def refresh_provider_models(provider_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Start fetching LLMs from the remote provider. Only models missing from the
+    probe cache (or expired) are probed. Returns a job handle; poll
+    GET /api/providers/{provider_id}/models/refresh/{job_id} for progress.
+    """
+    db_provider = await db.get(models.Provider, provider_id)
     if not db_provider:
         raise HTTPException(status_code=404, detail="Provider not found")
     if not db_provider.api_key:
         raise HTTPException(status_code=400, detail="Provider has no API key configured")
 
-    try:
-        llm_list = _fetch_llms_from_provider(db_provider)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=f"Failed to fetch models from provider: {str(e)}"
-        )
+    base_url = db_provider.base_url
 
-    # Delete existing LLMs for this provider, then insert new ones
-    db.query(models.LLM).filter(models.LLM.provider_id == provider_id).delete()
-    for item in llm_list:
-        db_llm = models.LLM(
-            provider_id=provider_id,
-            remote_id=item["remote_id"],
-            is_llm=item.get("is_llm", True)
-        )
-        db.add(db_llm)
-    db.commit()
+    async def lookup(remote_ids: List[str]) -> dict:
+        return await _load_probe_cache(base_url, remote_ids)
+
+    async def on_done(job: probing.ProbeJob):
+        await _save_probe_results(job, base_url)
+
+    return probing.start_probe_job(
+        provider_id, base_url, db_provider.api_key, lookup=lookup, on_done=on_done
+    )
 
-    return {
-        "provider_id": provider_id,
-        "total_count": len(llm_list),
-        "models": [
-            {"id": m.id, "remote_id": m.remote_id, "provider_id": m.provider_id}
-            for m in db.query(models.LLM).filter(models.LLM.provider_id == provider_id).all()
-        ]
-    }
+
+@app.get("/api/providers/{provider_id}/models/refresh/{job_id}", response_model=schemas.ProbeJob)
+async def get_refresh_job(provider_id: str, job_id: str):
+    """Progress and partial results of a model refresh job."""
+    job = probing.get_job(job_id)
+    if not job or job.provider_id != provider_id:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job
 
 # --- Sessions ---
 
 @app.get("/api/sessions", response_model=List[schemas.Session])
-def get_sessions(db: Session = Depends(get_db)):
-    return db.query(models.Session).all()
+async def get_sessions(
+    response: Response,
+    user_id: Optional[str] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    order: pagination.Order = "asc",
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    q = select(models.Session)
+    if user_id:
+        q = q.where(models.Session.user_id == user_id)
+    if status_filter:
+        q = q.where(models.Session.status == status_filter)
+    sessions, next_cursor = await pagination.fetch_page(
+        db, q, models.Session, limit, cursor, descending=order == "desc"
+    )
+    _set_next_cursor(response, next_cursor)
+    return sessions
 
 @app.post("/api/sessions", response_model=schemas.Session)
-def create_session(session: schemas.SessionCreate, db: Session = Depends(get_db)):
+async def create_session(session: schemas.SessionCreate, db: AsyncSession = Depends(get_db)):
     db_session = models.Session(**session.dict())
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     return db_session
 
-@app.get("/api/sessions/{session_id}", response_model=schemas.SessionDetail)
-def get_session_detail(session_id: str, db: Session = Depends(get_db)):
-    session = db.query(models.Session).filter(models.Session.id == session_id).first()
+@app.get("/api/sessions/{session_id}", response_model=schemas.SessionDetail,
+         dependencies=[_conditional(session_parts=SESSION_PARTS)])
+async def get_session_detail(
+    session_id: str,
+    message_limit: pagination.Limit = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Session with its agents and messages in chronological order. With
+    `message_limit` only the latest messages are returned; page further back via
+    GET /api/sessions/{session_id}/messages?order=desc&cursor=<next_messages_cursor>.
+    """
+    result = await db.execute(
+        select(models.Session)
+        .options(selectinload(models.Session.session_agents))
+        .where(models.Session.id == session_id)
+    )
+    session = result.scalars().first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
 
-@app.patch("/api/sessions/{session_id}")
-def update_session(session_id: str, session: schemas.SessionBase, db: Session = Depends(get_db)):
-    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    await message_writer.wait_session(session_id)
+    messages, next_cursor = await pagination.fetch_page(
+        db, select(models.Message).where(models.Message.session_id == session_id),
+        models.Message, message_limit, None, descending=True,
+    )
+    detail = schemas.SessionDetail.model_validate({
+        **schemas.Session.model_validate(session).model_dump(),
+        "messages": [schemas.Message.model_validate(m) for m in reversed(messages)],
+        "session_agents": [schemas.SessionAgent.model_validate(sa) for sa in session.session_agents],
+        "next_messages_cursor": next_cursor,
+    })
+    return detail
+
+@app.get("/api/sessions/{session_id}/messages", response_model=List[schemas.Message],
+         dependencies=[_conditional(session_parts=("messages",))])
+async def get_session_messages(
+    session_id: str,
+    response: Response,
+    role: Optional[str] = Query(None),
+    msg_type: Optional[str] = Query(None),
+    order: pagination.Order = "asc",
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    since: Optional[str] = Query(None, description="Only messages after this one: a message id, or an ISO timestamp"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Keyset-paginated messages of a session, optionally filtered by role /
+    msg_type. `since` picks up what is new after the last message a client
+    has (e.g. after a chat turn), however long the session is.
+    """
+    await message_writer.wait_session(session_id)
+    q = select(models.Message).where(models.Message.session_id == session_id)
+    if since:
+        q = q.where(await _messages_since(db, session_id, since))
+    if role:
+        q = q.where(models.Message.role == role)
+    if msg_type:
+        q = q.where(models.Message.msg_type == msg_type)
+    messages, next_cursor = await pagination.fetch_page(
+        db, q, models.Message, limit, cursor, descending=order == "desc"
+    )
+    _set_next_cursor(response, next_cursor)
+    return messages
+
+async def _messages_since(db: AsyncSession, session_id: str, since: str):
+    try:
+        at = datetime.fromisoformat(since)
+    except ValueError:
+        anchor = (await db.execute(
+            select(models.Message.created_at, models.Message.id)
+            .where(models.Message.id == since, models.Message.session_id == session_id)
+        )).first()
+        if anchor is None:
+            raise HTTPException(status_code=400, detail="`since` is neither a message of this session nor a timestamp")
+        return pagination.after(models.Message, anchor.created_at, anchor.id)
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)  # created_at is naive UTC
+    return models.Message.created_at > at
+
+@app.post("/api/sessions/{session_id}/messages/import")
+async def import_session_messages(session_id: str, messages: List[schemas.MessageImport],
+                                  db: AsyncSession = Depends(get_read_db)):
+    """Bulk-insert a historical conversation through the message writer, in one transaction: all or nothing."""
+    if not await db.get(models.Session, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    rows = [
+        message_writer.message_row(session_id, m.role, m.content, **m.model_dump(exclude={"role", "content"}))
+        for m in messages
+    ]
+    try:
+        imported = await message_writer.write_many(rows)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Import failed, no messages were imported: {e}")
+    return {"imported": imported}
+
+@app.patch("/api/sessions/{session_id}", response_model=schemas.Session)
+async def update_session(session_id: str, session: schemas.SessionBase, db: AsyncSession = Depends(get_db)):
+    db_session = await db.get(models.Session, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
+
     if session.title:
         db_session.title = session.title
-    db.commit()
+    await db.commit()
+    await versions.bump(versions.session_scope(session_id, "meta"))
+    await db.refresh(db_session)
     return db_session
 
 @app.delete("/api/sessions/{session_id}")
-def delete_session(session_id: str, db: Session = Depends(get_db)):
-    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_db)):
+    # Before touching db: the writer may need the write connection to drain
+    await message_writer.wait_session(session_id)
+    db_session = await db.get(models.Session, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
-    db.delete(db_session)
-    db.commit()
+    # Bulk-delete children instead of loading them for the ORM cascade
+    await db.execute(delete(models.Message).where(models.Message.session_id == session_id))
+    await db.execute(delete(models.SessionAgent).where(models.SessionAgent.session_id == session_id))
+    await db.delete(db_session)
+    await db.commit()
+    await versions.bump(*(versions.session_scope(session_id, part) for part in SESSION_PARTS))
     return {"ok": True}
 
+# --- Workspace ---
+
+WORKSPACE_SCOPES = ("agents", "skills", "tools", "providers", "llms")
+
+
+async def _workspace(db: AsyncSession, session_id: Optional[str]) -> schemas.Workspace:
+    """Everything the agent sidebar shows, each entity once (schemas.Workspace), in one read session."""
+    session_agents = []
+    if session_id:
+        if not await db.get(models.Session, session_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        session_agents = (await db.scalars(
+            select(models.SessionAgent).where(models.SessionAgent.session_id == session_id)
+        )).all()
+
+    # Association rows instead of nested relationships: each skill and tool is serialized once
+    skill_ids: dict = {}
+    for agent_id, skill_id in await db.execute(
+        select(models.agents_skills.c.agent_id, models.agents_skills.c.skill_id)
+    ):
+        skill_ids.setdefault(agent_id, []).append(skill_id)
+    tool_ids: dict = {}
+    for skill_id, tool_id in await db.execute(
+        select(models.skills_tools.c.skill_id, models.skills_tools.c.tool_id)
+    ):
+        tool_ids.setdefault(skill_id, []).append(tool_id)
+
+    agents = {
+        agent.id: schemas.WorkspaceAgent.model_validate(agent, from_attributes=True).model_copy(
+            update={"skill_ids": skill_ids.get(agent.id, [])}
+        )
+        for agent in await db.scalars(select(models.Agent))
+    }
+    skills = {
+        skill.id: schemas.WorkspaceSkill(
+            id=skill.id, name=skill.name, description=skill.description, tool_ids=tool_ids.get(skill.id, [])
+        )
+        for skill in await db.scalars(
+            select(models.Skill).options(load_only(models.Skill.id, models.Skill.name, models.Skill.description))
+        )
+    }
+    return schemas.Workspace(
+        session_id=session_id,
+        agents=agents,
+        skills=skills,
+        tools={tool.id: tool for tool in await db.scalars(select(models.Tool))},
+        providers={provider.id: provider for provider in await db.scalars(select(models.Provider))},
+        llms={llm.id: llm for llm in await db.scalars(select(models.LLM))},
+        session_agents=session_agents,
+    )
+
+
+@app.get("/api/workspace", response_model=schemas.Workspace, dependencies=[_conditional(*WORKSPACE_SCOPES)])
+async def get_workspace(db: AsyncSession = Depends(get_read_db)):
+    """Agents, skills, tools, providers and LLMs, normalized (see /api/sessions/{id}/workspace)."""
+    return await _workspace(db, None)
+
+
+@app.get("/api/sessions/{session_id}/workspace", response_model=schemas.Workspace,
+         dependencies=[_conditional(*WORKSPACE_SCOPES, session_parts=("agents",))])
+async def get_session_workspace(session_id: str, db: AsyncSession = Depends(get_read_db)):
+    """
+    The agent sidebar's data in one request: agents, skills, tools, providers
+    and LLMs keyed by id, referencing each other by id, plus the session's
+    agents. Supports If-None-Match.
+    """
+    return await _workspace(db, session_id)
+
+# --- Search ---
+
+SEARCH_DEFAULT_LIMIT = 20
+
+
+@app.get("/api/search", response_model=List[schemas.SearchHit])
+async def search_all(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    kind: str = Query("messages", pattern="^(messages|agents|skills)$"),
+    session_id: Optional[str] = Query(None, description="Only this session's messages"),
+    limit: pagination.Limit = None,
+    cursor: pagination.Cursor = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Full-text search (search.py) over messages, agents or skills, most
+    relevant first. Pages through X-Next-Cursor like the listings.
+    """
+    if session_id:
+        await message_writer.wait_session(session_id)
+    hits, next_cursor = await search.search(
+        db, q, search.KINDS[kind], limit or SEARCH_DEFAULT_LIMIT, cursor,
+        session_id=session_id if kind == "messages" else None,
+    )
+    _set_next_cursor(response, next_cursor)
+    return hits
+
+
 # --- Session Agents & Topology ---
 
 @app.get("/api/sessions/{session_id}/agents", response_model=List[schemas.SessionAgent])
-def get_session_agents(session_id: str, db: Session = Depends(get_db)):
-    return db.query(models.SessionAgent).filter(models.SessionAgent.session_id == session_id).all()
+async def get_session_agents(session_id: str, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(models.SessionAgent).where(models.SessionAgent.session_id == session_id))
+    return result.scalars().all()
 
 @app.post("/api/sessions/{session_id}/agents", response_model=schemas.SessionAgent)
-def add_agent_to_session(session_id: str, agent_data: schemas.SessionAgentCreate, db: Session = Depends(get_db)):
+async def add_agent_to_session(session_id: str, agent_data: schemas.SessionAgentCreate, db: AsyncSession = Depends(get_db)):
     # 1. Verify session exists
-    session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    session = await db.get(models.Session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-        
+
     # 2. Create Session Agent Instance
     db_session_agent = models.SessionAgent(
         session_id=session_id,
@@ -336,135 +827,188 @@ def add_agent_to_session(session_id: str, agent_data: schemas.SessionAgentCreate
         override_model=agent_data.override_model
     )
     db.add(db_session_agent)
-    db.commit()
-    db.refresh(db_session_agent)
+    await db.commit()
+    await db.refresh(db_session_agent)
+    await versions.bump(versions.session_scope(session_id, "agents"))
     return db_session_agent
 
-@app.get("/api/sessions/{session_id}/graph")
-def get_session_graph(session_id: str, db: Session = Depends(get_db)):
-    session = db.query(models.Session).filter(models.Session.id == session_id).first()
+@app.get("/api/sessions/{session_id}/graph", dependencies=[_conditional(session_parts=("meta",))])
+async def get_session_graph(session_id: str, db: AsyncSession = Depends(get_read_db)):
+    session = await db.get(models.Session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Return parsed JSON or empty default
-    if session.graph_config:
-        return json.loads(session.graph_config)
-    return {"nodes": [], "edges": []}
+
+    return session.graph_config or {"nodes": [], "edges": []}
 
 @app.put("/api/sessions/{session_id}/graph")
-def update_session_graph(session_id: str, graph: dict, db: Session = Depends(get_db)):
-    session = db.query(models.Session).filter(models.Session.id == session_id).first()
+async def update_session_graph(session_id: str, graph: dict, db: AsyncSession = Depends(get_db)):
+    """
+    Validate and store a topology. Responds with the new graph version and the
+    compiled view (entry node, stages); 400 lists every problem found.
+    """
+    session = await db.get(models.Session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    session.graph_config = json.dumps(graph)
-    db.commit()
-    return {"ok": True}
+
+    try:
+        compiled = topology.validate(topology.compile_graph(graph))
+    except topology.GraphError as e:
+        raise HTTPException(status_code=400, detail=e.problems)
+
+    session.graph_config = graph
+    session.graph_version = (session.graph_version or 0) + 1
+    await db.commit()
+    topology.put_compiled(session.id, session.graph_version, compiled)
+    await versions.bump(versions.session_scope(session_id, "meta"))
+    return {"ok": True, "version": session.graph_version, **compiled.summary()}
 
 # --- Chat & Orchestration ---
 
 # --- SSE Stream Event Contract ---
-# event: thinking | text | handoff | end
+# event: thinking | start | text | tool_call | tool_result | handoff | end
 # data: JSON
 #
-# thinking: {"text": "..."}           - reasoning trace, append to thought block
-# text:     {"chunk": "x", "agent_id": "...", "agent_name": "..."}  - typewriter chunk
-# handoff:  {"from_agent_id", "from_agent_name", "to_agent_id", "to_agent_name"}  - agent switch
-# end:      {"message_id": "..."}      - stream complete
-
-def _sse_event(event: str, data: dict) -> str:
-    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+# thinking:    {"text": "..."}           - reasoning trace, append to thought block
+# start:       {"agent_id", "agent_name"}  - first agent to speak
+# text:        {"chunk": "..."}          - typewriter chunk (coalesced), from the current agent
+# tool_call:   {"call_id", "tool_name", "arguments", "agent_id"}  - the agent called a tool
+# tool_result: {"call_id", "tool_name", "content", "is_error", "elapsed_ms"}  - a call finished
+#              (calls of one round run concurrently: results arrive in completion order)
+# handoff:     {"from_agent_id", "from_agent_name", "to_agent_id", "to_agent_name"}  - agent switch
+# end:         {"message_id": "..."}      - stream complete; id of the saved reply ("" if none was saved),
+#              sent once it is committed: fetch newer messages with ?since=
+# snapshot:    {"content", "thought_process"}  - only when resuming past the replay buffer:
+#              the turn so far, replacing what the client has shown
+#
+# Every frame has an `id:` ("<run id>:<seq>"). A client that lost the stream
+# reconnects with that id as Last-Event-ID (GET /api/chat/stream/{session_id},
+# or the same POST) and receives the events it missed, then the live tail.
+#
+# Producers yield streaming.ChatEvent objects; streaming.sse_stream serializes
+# them and streaming.Transcript accumulates them for persistence.
 
 
-async def _mock_chat_stream(session_id: str, message: str) -> AsyncGenerator[str, None]:
-    """Mock streaming: thinking -> text (typewriter) -> handoff -> end."""
+async def _mock_chat_stream(session_id: str, message: str) -> AsyncGenerator[streaming.ChatEvent, None]:
+    """
+    Mock streaming: thinking -> text (typewriter) -> handoff -> end.
+    Used when the session has no agent with a configured model.
+    """
     # 1. Parse @mentions (mock)
     mentioned = [m.strip() for m in message.split() if m.startswith("@")]
     agents_involved = ["Router Agent", "Coder Agent"] if not mentioned else [m for m in mentioned if m]
 
     # 2. Thinking
-    yield _sse_event("thinking", {"text": f"User asked: '{message[:50]}...' Analyzing intent."})
+    yield streaming.Thinking(f"User asked: '{message[:50]}...' Analyzing intent.")
     await asyncio.sleep(0.5)
-    yield _sse_event("thinking", {"text": "Checking memory and context..."})
+    yield streaming.Thinking("Checking memory and context...")
     await asyncio.sleep(0.4)
-    yield _sse_event("thinking", {"text": "Drafting response..."})
+    yield streaming.Thinking("Drafting response...")
     await asyncio.sleep(0.3)
 
     # 3. Text (typewriter) - first agent
+    yield streaming.AgentStart("router", agents_involved[0] if agents_involved else "Assistant")
     full_text = f"[Mock] I received your message: {message}. "
-    for i, char in enumerate(full_text):
-        yield _sse_event("text", {"chunk": char, "agent_id": "router", "agent_name": agents_involved[0] if agents_involved else "Assistant"})
+    for char in full_text:
+        yield streaming.TextChunk(char)
         await asyncio.sleep(0.03)
 
     # 4. Handoff (if multiple agents)
     if len(agents_involved) > 1:
-        yield _sse_event("handoff", {
-            "from_agent_id": "router",
-            "from_agent_name": agents_involved[0],
-            "to_agent_id": "coder",
-            "to_agent_name": agents_involved[1],
-        })
+        yield streaming.Handoff("router", agents_involved[0], "coder", agents_involved[1])
         await asyncio.sleep(0.3)
         extra = " I'm the Coder Agent, ready to help with code."
         for char in extra:
-            yield _sse_event("text", {"chunk": char, "agent_id": "coder", "agent_name": agents_involved[1]})
+            yield streaming.TextChunk(char)
             await asyncio.sleep(0.02)
 
     # 5. End
-    yield _sse_event("end", {"message_id": ""})
+    yield streaming.End()
 
 
-@app.post("/api/chat/stream")
-async def chat_stream(request: schemas.ChatRequest, db: Session = Depends(get_db)):
+async def _prepare_chat_turn(db: AsyncSession, request: schemas.ChatRequest):
     """
-    SSE streaming chat. Saves user message, then streams: thinking -> text -> handoff? -> end.
+    Save the user message and load everything the orchestrator needs, so the
+    run itself never touches the ORM. Returns (plan, contexts, agent_id).
     """
-    session = db.query(models.Session).filter(models.Session.id == request.session_id).first()
+    session = await db.get(models.Session, request.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    user_msg = models.Message(
-        session_id=request.session_id,
-        role="user",
-        content=request.message,
-        msg_type="text",
-    )
-    db.add(user_msg)
-    db.commit()
-
-    session_agents = db.query(models.SessionAgent).filter(
-        models.SessionAgent.session_id == request.session_id
-    ).all()
-    agent_id = session_agents[0].original_agent_id if session_agents else None
-
-    async def _stream_with_save():
-        full_content: List[str] = []
-        async for sse_chunk in _mock_chat_stream(request.session_id, request.message):
-            if "event: text" in sse_chunk and "data:" in sse_chunk:
-                try:
-                    data_part = sse_chunk.split("data:", 1)[1].strip().split("\n")[0]
-                    j = json.loads(data_part)
-                    full_content.append(j.get("chunk", ""))
-                except (IndexError, json.JSONDecodeError):
-                    pass
-            yield sse_chunk
-
-        # Save assistant message after stream ends
-        content = "".join(full_content)
-        if content:
-            bot_msg = models.Message(
-                session_id=request.session_id,
-                role="assistant",
-                agent_id=agent_id,
-                content=content,
-                thought_process="[]",
-                msg_type="text",
+    session_agents = (await db.scalars(
+        select(models.SessionAgent).where(models.SessionAgent.session_id == request.session_id)
+    )).all()
+    # Before the user message is added: it is sent separately, after the history
+    contexts = await context_window.prepare(db, request.session_id, session_agents)
+
+    await message_writer.write([message_writer.message_row(request.session_id, "user", request.message)])
+
+    graph = topology.get_compiled(session.id, session.graph_version, session.graph_config)
+    agents = await agent_cache.resolve(db, session_agents)
+    plan = orchestrator.build_plan(graph, agents, request.target_agent_id)
+    if plan:
+        agent_id = plan.nodes[plan.order[0]].agent_id
+    else:
+        agent_id = session_agents[0].original_agent_id if session_agents else None
+    return plan, contexts, agent_id
+
+
+def _tool_messages(session_id: str, tool_events: list) -> List[dict]:
+    """tool_call / tool_result rows of a turn; a result's parent_id is its call's message."""
+    rows = []
+    call_rows = {}
+    last_at = None
+    for at, ev in tool_events:
+        # Event times, kept strictly increasing so the rows sort in the order they happened
+        if last_at is not None and at <= last_at:
+            at = last_at + timedelta(microseconds=1)
+        last_at = at
+        if isinstance(ev, streaming.ToolCall):
+            row = call_rows[ev.call_id] = message_writer.message_row(
+                session_id, "assistant",
+                jsoncodec.dumps({"call_id": ev.call_id, "name": ev.tool_name, "arguments": ev.arguments}),
+                agent_id=ev.agent_id, msg_type="tool_call", created_at=at,
+            )
+        else:
+            call = call_rows.get(ev.call_id)
+            row = message_writer.message_row(
+                session_id, "tool", ev.content,
+                agent_id=call["agent_id"] if call is not None else None,
+                msg_type="tool_result",
+                parent_id=call["id"] if call is not None else None,
+                created_at=at,
             )
-            db.add(bot_msg)
-            db.commit()
+        rows.append(row)
+    return rows
+
+
+async def _save_assistant_message(session_id: str, agent_id: Optional[str], content: str,
+                                  thought_process: list, tool_events: Optional[list] = None) -> str:
+    """Write the turn's tool messages and reply (message_writer); returns the reply's id."""
+    bot_row = message_writer.message_row(
+        session_id, "assistant", content, agent_id=agent_id, thought_process=thought_process,
+    )
+    await message_writer.write(_tool_messages(session_id, tool_events or []) + [bot_row])
+    return bot_row["id"]
+
+
+def _turn_finisher(session_id: str, agent_id: Optional[str], plan, save_empty: bool = False) -> runs.Finish:
+    """Persists a run's reply (also a partial one, after a stop) and schedules compaction."""
+    async def finish(transcript: streaming.Transcript, stopped: Optional[str]) -> Optional[str]:
+        if not (save_empty or transcript.content or transcript.tool_events):
+            return None
+        # Own session: the request's may already be closed by the time the run finishes
+        message_id = await _save_assistant_message(
+            session_id, agent_id, transcript.content, transcript.thought_process, transcript.tool_events
+        )
+        if plan:
+            context_window.schedule_compaction(session_id, plan.nodes.values())
+        return message_id
+    return finish
 
+
+def _sse_response(run: runs.Run, after: int = 0) -> StreamingResponse:
     return StreamingResponse(
-        _stream_with_save(),
+        streaming.sse_stream(run.stream(after)),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -474,69 +1018,87 @@ async def chat_stream(request: schemas.ChatRequest, db: Session = Depends(get_db
     )
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: schemas.ChatRequest, db: AsyncSession = Depends(get_read_db),
+                      last_event_id: Optional[str] = Header(None)):
+    """
+    SSE streaming chat. Saves user message, then runs the session's agent graph
+    and streams: thinking -> text -> handoff? -> end. The turn runs as a
+    registered run: /api/chat/stop, or a client gone for longer than the
+    resume grace period, cancels it. A retried POST carrying Last-Event-ID
+    reattaches to that run instead of starting another turn (410 once the
+    run is no longer kept: its reply is in the session's messages).
+    """
+    if last_event_id:
+        resumed = runs.resume(last_event_id, request.session_id)
+        if not resumed:
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Turn can no longer be resumed")
+        return _sse_response(*resumed)
+    plan, contexts, agent_id = await _prepare_chat_turn(db, request)
+    # Give the connection back now rather than when the stream ends
+    await db.close()
+    if plan:
+        events = orchestrator.run_plan(plan, request.message, contexts)
+    else:
+        events = _mock_chat_stream(request.session_id, request.message)
+    run = runs.start(request.session_id, events, _turn_finisher(request.session_id, agent_id, plan))
+    return _sse_response(run)
+
+
+@app.get("/api/chat/stream/{session_id}")
+async def chat_stream_attach(session_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Attach to the session's running turn (EventSource-compatible): from
+    Last-Event-ID when given, else from the start of the turn. 204 (which
+    also stops EventSource reconnects) when there is nothing to attach to.
+    """
+    resumed = runs.resume(last_event_id, session_id) if last_event_id else None
+    if resumed:
+        return _sse_response(*resumed)
+    active = runs.active(session_id)
+    if not active:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return _sse_response(active[-1])
+
+
 @app.post("/api/chat/send")
-def send_message(request: schemas.ChatRequest, db: Session = Depends(get_db)):
+async def send_message(request: schemas.ChatRequest, db: AsyncSession = Depends(get_read_db)):
     """
-    1. Saves user message
-    2. (Mock) Simulates Orchestrator deciding which agent to run
-    3. (Mock) Generates a response
+    Non-streaming chat: runs the same orchestration as /api/chat/stream and
+    saves the combined reply once every agent has finished (or the partial
+    reply, if the turn is stopped).
     """
-    
-    # 1. Save User Message
-    user_msg = models.Message(
-        session_id=request.session_id,
-        role="user",
-        content=request.message,
-        msg_type="text"
-    )
-    db.add(user_msg)
-    db.commit()
-    
-    # --- MOCK ORCHESTRATION LOGIC START ---
-    # In a real system, this would trigger a celery task or an async agent loop.
-    
-    # Let's see if we have agents in this session
-    session_agents = db.query(models.SessionAgent).filter(models.SessionAgent.session_id == request.session_id).all()
-    
-    response_content = "I am a simple echo. Configure agents to get real responses."
-    agent_id = None
-    thought_process = []
-    
-    if session_agents:
-        # Pick the first agent found in the session for demo purposes
-        active_agent = session_agents[0]
-        agent_id = active_agent.original_agent_id
-        
-        # Simulate thinking
-        thought_process = [
-            {"step": "plan", "text": f"User asked: '{request.message}'. I should respond."},
-            {"step": "retrieve", "text": "Checking memory context..."},
-            {"step": "generate", "text": "Drafting response..."}
-        ]
-        response_content = f" [Simulated Response from Agent] I received: {request.message}"
-
-    # 2. Save Assistant Response
-    bot_msg = models.Message(
-        session_id=request.session_id,
-        role="assistant",
-        agent_id=agent_id,
-        content=response_content,
-        thought_process=json.dumps(thought_process),
-        msg_type="text"
-    )
-    db.add(bot_msg)
-    db.commit()
-    # --- MOCK ORCHESTRATION LOGIC END ---
+    plan, contexts, agent_id = await _prepare_chat_turn(db, request)
+    await db.close()
+
+    if not plan:
+        message_id = await _save_assistant_message(
+            request.session_id, agent_id, "I am a simple echo. Configure agents to get real responses.", []
+        )
+        return {"status": "success", "new_message_id": message_id}
 
-    return {"status": "success", "new_message_id": bot_msg.id}
+    run = runs.start(
+        request.session_id,
+        orchestrator.run_plan(plan, request.message, contexts),
+        _turn_finisher(request.session_id, agent_id, plan, save_empty=True),
+    )
+    message_id = await run.wait()
+    return {"status": "stopped" if run.stopped else "success", "new_message_id": message_id}
 
 @app.post("/api/chat/stop")
-def stop_chat(request: schemas.ChatStopRequest):
-    # In a real system, this would send a signal to the running async task
-    return {"status": "stopped", "detail": "Signal sent to orchestrator."}
+async def stop_chat(request: schemas.ChatStopRequest):
+    """
+    Cancel the session's running turns: upstream LLM streams and tool calls
+    stop, and the partial replies are saved before this returns.
+    """
+    stopped = await runs.stop(request.session_id)
+    return {
+        "status": "stopped" if stopped else "idle",
+        "message_ids": [run.message_id for run in stopped if run.message_id],
+    }
 
 @app.get("/api/logs/{trace_id}")
-def get_trace_logs(trace_id: str):
+async def get_trace_logs(trace_id: str):
     # Mock data
     return {
         "trace_id": trace_id,
@@ -0,0 +1,205 @@
+"""
+Write-behind persistence of chat messages.
+
+Message inserts from every session go through one queue. A single flusher
+task takes what has queued up within GPOST_MESSAGE_FLUSH_INTERVAL of the
+first waiting write (at most GPOST_MESSAGE_BATCH_SIZE rows) and inserts it
+in one transaction, so concurrent turns share commits (and fsyncs) instead of
+paying one or two each.
+
+Durability (GPOST_MESSAGE_DURABILITY, or per call):
+
+- "sync": `write` returns once its batch has committed (group commit).
+- "async": `write` returns once the rows are queued; they are committed
+  within the flush interval, and lost if the process dies before that.
+
+Rows of one `write` call are committed together, and batches are committed in
+queue order. `message_row` stamps created_at so that a session's messages
+keep the order they were written in, even within one clock tick. Readers that
+must see a session's latest messages (prompt history, listings) call
+`wait_session` first; it returns at once when nothing is queued for the
+session.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+from . import models, versions
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_BATCH_SIZE = int(os.getenv("GPOST_MESSAGE_BATCH_SIZE", "500"))
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("GPOST_MESSAGE_FLUSH_INTERVAL", "0.005"))
+MESSAGE_DURABILITY = os.getenv("GPOST_MESSAGE_DURABILITY", "sync")  # sync | async
+# Writers wait for room once this many writes are queued
+MESSAGE_QUEUE_SIZE = int(os.getenv("GPOST_MESSAGE_QUEUE_SIZE", "10000"))
+
+_SESSION_CLOCKS = 10000
+_TICK = timedelta(microseconds=1)
+
+
+class _Write:
+    __slots__ = ("rows", "future")
+
+    def __init__(self, rows: List[dict], future: asyncio.Future):
+        self.rows = rows
+        self.future = future
+
+
+_queue: Optional[asyncio.Queue] = None
+_flusher: Optional[asyncio.Task] = None
+# Last queued write of each session that has uncommitted rows
+_last_write: Dict[str, asyncio.Future] = {}
+# Last created_at handed out per session
+_clocks: "OrderedDict[str, datetime]" = OrderedDict()
+_stats = {"writes": 0, "rows": 0, "batches": 0, "failed_writes": 0}
+
+
+def message_row(session_id: str, role: str, content: str, **fields) -> dict:
+    """A messages row for `write`, with its id and an order-preserving created_at filled in."""
+    created_at = fields.pop("created_at", None)
+    if created_at is None:
+        created_at = datetime.utcnow()
+        last = _clocks.get(session_id)
+        if last is not None and created_at <= last:
+            created_at = last + _TICK
+        _clocks[session_id] = created_at
+        _clocks.move_to_end(session_id)
+        if len(_clocks) > _SESSION_CLOCKS:
+            _clocks.popitem(last=False)
+    return {
+        "id": fields.pop("id", None) or str(uuid.uuid4()),
+        "session_id": session_id,
+        "role": role,
+        "content": content,
+        "msg_type": fields.pop("msg_type", None) or "text",
+        "created_at": created_at,
+        "agent_id": fields.pop("agent_id", None),
+        "thought_process": fields.pop("thought_process", None),
+        "parent_id": fields.pop("parent_id", None),
+        **fields,
+    }
+
+
+async def _insert(rows: List[dict]):
+    async with SessionLocal() as db:
+        await db.execute(insert(models.Message), rows)
+        await db.commit()
+
+
+async def _commit(writes: List[_Write]):
+    try:
+        await _insert([row for w in writes for row in w.rows])
+    except Exception as e:
+        if len(writes) > 1:
+            # Find the write that broke the batch; the others still go in, in order
+            for w in writes:
+                await _commit([w])
+            return
+        _stats["failed_writes"] += 1
+        writes[0].future.set_exception(e)
+        return
+    _stats["batches"] += 1
+    # Before the writers resume, so a read right after a write sees a new ETag
+    try:
+        await versions.bump(*{
+            versions.session_scope(row["session_id"], "messages") for w in writes for row in w.rows
+        })
+    except Exception:
+        logger.exception("Bumping message versions failed")
+    for w in writes:
+        w.future.set_result(None)
+
+
+async def _flush_loop():
+    while True:
+        first = await _queue.get()
+        if MESSAGE_FLUSH_INTERVAL > 0:
+            await asyncio.sleep(MESSAGE_FLUSH_INTERVAL)  # let concurrent turns join the batch
+        batch = [first]
+        size = len(first.rows)
+        while not _queue.empty() and size < MESSAGE_BATCH_SIZE:
+            w = _queue.get_nowait()
+            batch.append(w)
+            size += len(w.rows)
+        await _commit(batch)
+        for _ in batch:
+            _queue.task_done()
+
+
+def _settled(session_ids, future: asyncio.Future):
+    for session_id in session_ids:
+        if _last_write.get(session_id) is future:
+            del _last_write[session_id]
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Messages of session(s) %s not saved: %s", ", ".join(session_ids), future.exception())
+
+
+def start():
+    """Start the flusher (app startup); `write` also starts it on first use."""
+    global _queue, _flusher
+    if _flusher is None:
+        _queue = asyncio.Queue(MESSAGE_QUEUE_SIZE)
+        _flusher = asyncio.create_task(_flush_loop())
+
+
+async def stop():
+    """Commit everything still queued, then stop the flusher (app shutdown)."""
+    global _queue, _flusher
+    if _flusher is None:
+        return
+    await _queue.join()
+    _flusher.cancel()
+    await asyncio.gather(_flusher, return_exceptions=True)
+    _queue = _flusher = None
+
+
+async def _enqueue(rows: List[dict]) -> asyncio.Future:
+    if _flusher is None:
+        start()
+    future = asyncio.get_running_loop().create_future()
+    session_ids = {row["session_id"] for row in rows}
+    for session_id in session_ids:
+        _last_write[session_id] = future
+    future.add_done_callback(lambda f: _settled(session_ids, f))
+    _stats["writes"] += 1
+    _stats["rows"] += len(rows)
+    await _queue.put(_Write(rows, future))
+    return future
+
+
+async def write(rows: List[dict], durable: Optional[bool] = None):
+    """Queue rows (see `message_row`) to be inserted together; when durable (sync mode) wait for the commit."""
+    if not rows:
+        return
+    future = await _enqueue(rows)
+    if durable if durable is not None else MESSAGE_DURABILITY != "async":
+        await asyncio.shield(future)
+
+
+async def write_many(rows: List[dict]) -> int:
+    """
+    Bulk path (imports): every row in one transaction, so the import is
+    committed whole or not at all; waits for the commit.
+    """
+    if rows:
+        await asyncio.shield(await _enqueue(rows))
+    return len(rows)
+
+
+async def wait_session(session_id: str):
+    """Wait until every message queued for the session so far is committed (or failed)."""
+    future = _last_write.get(session_id)
+    if future is not None:
+        await asyncio.wait([future])
+
+
+def stats() -> dict:
+    return {**_stats, "queued": _queue.qsize() if _queue is not None else 0}
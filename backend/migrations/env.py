@@ -0,0 +1,75 @@
+"""
+Alembic environment.
+
+Runs on a connection handed over by database.init_db (config.attributes
+["connection"]) when the app migrates itself on startup; otherwise it opens
+its own async engine, so the same async drivers are used either way.
+"""
+import asyncio
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend import models  # noqa: F401  (registers every table on Base.metadata)
+from backend.database import SQLALCHEMY_DATABASE_URL, Base, async_url
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def _database_url() -> str:
+    return async_url(config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL)
+
+
+# Full-text search objects (migration 0008) live outside models.py
+SEARCH_TABLE_PREFIXES = ("search_docs", "search_fts")
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and name.startswith(SEARCH_TABLE_PREFIXES):
+        return False
+    if type_ == "column" and name == "search_vector":
+        return False
+    if type_ == "index" and reflected and name.endswith("_search_vector"):
+        return False
+    return True
+
+
+def _configure(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite cannot ALTER most things in place; batch mode recreates the table
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+
+
+def do_run_migrations(connection):
+    _configure(connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    context.configure(url=_database_url(), target_metadata=target_metadata, literal_binds=True,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(_database_url())
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
+    await engine.dispose()
+
+
+connection = config.attributes.get("connection")
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    do_run_migrations(connection)
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,132 @@
+"""initial schema
+
+The tables as they were created by Base.metadata.create_all before migrations
+were introduced.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tools",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("schema", sa.Text()),
+        sa.Column("credential_config", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_tools_id", "tools", ["id"])
+
+    op.create_table(
+        "providers",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("base_url", sa.String()),
+        sa.Column("api_key", sa.String()),
+        sa.Column("is_active", sa.Boolean()),
+    )
+    op.create_index("ix_providers_id", "providers", ["id"])
+
+    op.create_table(
+        "llms",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("provider_id", sa.String(), sa.ForeignKey("providers.id"), nullable=False),
+        sa.Column("remote_id", sa.String(), nullable=False),
+        sa.Column("is_llm", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_llms_id", "llms", ["id"])
+
+    op.create_table(
+        "skills",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("prompt", sa.Text()),
+        sa.Column("code", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_skills_id", "skills", ["id"])
+
+    op.create_table(
+        "agents",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("role", sa.String()),
+        sa.Column("avatar", sa.String()),
+        sa.Column("description", sa.Text()),
+        sa.Column("model_id", sa.String(), sa.ForeignKey("llms.id"), nullable=True),
+        sa.Column("model_provider", sa.String(), nullable=True),
+        sa.Column("model_name", sa.String(), nullable=True),
+        sa.Column("temperature", sa.Float()),
+        sa.Column("system_prompt", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_agents_id", "agents", ["id"])
+
+    op.create_table(
+        "sessions",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("user_id", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("graph_config", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_sessions_id", "sessions", ["id"])
+
+    op.create_table(
+        "session_agents",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("session_id", sa.String(), sa.ForeignKey("sessions.id")),
+        sa.Column("original_agent_id", sa.String(), sa.ForeignKey("agents.id"), nullable=True),
+        sa.Column("override_system_prompt", sa.Text(), nullable=True),
+        sa.Column("override_model", sa.String(), nullable=True),
+        sa.Column("memory_context", sa.Text()),
+    )
+    op.create_index("ix_session_agents_id", "session_agents", ["id"])
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("session_id", sa.String(), sa.ForeignKey("sessions.id")),
+        sa.Column("role", sa.String()),
+        sa.Column("agent_id", sa.String(), sa.ForeignKey("agents.id"), nullable=True),
+        sa.Column("content", sa.Text()),
+        sa.Column("thought_process", sa.Text()),
+        sa.Column("msg_type", sa.String()),
+        sa.Column("parent_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+
+    op.create_table(
+        "skills_tools",
+        sa.Column("skill_id", sa.String(), sa.ForeignKey("skills.id"), primary_key=True),
+        sa.Column("tool_id", sa.String(), sa.ForeignKey("tools.id"), primary_key=True),
+        sa.Column("config", sa.Text(), nullable=True),
+    )
+    op.create_table(
+        "agents_skills",
+        sa.Column("agent_id", sa.String(), sa.ForeignKey("agents.id"), primary_key=True),
+        sa.Column("skill_id", sa.String(), sa.ForeignKey("skills.id"), primary_key=True),
+        sa.Column("enabled", sa.Boolean()),
+    )
+
+
+def downgrade():
+    for table in ("agents_skills", "skills_tools", "messages", "session_agents", "sessions",
+                  "agents", "skills", "llms", "providers", "tools"):
+        op.drop_table(table)
@@ -0,0 +1,30 @@
+"""model probe cache
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "model_probes",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("base_url", sa.String(), nullable=False),
+        sa.Column("remote_id", sa.String(), nullable=False),
+        sa.Column("is_llm", sa.Boolean(), nullable=False),
+        sa.Column("probed_at", sa.DateTime()),
+        sa.UniqueConstraint("base_url", "remote_id"),
+    )
+    op.create_index("ix_model_probes_id", "model_probes", ["id"])
+
+
+def downgrade():
+    op.drop_table("model_probes")
@@ -0,0 +1,40 @@
+"""indexes for hot foreign keys and keyset pagination
+
+Databases created by create_all after these indexes were declared already
+have some of them, hence if_not_exists.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_session_created_at_id", "messages", ["session_id", "created_at", "id"]),
+    ("ix_session_agents_session_id", "session_agents", ["session_id"]),
+    ("ix_llms_provider_created_at_id", "llms", ["provider_id", "created_at", "id"]),
+    ("ix_sessions_created_at_id", "sessions", ["created_at", "id"]),
+    ("ix_sessions_user_created_at_id", "sessions", ["user_id", "created_at", "id"]),
+    ("ix_sessions_status_created_at_id", "sessions", ["status", "created_at", "id"]),
+    ("ix_agents_created_at_id", "agents", ["created_at", "id"]),
+    ("ix_agents_role_created_at_id", "agents", ["role", "created_at", "id"]),
+    ("ix_agents_model_id", "agents", ["model_id"]),
+    ("ix_tools_created_at_id", "tools", ["created_at", "id"]),
+    ("ix_skills_tools_tool_id", "skills_tools", ["tool_id"]),
+    ("ix_agents_skills_skill_id", "agents_skills", ["skill_id"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,64 @@
+"""native JSON columns
+
+Tool.schema, Tool.credential_config, Session.graph_config and
+Message.thought_process were JSON serialized into Text. Values that do not
+parse are cleared first (a thought_process that is plain text is kept as a
+JSON string) so the Postgres cast to JSONB cannot fail.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+# (table, column, keep text that is not JSON as a JSON string)
+COLUMNS = [
+    ("tools", "schema", False),
+    ("tools", "credential_config", False),
+    ("sessions", "graph_config", False),
+    ("messages", "thought_process", True),
+]
+
+
+def _clean(conn, table: str, column: str, keep_text: bool):
+    t = sa.table(table, sa.column("id", sa.String()), sa.column(column, sa.Text()))
+    col = t.c[column]
+    fixes = []
+    for row_id, raw in conn.execute(sa.select(t.c.id, col).where(col.isnot(None))):
+        try:
+            json.loads(raw)
+        except ValueError:
+            fixes.append({"row_id": row_id, "value": json.dumps(raw) if keep_text and raw else None})
+    if fixes:
+        conn.execute(t.update().where(t.c.id == sa.bindparam("row_id")).values({column: sa.bindparam("value")}), fixes)
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table, column, keep_text in COLUMNS:
+        _clean(conn, table, column, keep_text)
+    _alter(JSON_TYPE, sa.Text(), "jsonb")
+
+
+def downgrade():
+    _alter(sa.Text(), JSON_TYPE, "text")
+
+
+def _alter(type_, existing_type, cast: str):
+    # One batch per table: on SQLite each batch copies the whole table
+    for table in dict.fromkeys(table for table, _, _ in COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            for column in (c for t, c, _ in COLUMNS if t == table):
+                batch.alter_column(column, type_=type_, existing_type=existing_type,
+                                   postgresql_using=f"{column}::{cast}")
@@ -0,0 +1,44 @@
+"""memory_context as a JSON column
+
+Holds the running summary and checkpoint of context_window.py. Existing
+values that are not JSON are kept as JSON strings (read back as a summary).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+def upgrade():
+    conn = op.get_bind()
+    t = sa.table("session_agents", sa.column("id", sa.String()), sa.column("memory_context", sa.Text()))
+    fixes = []
+    for row_id, raw in conn.execute(sa.select(t.c.id, t.c.memory_context).where(t.c.memory_context.isnot(None))):
+        try:
+            json.loads(raw)
+        except ValueError:
+            fixes.append({"row_id": row_id, "value": json.dumps(raw) if raw else None})
+    if fixes:
+        conn.execute(t.update().where(t.c.id == sa.bindparam("row_id"))
+                     .values(memory_context=sa.bindparam("value")), fixes)
+    with op.batch_alter_table("session_agents") as batch:
+        batch.alter_column("memory_context", type_=JSON_TYPE, existing_type=sa.Text(),
+                           postgresql_using="memory_context::jsonb")
+
+
+def downgrade():
+    with op.batch_alter_table("session_agents") as batch:
+        batch.alter_column("memory_context", type_=sa.Text(), existing_type=JSON_TYPE,
+                           postgresql_using="memory_context::text")
@@ -0,0 +1,44 @@
+"""skills_tools.config as a JSON column
+
+The per-binding tool settings read by tool_executor.py. The column was never
+written before, so values that are not JSON are dropped.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+def upgrade():
+    conn = op.get_bind()
+    t = sa.table("skills_tools", sa.column("skill_id", sa.String()), sa.column("tool_id", sa.String()),
+                 sa.column("config", sa.Text()))
+    invalid = []
+    for skill_id, tool_id, raw in conn.execute(sa.select(t.c.skill_id, t.c.tool_id, t.c.config)
+                                               .where(t.c.config.isnot(None))):
+        try:
+            json.loads(raw)
+        except ValueError:
+            invalid.append({"s": skill_id, "t": tool_id})
+    if invalid:
+        conn.execute(t.update().where(t.c.skill_id == sa.bindparam("s"), t.c.tool_id == sa.bindparam("t"))
+                     .values(config=None), invalid)
+    with op.batch_alter_table("skills_tools") as batch:
+        batch.alter_column("config", type_=JSON_TYPE, existing_type=sa.Text(), postgresql_using="config::jsonb")
+
+
+def downgrade():
+    with op.batch_alter_table("skills_tools") as batch:
+        batch.alter_column("config", type_=sa.Text(), existing_type=JSON_TYPE, postgresql_using="config::text")
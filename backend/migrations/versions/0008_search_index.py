@@ -0,0 +1,126 @@
+"""full-text search index over messages, agents and skills
+
+SQLite: one contentless FTS5 table, search_fts(kind, title, body), whose
+rowids come from search_docs (an INTEGER PRIMARY KEY, so VACUUM cannot
+renumber them, unlike the implicit rowids of the text-keyed tables). Triggers
+on messages, agents and skills keep both up to date on every write, whatever
+the write path.
+
+Postgres: a generated tsvector column (search_vector) with a GIN index on
+each of the three tables.
+
+Neither is declared in models.py (migrations/env.py leaves them out of
+autogenerate). A later batch migration that recreates messages, agents or
+skills on SQLite drops their triggers: it must create them again (TRIGGERS).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+# kind -> (table, title expression, body expression); `{row}` is new/old in triggers
+SOURCES = {
+    "message": ("messages", "''", "coalesce({row}.content, '')"),
+    "agent": (
+        "agents", "coalesce({row}.name, '')",
+        "coalesce({row}.description, '') || ' ' || coalesce({row}.system_prompt, '')",
+    ),
+    "skill": (
+        "skills", "coalesce({row}.name, '')",
+        "coalesce({row}.description, '') || ' ' || coalesce({row}.prompt, '')",
+    ),
+}
+UPDATE_COLUMNS = {"message": "content", "agent": "name, description, system_prompt", "skill": "name, description, prompt"}
+
+
+def _triggers(kind: str):
+    table, title, body = SOURCES[kind]
+    new = {"title": title.format(row="new"), "body": body.format(row="new")}
+    old = {"title": title.format(row="old"), "body": body.format(row="old")}
+    # A contentless FTS5 row is removed by inserting the 'delete' command with its indexed values
+    delete_old = (
+        f"INSERT INTO search_fts(search_fts, rowid, kind, title, body) "
+        f"SELECT 'delete', rowid, '{kind}', {old['title']}, {old['body']} "
+        f"FROM search_docs WHERE kind = '{kind}' AND ref_id = old.id;"
+    )
+    return [
+        f"""CREATE TRIGGER search_{table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO search_docs(kind, ref_id) VALUES ('{kind}', new.id);
+            INSERT INTO search_fts(rowid, kind, title, body)
+                VALUES (last_insert_rowid(), '{kind}', {new['title']}, {new['body']});
+        END""",
+        f"""CREATE TRIGGER search_{table}_ad AFTER DELETE ON {table} BEGIN
+            {delete_old}
+            DELETE FROM search_docs WHERE kind = '{kind}' AND ref_id = old.id;
+        END""",
+        f"""CREATE TRIGGER search_{table}_au AFTER UPDATE OF {UPDATE_COLUMNS[kind]} ON {table} BEGIN
+            {delete_old}
+            INSERT INTO search_fts(rowid, kind, title, body)
+                SELECT rowid, '{kind}', {new['title']}, {new['body']}
+                FROM search_docs WHERE kind = '{kind}' AND ref_id = new.id;
+        END""",
+    ]
+
+
+TRIGGERS = {kind: _triggers(kind) for kind in SOURCES}
+
+PG_VECTORS = {
+    "messages": "to_tsvector('simple', coalesce(content, ''))",
+    "agents": (
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(system_prompt, '')), 'C')"
+    ),
+    "skills": (
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(prompt, '')), 'C')"
+    ),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for table, vector in PG_VECTORS.items():
+            op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+            op.execute(f"CREATE INDEX ix_{table}_search_vector ON {table} USING gin (search_vector)")
+        return
+    if dialect != "sqlite":
+        return
+
+    op.execute("CREATE TABLE search_docs (rowid INTEGER PRIMARY KEY, kind TEXT NOT NULL, ref_id TEXT NOT NULL, "
+               "UNIQUE (kind, ref_id))")
+    op.execute("CREATE VIRTUAL TABLE search_fts USING fts5(kind, title, body, content='', "
+               "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    for kind, (table, title, body) in SOURCES.items():
+        op.execute(f"INSERT INTO search_docs(kind, ref_id) SELECT '{kind}', id FROM {table}")
+        op.execute(
+            f"INSERT INTO search_fts(rowid, kind, title, body) "
+            f"SELECT d.rowid, '{kind}', {title.format(row='t')}, {body.format(row='t')} "
+            f"FROM search_docs d JOIN {table} t ON t.id = d.ref_id WHERE d.kind = '{kind}'"
+        )
+        for trigger in TRIGGERS[kind]:
+            op.execute(trigger)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for table in PG_VECTORS:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+        return
+    if dialect != "sqlite":
+        return
+    for table, _, _ in SOURCES.values():
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS search_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_fts")
+    op.execute("DROP TABLE IF EXISTS search_docs")
@@ -0,0 +1,26 @@
+"""agents.cache_completions
+
+Per-agent opt-in to the completion cache (completion_cache.py). A plain
+ADD COLUMN, not a batch migration: recreating agents on SQLite would drop
+its search triggers (0008).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("agents", sa.Column("cache_completions", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    # SQLite (3.35+) drops a column in place, without recreating the table
+    op.drop_column("agents", "cache_completions")
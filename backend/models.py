@@ -1,25 +1,29 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, DateTime, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, Float, DateTime, Table, UniqueConstraint, Index, JSON, false
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 from datetime import datetime
 from .database import Base
 
+# JSONB on Postgres, JSON (text storage) elsewhere; encoded/decoded by jsoncodec.
+# None is stored as SQL NULL, also by the bulk inserts of message_writer.
+JSONType = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
 # --- Association Tables ---
 
 # Many-to-Many: Skills <-> Tools
 skills_tools = Table(
     'skills_tools', Base.metadata,
     Column('skill_id', String, ForeignKey('skills.id'), primary_key=True),
-    Column('tool_id', String, ForeignKey('tools.id'), primary_key=True),
-    Column('config', Text, nullable=True) # Storing JSON as Text for SQLite compatibility, use JSONB for Postgres
+    Column('tool_id', String, ForeignKey('tools.id'), primary_key=True, index=True),  # PK only serves skill_id lookups
+    Column('config', JSONType, nullable=True)  # tool_executor settings: handler, timeout, max_concurrency
 )
 
 # Many-to-Many: Agents <-> Skills
 agents_skills = Table(
     'agents_skills', Base.metadata,
     Column('agent_id', String, ForeignKey('agents.id'), primary_key=True),
-    Column('skill_id', String, ForeignKey('skills.id'), primary_key=True),
+    Column('skill_id', String, ForeignKey('skills.id'), primary_key=True, index=True),  # PK only serves agent_id lookups
     Column('enabled', Boolean, default=True)
 )
 
@@ -31,12 +35,14 @@ class Tool(Base):
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
     description = Column(Text)
-    schema = Column(Text) # JSON stored as string
-    credential_config = Column(Text) # JSON stored as string
+    schema = Column(JSONType)
+    credential_config = Column(JSONType)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     skills = relationship("Skill", secondary=skills_tools, back_populates="tools")
 
+    __table_args__ = (Index("ix_tools_created_at_id", "created_at", "id"),)
+
 
 class Provider(Base):
     __tablename__ = "providers"
@@ -63,7 +69,26 @@ class LLM(Base):
     provider = relationship("Provider", back_populates="llms")
     agents = relationship("Agent", back_populates="model")
 
-    __table_args__ = ({"sqlite_autoincrement": False},)
+    __table_args__ = (
+        Index("ix_llms_provider_created_at_id", "provider_id", "created_at", "id"),
+        {"sqlite_autoincrement": False},
+    )
+
+
+class ModelProbe(Base):
+    """
+    Cached result of probing a remote model for chat capability.
+    Keyed by base_url so providers pointing at the same endpoint share verdicts.
+    """
+    __tablename__ = "model_probes"
+
+    id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
+    base_url = Column(String, nullable=False)
+    remote_id = Column(String, nullable=False)
+    is_llm = Column(Boolean, nullable=False)
+    probed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("base_url", "remote_id"),)
 
 
 class Skill(Base):
@@ -90,10 +115,12 @@ class Agent(Base):
     description = Column(Text)
 
     # LLM Config: link to Provider's LLM
-    model_id = Column(String, ForeignKey("llms.id"), nullable=True)
+    model_id = Column(String, ForeignKey("llms.id"), nullable=True, index=True)
     model_provider = Column(String, nullable=True)  # deprecated, kept for backward compat
     model_name = Column(String, nullable=True)  # deprecated, kept for backward compat
     temperature = Column(Float, default=0.7)
+    # Opt-in: reuse completions of identical requests while temperature is 0 (completion_cache.py)
+    cache_completions = Column(Boolean, nullable=False, default=False, server_default=false())
 
     system_prompt = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -101,6 +128,11 @@ class Agent(Base):
     model = relationship("LLM", back_populates="agents")
     skills = relationship("Skill", secondary=agents_skills, back_populates="agents")
 
+    __table_args__ = (
+        Index("ix_agents_created_at_id", "created_at", "id"),
+        Index("ix_agents_role_created_at_id", "role", "created_at", "id"),
+    )
+
 
 class Session(Base):
     __tablename__ = "sessions"
@@ -111,7 +143,9 @@ class Session(Base):
     status = Column(String, default="active")
     
     # Topology: { "nodes": [], "edges": [] }
-    graph_config = Column(Text) # JSON stored as string
+    graph_config = Column(JSONType)
+    # Bumped on every graph update; keys the compiled topology cache (topology.py)
+    graph_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -119,6 +153,13 @@ class Session(Base):
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
     session_agents = relationship("SessionAgent", back_populates="session", cascade="all, delete-orphan")
 
+    # Keyset pagination indexes for the session list and its filters
+    __table_args__ = (
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+        Index("ix_sessions_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_sessions_status_created_at_id", "status", "created_at", "id"),
+    )
+
 
 class SessionAgent(Base):
     """
@@ -128,7 +169,7 @@ class SessionAgent(Base):
     __tablename__ = "session_agents"
 
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, ForeignKey("sessions.id"))
+    session_id = Column(String, ForeignKey("sessions.id"), index=True)
     original_agent_id = Column(String, ForeignKey("agents.id"), nullable=True)
     
     # Instance overrides
@@ -136,7 +177,7 @@ class SessionAgent(Base):
     override_model = Column(String, nullable=True)
     
     # State
-    memory_context = Column(Text) # JSON summary/short-term memory
+    memory_context = Column(JSONType)  # running summary + checkpoint, see context_window.py
     
     session = relationship("Session", back_populates="session_agents")
     original_agent = relationship("Agent")
@@ -154,7 +195,7 @@ class Message(Base):
     content = Column(Text)
     
     # Structured data for UI: [{ "step": "thinking", "text": "..." }]
-    thought_process = Column(Text) # JSON stored as string
+    thought_process = Column(JSONType)
     
     msg_type = Column(String, default="text") # text, tool_call, tool_result, error
     parent_id = Column(String, nullable=True)
@@ -162,4 +203,7 @@ class Message(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("Session", back_populates="messages")
-    agent = relationship("Agent")
\ No newline at end of file
+    agent = relationship("Agent")
+
+    # Serves both "messages of a session in order" and keyset pages of them
+    __table_args__ = (Index("ix_messages_session_created_at_id", "session_id", "created_at", "id"),)
\ No newline at end of file
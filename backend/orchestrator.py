@@ -0,0 +1,304 @@
+"""
+Async orchestration of a session's agent graph.
+
+`build_plan` turns a session's compiled graph (topology.py) and SessionAgents
+into a DAG of runnable agents (graph nodes without an agent, like
+"start"/"end", are folded away). `run_plan` executes it: every agent node
+becomes a task that waits for its upstream agents, so independent branches
+stream from their providers concurrently. Output is emitted in topological order — a node's chunks are
+buffered while an earlier node is still streaming — as streaming.ChatEvent
+objects following the SSE contract documented in main.py.
+"""
+import asyncio
+import os
+import re
+from typing import AsyncGenerator, Dict, List, Optional
+
+from . import completion_cache, provider_clients, tool_executor
+from .streaming import AgentStart, ChatEvent, End, Handoff, TextChunk, Thinking
+from .tool_executor import ToolBinding
+from .topology import CompiledGraph
+
+LLM_TIMEOUT = float(os.getenv("GPOST_LLM_TIMEOUT", "120"))
+TOOL_MAX_ROUNDS = int(os.getenv("GPOST_TOOL_MAX_ROUNDS", "5"))
+
+
+class AgentNode:
+    """Everything needed to call one agent, detached from the ORM session."""
+
+    def __init__(self, node_id: str, agent_id: str, agent_name: str, model: str,
+                 temperature: Optional[float], system_prompt: str,
+                 base_url: Optional[str], api_key: str, tools: Optional[Dict[str, ToolBinding]] = None,
+                 provider_id: Optional[str] = None, cache_completions: bool = False):
+        self.node_id = node_id
+        self.agent_id = agent_id
+        self.agent_name = agent_name
+        self.model = model
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+        self.base_url = base_url
+        self.api_key = api_key
+        self.tools = tools or {}  # function name -> ToolBinding
+        self.provider_id = provider_id
+        self.cache_completions = cache_completions
+
+
+class RunPlan:
+    def __init__(self, nodes: Dict[str, AgentNode], preds: Dict[str, List[str]], order: List[str]):
+        self.nodes = nodes
+        self.preds = preds
+        self.order = order
+
+    def __bool__(self):
+        return bool(self.order)
+
+
+def _as_dict(value) -> Optional[dict]:
+    return value if isinstance(value, dict) else None
+
+
+def tool_spec(tool) -> dict:
+    """OpenAI function-tool definition of a Tool; a schema that already is one is used as is."""
+    schema = tool.schema if isinstance(tool.schema, dict) else {}
+    if schema.get("type") == "function" and "function" in schema:
+        return schema
+    return {
+        "type": "function",
+        "function": {
+            "name": re.sub(r"[^a-zA-Z0-9_-]", "_", tool.name)[:64],
+            "description": tool.description or "",
+            "parameters": schema or {"type": "object", "properties": {}},
+        },
+    }
+
+
+def resolve_agent(session_agent, tool_configs: Optional[Dict[tuple, dict]] = None) -> Optional[AgentNode]:
+    """
+    Effective config of a SessionAgent (skills with their tools, model and
+    provider loaded), or None if it has no usable model. `tool_configs` holds
+    skills_tools.config by (skill_id, tool_id). Cached by agent_cache.
+    """
+    agent = session_agent.original_agent
+    if agent is None or agent.model is None or agent.model.provider is None:
+        return None
+    provider = agent.model.provider
+    if not provider.is_active:
+        return None
+    prompts = [session_agent.override_system_prompt or agent.system_prompt or ""]
+    prompts += [skill.prompt for skill in agent.skills if skill.prompt]
+    tools: Dict[str, ToolBinding] = {}
+    for skill in agent.skills:
+        for tool in skill.tools:
+            spec = tool_spec(tool)
+            tools.setdefault(spec["function"]["name"], ToolBinding(
+                tool.id, tool.name, spec,
+                config=_as_dict((tool_configs or {}).get((skill.id, tool.id))),
+                credentials=_as_dict(tool.credential_config),
+                skill_id=skill.id,
+                skill_code=skill.code,
+            ))
+    return AgentNode(
+        node_id=session_agent.id,
+        agent_id=agent.id,
+        agent_name=agent.name or "Assistant",
+        model=session_agent.override_model or agent.model.remote_id,
+        temperature=agent.temperature,
+        system_prompt="\n\n".join(p for p in prompts if p),
+        base_url=provider.base_url,
+        api_key=provider.api_key or "",
+        tools=tools,
+        provider_id=provider.id,
+        cache_completions=bool(agent.cache_completions),
+    )
+
+
+def build_plan(graph: CompiledGraph, agents: List[AgentNode], target_agent_id: Optional[str] = None) -> RunPlan:
+    """
+    Map graph nodes to the session's runnable agents and reduce the graph to
+    agent-only edges. A node matches an agent by an explicit "agent_id", by the
+    session agent / original agent id, or by the agent's name as its label.
+    Without a usable graph the first agent answers alone. Nodes caught in a
+    cycle are never scheduled.
+    """
+    if not agents:
+        return RunPlan({}, {}, [])
+
+    lookup = {}
+    for node in agents:
+        lookup[node.node_id] = node
+        lookup[node.agent_id] = node
+        lookup[node.agent_name] = node
+
+    node_agent: Dict[str, AgentNode] = {}
+    for n in graph.nodes:
+        node_id = n["id"]
+        for key in (n.get("agent_id"), node_id, n.get("label")):
+            if key and key in lookup:
+                node_agent[node_id] = lookup[key]
+                break
+
+    if not node_agent:
+        node = agents[0]
+        return RunPlan({node.node_id: node}, {node.node_id: []}, [node.node_id])
+
+    reduction = graph.reduce(node_agent)
+    order, preds = reduction.order, reduction.preds
+
+    if target_agent_id:
+        starts = [nid for nid, node in node_agent.items() if target_agent_id in (nid, node.agent_id, node.node_id)]
+        if starts:
+            keep, stack = set(), list(starts)
+            while stack:
+                nid = stack.pop()
+                if nid not in keep:
+                    keep.add(nid)
+                    stack.extend(reduction.succ[nid])
+            order = [nid for nid in order if nid in keep]
+            preds = {nid: [p for p in preds[nid] if p in keep] for nid in order}
+
+    return RunPlan({nid: node_agent[nid] for nid in order}, preds, order)
+
+
+def _build_messages(node: AgentNode, history: List[dict], message: str, upstream: List[tuple]) -> List[dict]:
+    messages = []
+    if node.system_prompt:
+        messages.append({"role": "system", "content": node.system_prompt})
+    messages.extend(history)
+    messages.append({"role": "user", "content": message})
+    if upstream:
+        context = "\n\n".join(f"[{name}]\n{text}" for name, text in upstream if text)
+        if context:
+            messages.append({"role": "system", "content": f"Responses from upstream agents:\n\n{context}"})
+    return messages
+
+
+async def _complete(client, node: AgentNode, messages: List[dict], kwargs: dict, parts: List[str],
+                    out: asyncio.Queue, cache_key: Optional[str]) -> Dict[int, dict]:
+    """Stream one completion from the provider into `out`; returns its tool calls by index."""
+    stream = await client.chat.completions.create(
+        model=node.model, messages=messages, stream=True, timeout=LLM_TIMEOUT, **kwargs
+    )
+    calls: Dict[int, dict] = {}
+    chunks: List[list] = []  # recorded for completion_cache
+    # Closes the response if the run is cancelled mid-stream, so the provider stops generating
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            reasoning = getattr(delta, "reasoning_content", None)
+            if reasoning:
+                chunks.append(["thinking", reasoning])
+                await out.put(Thinking(reasoning))
+            if delta.content:
+                chunks.append(["text", delta.content])
+                parts.append(delta.content)
+                await out.put(TextChunk(delta.content))
+            # Tool calls arrive in fragments keyed by index
+            for tc in delta.tool_calls or []:
+                call = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function:
+                    call["name"] += tc.function.name or ""
+                    call["arguments"] += tc.function.arguments or ""
+    if cache_key:
+        await completion_cache.put(cache_key, chunks, [dict(calls[i]) for i in sorted(calls)])
+    return calls
+
+
+async def _stream_agent(node: AgentNode, messages: List[dict], out: asyncio.Queue) -> str:
+    """
+    Stream one agent's reply into `out` as events; returns the full text.
+    Tool calls in a completion are run concurrently (tool_executor) and fed
+    back for another completion, up to TOOL_MAX_ROUNDS times. Completions of
+    agents that opted in are served from / recorded in completion_cache.
+    """
+    parts: List[str] = []
+    kwargs = {}
+    if node.temperature is not None:
+        kwargs["temperature"] = node.temperature
+    if node.tools:
+        kwargs["tools"] = [binding.spec for binding in node.tools.values()]
+    messages = list(messages)
+    async with provider_clients.lease(node.provider_id, node.base_url, node.api_key) as client:
+        for round_no in range(TOOL_MAX_ROUNDS + 1):
+            cache_key = completion_cache.key(node, messages, kwargs)
+            cached = await completion_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                async for event in completion_cache.replay(cached):
+                    if isinstance(event, TextChunk):
+                        parts.append(event.chunk)
+                    await out.put(event)
+                calls = {i: dict(call) for i, call in enumerate(cached.tool_calls)}
+            else:
+                calls = await _complete(client, node, messages, kwargs, parts, out, cache_key)
+            if not calls:
+                break
+            if round_no == TOOL_MAX_ROUNDS:
+                await out.put(Thinking(f"{node.agent_name} stopped after {TOOL_MAX_ROUNDS} rounds of tool calls"))
+                break
+
+            ordered = [calls[i] for i in sorted(calls)]
+            for i, call in enumerate(ordered):
+                call["id"] = call["id"] or f"call_{i}"
+            messages.append({"role": "assistant", "content": None, "tool_calls": [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                for c in ordered
+            ]})
+            results = await tool_executor.execute(node.tools, ordered, node.agent_id, out.put)
+            messages.extend({"role": "tool", "tool_call_id": r.call_id, "content": r.content} for r in results)
+    return "".join(parts)
+
+
+async def run_plan(plan: RunPlan, message: str, contexts: Dict[str, List[dict]]) -> AsyncGenerator[ChatEvent, None]:
+    """
+    Run every agent of the plan and yield its events; ends with `end`.
+    `contexts` maps SessionAgent ids (AgentNode.node_id) to their prompt history
+    (context_window.py).
+    """
+    queues = {nid: asyncio.Queue() for nid in plan.order}
+    outputs = {nid: asyncio.get_running_loop().create_future() for nid in plan.order}
+
+    async def run_node(nid: str):
+        node = plan.nodes[nid]
+        text = ""
+        try:
+            upstream = []
+            for p in plan.preds[nid]:
+                upstream.append((plan.nodes[p].agent_name, await outputs[p]))
+            messages = _build_messages(node, contexts.get(node.node_id, []), message, upstream)
+            text = await _stream_agent(node, messages, queues[nid])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queues[nid].put(Thinking(f"{node.agent_name} failed: {e}"))
+        finally:
+            if not outputs[nid].done():
+                outputs[nid].set_result(text)
+            queues[nid].put_nowait(None)
+
+    names = " → ".join(plan.nodes[nid].agent_name for nid in plan.order)
+    yield Thinking(f"Routing to {names}")
+
+    tasks = [asyncio.create_task(run_node(nid)) for nid in plan.order]
+    try:
+        prev: Optional[AgentNode] = None
+        for nid in plan.order:
+            node = plan.nodes[nid]
+            if prev is None:
+                yield AgentStart(node.agent_id, node.agent_name)
+            else:
+                yield Handoff(prev.agent_id, prev.agent_name, node.agent_id, node.agent_name)
+            while True:
+                event = await queues[nid].get()
+                if event is None:
+                    break
+                yield event
+            prev = node
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    yield End()
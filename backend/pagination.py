@@ -0,0 +1,70 @@
+"""
+Keyset pagination on (created_at, id).
+
+A cursor is the opaque, URL-safe encoding of the last row of a page. The next
+page is `WHERE (created_at, id) > (cursor)` (or `<` when descending), served
+from the composite (..., created_at, id) indexes in models.py, so deep pages
+cost the same as the first one — unlike OFFSET.
+"""
+import base64
+from datetime import datetime
+from typing import Annotated, Optional, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import jsoncodec
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Reusable query parameter types: `limit: pagination.Limit = None`
+Limit = Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE, description="Page size; omit to return every row")]
+Cursor = Annotated[Optional[str], Query(description="Value of X-Next-Cursor from the previous page")]
+Order = Annotated[str, Query(pattern="^(asc|desc)$")]
+
+
+def encode_cursor(row) -> str:
+    raw = jsoncodec.dumpb([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = jsoncodec.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after(model, created_at: datetime, row_id: str, descending: bool = False):
+    """Rows strictly after (created_at, id) in (created_at, id) order, or before it when descending."""
+    if descending:
+        return or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < row_id))
+    return or_(model.created_at > created_at, and_(model.created_at == created_at, model.id > row_id))
+
+
+def keyset(query, model, limit: Optional[int], cursor: Optional[str], descending: bool = False):
+    """Order `query` by (created_at, id) and restrict it to one page (+1 row to detect more)."""
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(after(model, created_at, row_id, descending))
+    if limit:
+        query = query.limit(limit + 1)
+    return query
+
+
+async def fetch_page(db: AsyncSession, query, model, limit: Optional[int], cursor: Optional[str],
+                     descending: bool = False) -> Tuple[list, Optional[str]]:
+    """Run a keyset page query. Returns (rows, next_cursor or None)."""
+    rows = (await db.scalars(keyset(query, model, limit, cursor, descending))).all()
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
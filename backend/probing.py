@@ -0,0 +1,230 @@
+"""
+Async capability probing for provider model refresh.
+
+A refresh lists the provider's remote models and sends a one-token completion
+to each of them to find out which ones accept chat requests. Probes run
+concurrently under a semaphore and a per-provider rate limit, inside a total
+deadline. The work runs as a background job so the HTTP request returns a
+handle immediately and clients poll for progress / partial results.
+
+Verdicts from earlier refreshes can be supplied through `lookup`; those models
+are not probed again, so a refresh only pays for new or expired entries.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from openai import APIStatusError, AsyncOpenAI
+
+from . import provider_clients
+
+PROBE_CONCURRENCY = int(os.getenv("GPOST_PROBE_CONCURRENCY", "8"))
+PROBE_RATE_PER_SEC = float(os.getenv("GPOST_PROBE_RATE_PER_SEC", "5"))
+PROBE_TIMEOUT = float(os.getenv("GPOST_PROBE_TIMEOUT", "5"))
+PROBE_DEADLINE = float(os.getenv("GPOST_PROBE_DEADLINE", "60"))
+# How long a cached verdict is trusted: chat-capable / not a chat model
+PROBE_TTL = float(os.getenv("GPOST_PROBE_TTL", str(7 * 24 * 3600)))
+PROBE_NEGATIVE_TTL = float(os.getenv("GPOST_PROBE_NEGATIVE_TTL", str(24 * 3600)))
+# Finished jobs are kept around this long so clients can read the final state
+JOB_RETENTION = 600
+
+
+class RateLimiter:
+    """Token bucket shared by every probe against the same provider."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProbeJob:
+    """Progress of one provider refresh. Read by the polling endpoint."""
+
+    def __init__(self, provider_id: str):
+        self.job_id = str(uuid.uuid4())
+        self.provider_id = provider_id
+        self.status = "pending"  # pending, running, completed, partial, failed
+        self.total = 0
+        self.probed = 0
+        self.cached = 0
+        self.remote_ids: List[str] = []
+        self.models: List[str] = []  # chat-capable remote ids
+        self.rejected: List[str] = []  # remote ids that are definitely not chat models
+        self.cached_ids: Set[str] = set()  # verdicts taken from `lookup`, not probed
+        self.error: Optional[str] = None
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "partial", "failed")
+
+
+_jobs: Dict[str, ProbeJob] = {}
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def _limiter_for(provider_id: str) -> RateLimiter:
+    limiter = _limiters.get(provider_id)
+    if limiter is None:
+        limiter = _limiters[provider_id] = RateLimiter(PROBE_RATE_PER_SEC)
+    return limiter
+
+
+def _prune_jobs():
+    now = datetime.utcnow()
+    for job_id, job in list(_jobs.items()):
+        if job.done and job.finished_at and (now - job.finished_at).total_seconds() > JOB_RETENTION:
+            del _jobs[job_id]
+
+
+def get_job(job_id: str) -> Optional[ProbeJob]:
+    return _jobs.get(job_id)
+
+
+def active_job(provider_id: str) -> Optional[ProbeJob]:
+    for job in _jobs.values():
+        if job.provider_id == provider_id and not job.done:
+            return job
+    return None
+
+
+async def _probe_one(client: AsyncOpenAI, model_id: str, sem: asyncio.Semaphore, limiter: RateLimiter) -> Optional[bool]:
+    """
+    True if the model answers a chat completion, False if the provider rejects
+    it as a chat model, None on transient errors (timeouts, 429, 5xx) that
+    should not be cached.
+    """
+    async with sem:
+        await limiter.acquire()
+        try:
+            await client.chat.completions.create(
+                model=model_id,
+                messages=[{"role": "user", "content": "say 1"}],
+                max_tokens=1,
+                timeout=PROBE_TIMEOUT,
+            )
+            return True
+        except asyncio.CancelledError:
+            raise
+        except APIStatusError as e:
+            if e.status_code in (408, 409, 429) or e.status_code >= 500:
+                return None
+            return False
+        except Exception:
+            return None
+
+
+async def _list_models(client: AsyncOpenAI) -> List[str]:
+    """Ids of every remote model, following the list's pages."""
+    return [m.id async for m in client.models.list()]
+
+
+Lookup = Callable[[List[str]], Awaitable[Dict[str, bool]]]
+
+
+async def run_probe(
+    job: ProbeJob,
+    base_url: Optional[str],
+    api_key: str,
+    lookup: Optional[Lookup] = None,
+    deadline: float = PROBE_DEADLINE,
+) -> str:
+    """
+    Probe every remote model of a provider, recording progress on `job`.
+    Returns "completed", "partial" (deadline hit) or "failed".
+    """
+    job.status = "running"
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+    try:
+        async with provider_clients.lease(job.provider_id, base_url, api_key) as client:
+            job.remote_ids = await asyncio.wait_for(_list_models(client), timeout=deadline)
+            job.total = len(job.remote_ids)
+
+            cached = await lookup(job.remote_ids) if lookup else {}
+            for model_id, is_llm in cached.items():
+                job.cached_ids.add(model_id)
+                (job.models if is_llm else job.rejected).append(model_id)
+            job.cached = job.probed = len(cached)
+
+            sem = asyncio.Semaphore(PROBE_CONCURRENCY)
+            limiter = _limiter_for(job.provider_id)
+
+            async def probe(model_id: str):
+                verdict = await _probe_one(client, model_id, sem, limiter)
+                job.probed += 1
+                if verdict is True:
+                    job.models.append(model_id)
+                elif verdict is False:
+                    job.rejected.append(model_id)
+
+            tasks = [asyncio.create_task(probe(model_id)) for model_id in job.remote_ids if model_id not in cached]
+            pending = set()
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=max(0.0, expires - loop.time()))
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            return "partial" if pending else "completed"
+    except asyncio.TimeoutError:
+        job.error = "Timed out listing models from provider"
+        return "failed"
+    except Exception as e:
+        job.error = f"Failed to fetch models from provider: {str(e)}"
+        return "failed"
+
+
+def start_probe_job(
+    provider_id: str,
+    base_url: Optional[str],
+    api_key: str,
+    lookup: Optional[Lookup] = None,
+    on_done: Optional[Callable[[ProbeJob], Awaitable[None]]] = None,
+) -> ProbeJob:
+    """
+    Start (or join) the refresh job for a provider on the running event loop.
+    `on_done` runs once probing finishes with any result other than "failed".
+    """
+    _prune_jobs()
+    existing = active_job(provider_id)
+    if existing:
+        return existing
+
+    job = ProbeJob(provider_id)
+    _jobs[job.job_id] = job
+
+    async def _run():
+        outcome = await run_probe(job, base_url, api_key, lookup)
+        try:
+            if on_done and outcome != "failed":
+                await on_done(job)
+        except Exception as e:
+            outcome = "failed"
+            job.error = f"Failed to save models: {str(e)}"
+        job.finished_at = datetime.utcnow()
+        job.status = outcome
+
+    job.task = asyncio.create_task(_run())
+    return job
@@ -0,0 +1,133 @@
+"""
+Long-lived AsyncOpenAI clients, one per Provider.id.
+
+Every call to a provider (chat streams, summaries, refresh probes) leases the
+provider's client, so requests reuse pooled keep-alive connections — and, with
+the `h2` package installed, multiplex over HTTP/2 — instead of paying a new
+TCP/TLS handshake each time. Pool limits are configured with the
+GPOST_PROVIDER_* variables below.
+
+A lease for a provider whose base_url or api_key changed builds a new client;
+update_provider / delete_provider retire the old one right away. A retired
+client is closed once its last in-flight lease ends, so running streams are
+not cut off. `stats` reports per-provider pool metrics.
+"""
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from importlib.util import find_spec
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+PROVIDER_MAX_CONNECTIONS = int(os.getenv("GPOST_PROVIDER_MAX_CONNECTIONS", "100"))
+PROVIDER_MAX_KEEPALIVE = int(os.getenv("GPOST_PROVIDER_MAX_KEEPALIVE", "20"))
+PROVIDER_KEEPALIVE_EXPIRY = float(os.getenv("GPOST_PROVIDER_KEEPALIVE_EXPIRY", "60"))
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv("GPOST_PROVIDER_CONNECT_TIMEOUT", "10"))
+PROVIDER_TIMEOUT = float(os.getenv("GPOST_PROVIDER_TIMEOUT", "120"))
+# HTTP/2 needs the optional h2 package; without it connections stay on HTTP/1.1
+PROVIDER_HTTP2 = os.getenv("GPOST_PROVIDER_HTTP2", "1") == "1" and find_spec("h2") is not None
+
+
+class PooledClient:
+    def __init__(self, provider_id: str, base_url: Optional[str], api_key: str):
+        self.provider_id = provider_id
+        self.base_url = base_url
+        self.api_key = api_key
+        self.created_at = datetime.utcnow()
+        self.requests = 0
+        self.in_flight = 0
+        self.retired = False
+        self.http = DefaultAsyncHttpxClient(
+            http2=PROVIDER_HTTP2,
+            limits=httpx.Limits(
+                max_connections=PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=PROVIDER_MAX_KEEPALIVE,
+                keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(PROVIDER_TIMEOUT, connect=PROVIDER_CONNECT_TIMEOUT),
+            event_hooks={"request": [self._count]},
+        )
+        # Callers pass their own per-request timeouts and handle retries themselves
+        self.client = AsyncOpenAI(api_key=api_key or "", base_url=base_url, max_retries=0,
+                                  timeout=PROVIDER_TIMEOUT, http_client=self.http)
+
+    async def _count(self, request: httpx.Request):
+        self.requests += 1
+
+    def matches(self, base_url: Optional[str], api_key: str) -> bool:
+        return self.base_url == base_url and self.api_key == (api_key or "")
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self) -> dict:
+        # httpcore's pool is not part of httpx's public API; report what is there
+        pool = getattr(getattr(self.http, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return {
+            "provider_id": self.provider_id,
+            "base_url": self.base_url,
+            "http2": PROVIDER_HTTP2,
+            "created_at": self.created_at,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "retired": self.retired,
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "http2_connections": sum(1 for c in connections if "HTTP/2" in repr(c)),
+            "max_connections": PROVIDER_MAX_CONNECTIONS,
+            "max_keepalive_connections": PROVIDER_MAX_KEEPALIVE,
+        }
+
+
+_clients: Dict[str, PooledClient] = {}
+# Retired clients that still have leases out
+_draining: List[PooledClient] = []
+
+
+async def _retire(entry: PooledClient):
+    entry.retired = True
+    if entry.in_flight:
+        _draining.append(entry)
+    else:
+        await entry.close()
+
+
+@asynccontextmanager
+async def lease(provider_id: str, base_url: Optional[str], api_key: str) -> AsyncIterator[AsyncOpenAI]:
+    """The provider's pooled client, for the duration of one call or stream."""
+    entry = _clients.get(provider_id)
+    if entry is None or not entry.matches(base_url, api_key):
+        stale = entry
+        entry = _clients[provider_id] = PooledClient(provider_id, base_url, api_key or "")
+        if stale is not None:
+            await _retire(stale)
+    entry.in_flight += 1
+    try:
+        yield entry.client
+    finally:
+        entry.in_flight -= 1
+        if entry.retired and not entry.in_flight:
+            if entry in _draining:
+                _draining.remove(entry)
+            await entry.close()
+
+
+async def discard(provider_id: str):
+    """Retire a provider's client (its settings changed or it was deleted)."""
+    entry = _clients.pop(provider_id, None)
+    if entry is not None:
+        await _retire(entry)
+
+
+async def close_all():
+    for entry in list(_clients.values()) + _draining:
+        await entry.close()
+    _clients.clear()
+    _draining.clear()
+
+
+def stats() -> List[dict]:
+    return [entry.stats() for entry in list(_clients.values()) + _draining]
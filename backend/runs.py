@@ -0,0 +1,215 @@
+"""
+Registry of in-flight chat turns, so they can be stopped and resumed.
+
+A turn runs in its own task (`start`), which drains the producer's events
+(coalesced once, see streaming.coalesce) into a Transcript and a bounded
+replay buffer, and fans them out to every attached response (`Run.stream`).
+Events are numbered; the SSE id of an event is "<run id>:<seq>", so a client
+that lost its connection reattaches with Last-Event-ID (`resume`) and gets
+what it missed, then the live tail, without a second upstream generation.
+Several viewers of one session share the run the same way. If the missed
+events have already left the buffer, the client gets a `snapshot` of the
+turn so far instead.
+
+Cancelling the task — from /api/chat/stop (`stop`), at shutdown
+(`stop_all`), or on a client disconnect — cancels the producer where it is
+waiting: upstream LLM streams are closed and running tool calls are
+cancelled. A disconnect cancels at once if no client ever got an event id
+to resume from, else once the last attached response has been gone for
+RUN_RESUME_GRACE seconds. Whatever the transcript holds by then is still
+handed to the turn's `finish` callback to be persisted, and still-attached
+clients get a `thinking` note. A producer that fails is handled the same
+way. Every run ends with an `end` event carrying the id of the saved reply,
+sent after `finish`. Finished runs stay resumable for RUN_RETAIN seconds, so
+a client that reconnects just after the end still gets it.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .streaming import ChatEvent, End, Snapshot, Thinking, Transcript, coalesce
+
+logger = logging.getLogger(__name__)
+
+STOP_TIMEOUT = float(os.getenv("GPOST_RUN_STOP_TIMEOUT", "10"))
+# Events kept per run for clients that reconnect (text frames are coalesced)
+RUN_REPLAY_EVENTS = int(os.getenv("GPOST_RUN_REPLAY_EVENTS", "2048"))
+# How long a run with no attached client keeps generating, waiting for a reconnect.
+# Covers the web client's retries (~3 s); longer spends tokens on abandoned turns.
+RUN_RESUME_GRACE = float(os.getenv("GPOST_RUN_RESUME_GRACE", "5"))
+# How long a finished run can still be resumed
+RUN_RETAIN = float(os.getenv("GPOST_RUN_RETAIN", "60"))
+
+STOP_REASONS = {
+    "stop": "Stopped by the user",
+    "disconnect": "Client disconnected",
+    "shutdown": "Server shutting down",
+}
+
+# finish(transcript, stopped) -> id of the saved message, if any
+Finish = Callable[[Transcript, Optional[str]], Awaitable[Optional[str]]]
+
+_DONE = object()
+_runs: Dict[str, Dict[str, "Run"]] = {}
+# Every run by id, running or recently finished (resume)
+_by_id: Dict[str, "Run"] = {}
+
+
+class Run:
+    def __init__(self, session_id: str, events: AsyncIterator[ChatEvent], finish: Finish):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.transcript = Transcript()
+        self.stopped: Optional[str] = None
+        self.message_id: Optional[str] = None
+        self._saving = False
+        self._seq = 0
+        self._delivered = False  # an event id reached a client, which can resume from it
+        self._buffer: deque = deque(maxlen=RUN_REPLAY_EVENTS)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+        self.task = asyncio.create_task(self._run(events, finish))
+        self.task.add_done_callback(self._done)
+
+    def _publish(self, ev: ChatEvent):
+        self._seq += 1
+        item = (self._seq, ev)
+        self._buffer.append(item)
+        for queue in self._subscribers:
+            queue.put_nowait(item)
+
+    async def _run(self, events: AsyncIterator[ChatEvent], finish: Finish):
+        try:
+            async for ev in coalesce(events):
+                if isinstance(ev, End):
+                    continue  # sent once the reply is saved, with its id
+                self.transcript.add(ev)
+                self._publish(ev)
+        except asyncio.CancelledError:
+            asyncio.current_task().uncancel()
+            self.stopped = self.stopped or "stop"
+            note = Thinking(STOP_REASONS.get(self.stopped, self.stopped))
+            self.transcript.add(note)
+            self._publish(note)
+        except Exception as e:
+            logger.exception("Run %s failed", self.id)
+            note = Thinking(f"Generation failed: {e}")
+            self.transcript.add(note)
+            self._publish(note)
+        # Also after a stop or a failure: the partial reply is kept
+        self._saving = True
+        try:
+            self.message_id = await finish(self.transcript, self.stopped)
+        except Exception:
+            logger.exception("Saving the reply of run %s failed", self.id)
+        self._publish(End(self.message_id or ""))
+
+    def _done(self, task: asyncio.Task):
+        # A callback rather than a finally: also runs for a task cancelled before it started
+        for queue in self._subscribers:
+            queue.put_nowait(_DONE)
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+        session_runs = _runs.get(self.session_id, {})
+        session_runs.pop(self.id, None)
+        if not session_runs:
+            _runs.pop(self.session_id, None)
+        asyncio.get_running_loop().call_later(RUN_RETAIN, _by_id.pop, self.id, None)
+
+    def cancel(self, reason: str):
+        if not self.task.done() and not self._saving:
+            self.stopped = self.stopped or reason
+            self.task.cancel()
+
+    async def wait(self) -> Optional[str]:
+        """Wait for the run to finish; returns the saved message id."""
+        await asyncio.wait([self.task])
+        return self.message_id
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}:{seq}"
+
+    def _orphaned(self):
+        self._orphan_timer = None
+        if not self._subscribers:
+            self.cancel("disconnect")
+
+    async def stream(self, after: int = 0) -> AsyncIterator[Tuple[str, ChatEvent]]:
+        """
+        (event id, event) pairs of the run after event number `after`: the
+        buffered ones, then live ones until the run ends. Once the last
+        attached stream closes early, the run is cancelled after RUN_RESUME_GRACE,
+        or at once if no event id was ever delivered.
+        """
+        # No await until the queue is registered: nothing published in between is missed
+        if self._seq > after and (not self._buffer or self._buffer[0][0] > after + 1):
+            backlog = [(self._seq, Snapshot(self.transcript.content, list(self.transcript.thought_process)))]
+        else:
+            backlog = [item for item in self._buffer if item[0] > after]
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in backlog:
+            queue.put_nowait(item)
+        if self.task.done():
+            queue.put_nowait(_DONE)
+        else:
+            self._subscribers.add(queue)
+            if self._orphan_timer is not None:
+                self._orphan_timer.cancel()
+                self._orphan_timer = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                seq, ev = item
+                yield self.event_id(seq), ev
+                self._delivered = True
+        finally:
+            self._subscribers.discard(queue)
+            if not self._subscribers and not self.task.done():
+                if RUN_RESUME_GRACE > 0 and self._delivered:
+                    self._orphan_timer = asyncio.get_running_loop().call_later(RUN_RESUME_GRACE, self._orphaned)
+                else:
+                    self.cancel("disconnect")
+
+
+def start(session_id: str, events: AsyncIterator[ChatEvent], finish: Finish) -> Run:
+    run = Run(session_id, events, finish)
+    _runs.setdefault(session_id, {})[run.id] = run
+    _by_id[run.id] = run
+    return run
+
+
+def active(session_id: str) -> List[Run]:
+    return list(_runs.get(session_id, {}).values())
+
+
+def resume(last_event_id: str, session_id: Optional[str] = None) -> Optional[Tuple[Run, int]]:
+    """The run and event number a Last-Event-ID points at, if that run can still be resumed."""
+    run_id, _, seq = last_event_id.strip().partition(":")
+    run = _by_id.get(run_id)
+    if run is None or not seq.isdigit() or (session_id is not None and run.session_id != session_id):
+        return None
+    return run, int(seq)
+
+
+async def _cancel(runs: List[Run], reason: str):
+    for run in runs:
+        run.cancel(reason)
+    if runs:
+        # Give them time to persist their partial replies
+        await asyncio.wait([run.task for run in runs], timeout=STOP_TIMEOUT)
+
+
+async def stop(session_id: str, reason: str = "stop") -> List[Run]:
+    """Cancel the session's running turns and wait until their replies are saved."""
+    runs = active(session_id)
+    await _cancel(runs, reason)
+    return runs
+
+
+async def stop_all(reason: str = "shutdown"):
+    await _cancel([run for session_runs in _runs.values() for run in session_runs.values()], reason)
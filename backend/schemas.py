@@ -1,10 +1,25 @@
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
-import json
+
+from . import jsoncodec
 
 # --- Common Helpers ---
 
+def parse_json_text(v, keep_invalid: bool = False):
+    """
+    Parse JSON sent (or stored, before the JSON columns) as a string. Text that
+    is not JSON becomes None, or is kept as is with keep_invalid.
+    """
+    if isinstance(v, str):
+        if not v:
+            return None
+        try:
+            return jsoncodec.loads(v)
+        except jsoncodec.JSONDecodeError:
+            return v if keep_invalid else None
+    return v
+
 class JSONField(str):
     """Helper to treat strings as JSON in Pydantic"""
     @classmethod
@@ -14,7 +29,7 @@ class JSONField(str):
     @classmethod
     def validate(cls, v):
         if isinstance(v, dict) or isinstance(v, list):
-            return json.dumps(v)
+            return jsoncodec.dumps(v)
         return v
 
 # --- Tool Schemas ---
@@ -32,32 +47,22 @@ class Tool(ToolBase):
     id: str
     created_at: datetime
 
-    @field_validator('schema', mode='before')
-    @classmethod
-    def parse_schema(cls, v):
-        if isinstance(v, str) and v:
-            try:
-                return json.loads(v)
-            except (json.JSONDecodeError, TypeError):
-                return None
-        return v
-
-    @field_validator('credential_config', mode='before')
+    @field_validator('schema', 'credential_config', mode='before')
     @classmethod
-    def parse_credential_config(cls, v):
-        if isinstance(v, str) and v:
-            try:
-                return json.loads(v)
-            except (json.JSONDecodeError, TypeError):
-                return None
-        return v
+    def parse_json_fields(cls, v):
+        return parse_json_text(v)
 
     class Config:
         from_attributes = True
-        # Custom encoder to handle the Text columns stored as JSON strings in DB
-        json_encoders = {
-            # In a real app, you might use a custom getter to parse the JSON string back to dict
-        }
+
+class ToolBindingConfig(BaseModel):
+    """How a skill runs one of its tools (skills_tools.config); extra keys are passed to the handler."""
+    handler: Optional[str] = None
+    timeout: Optional[float] = Field(None, gt=0)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+
+    class Config:
+        extra = "allow"
 
 # --- Skill Schemas ---
 
@@ -78,6 +83,30 @@ class Skill(SkillBase):
     class Config:
         from_attributes = True
 
+class SkillRunRequest(BaseModel):
+    arguments: Dict[str, Any] = {}
+
+class SkillRunResult(BaseModel):
+    result: Any = None
+    elapsed_ms: float
+
+class SkillSlim(SkillBase):
+    """Skill without its nested tools (`?view=slim` listings)."""
+    id: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class SkillSummary(BaseModel):
+    """Reference to a skill inside a slim agent."""
+    id: str
+    name: str
+    description: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 # --- Agent Schemas ---
 
 class AgentBase(BaseModel):
@@ -89,6 +118,7 @@ class AgentBase(BaseModel):
     model_provider: Optional[str] = None
     model_name: Optional[str] = None
     temperature: Optional[float] = 0.7
+    cache_completions: bool = False
     system_prompt: Optional[str] = None
 
 class AgentCreate(AgentBase):
@@ -103,6 +133,16 @@ class Agent(AgentBase):
     class Config:
         from_attributes = True
 
+class AgentSlim(AgentBase):
+    """Agent with skill references only, no nested tools (`?view=slim` listings)."""
+    id: str
+    created_at: datetime
+    skills: List[SkillSummary] = []
+    model: Optional["LLM"] = None
+
+    class Config:
+        from_attributes = True
+
 # --- LLM Schemas ---
 
 class LLMBase(BaseModel):
@@ -116,6 +156,22 @@ class LLM(LLMBase):
     class Config:
         from_attributes = True
 
+class ProbeJob(BaseModel):
+    """Handle / progress of an async provider model refresh."""
+    job_id: str
+    provider_id: str
+    status: str
+    total: int = 0
+    probed: int = 0
+    cached: int = 0
+    models: List[str] = []
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # --- Provider Schemas ---
 
 class ProviderBase(BaseModel):
@@ -133,6 +189,41 @@ class Provider(ProviderBase):
     class Config:
         from_attributes = True
 
+class ProviderClientStats(BaseModel):
+    """Pool metrics of one pooled provider client."""
+    provider_id: str
+    base_url: Optional[str] = None
+    http2: bool
+    created_at: datetime
+    requests: int
+    in_flight: int
+    retired: bool
+    connections: int
+    idle_connections: int
+    http2_connections: int
+    max_connections: int
+    max_keepalive_connections: int
+
+class CompletionCacheStats(BaseModel):
+    """Counters (since process start) and sizes of the completion cache."""
+    enabled: bool
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    stores: int
+    memory_evictions: int
+    disk_evictions: int
+    disk_errors: int
+    hit_ratio: float
+    memory_entries: int
+    memory_bytes: int
+    memory_max_bytes: int
+    disk_path: Optional[str] = None
+    disk_entries: int
+    disk_bytes: int
+    disk_max_bytes: int
+    ttl: float
+
 # --- Session Schemas ---
 
 class SessionAgentBase(BaseModel):
@@ -159,9 +250,19 @@ class MessageBase(BaseModel):
     msg_type: Optional[str] = "text"
     parent_id: Optional[str] = None
 
+    @field_validator('thought_process', mode='before')
+    @classmethod
+    def parse_thought_process(cls, v):
+        return parse_json_text(v, keep_invalid=True)
+
 class MessageCreate(MessageBase):
     pass
 
+class MessageImport(MessageBase):
+    """A historical message for bulk import; created_at defaults to import time, in list order."""
+    id: Optional[str] = None
+    created_at: Optional[datetime] = None
+
 class Message(MessageBase):
     id: str
     session_id: str
@@ -176,11 +277,17 @@ class SessionBase(BaseModel):
     status: Optional[str] = "active"
     graph_config: Optional[Union[str, Dict]] = None
 
+    @field_validator('graph_config', mode='before')
+    @classmethod
+    def parse_graph_config(cls, v):
+        return parse_json_text(v)
+
 class SessionCreate(SessionBase):
     pass
 
 class Session(SessionBase):
     id: str
+    graph_version: int = 0
     created_at: datetime
     updated_at: datetime
     
@@ -190,6 +297,51 @@ class Session(SessionBase):
 class SessionDetail(Session):
     messages: List[Message] = []
     session_agents: List[SessionAgent] = []
+    # Set when `message_limit` cut older messages off; pass as `cursor` with order=desc
+    next_messages_cursor: Optional[str] = None
+
+# --- Workspace Schemas ---
+# One normalized payload for the agent sidebar: every entity once, keyed by
+# id, with references (skill_ids, tool_ids, model_id, provider_id) between them.
+
+class WorkspaceSkill(SkillSummary):
+    tool_ids: List[str] = []
+
+class WorkspaceAgent(AgentBase):
+    id: str
+    created_at: datetime
+    skill_ids: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+class WorkspaceSessionAgent(SessionAgentBase):
+    """memory_context is left out: it is large and only the orchestrator needs it."""
+    id: str
+
+    class Config:
+        from_attributes = True
+
+class Workspace(BaseModel):
+    session_id: Optional[str] = None
+    agents: Dict[str, WorkspaceAgent] = {}
+    skills: Dict[str, WorkspaceSkill] = {}
+    tools: Dict[str, Tool] = {}
+    providers: Dict[str, Provider] = {}
+    llms: Dict[str, LLM] = {}
+    session_agents: List[WorkspaceSessionAgent] = []
+
+# --- Search Schemas ---
+
+class SearchHit(BaseModel):
+    kind: str  # message | agent | skill
+    id: str
+    title: Optional[str] = None  # agent / skill name
+    snippet: str
+    score: float  # higher is more relevant
+    session_id: Optional[str] = None  # messages
+    role: Optional[str] = None  # messages
+    created_at: Optional[datetime] = None
 
 # --- Chat Request Schemas ---
 
@@ -204,4 +356,5 @@ class ChatStopRequest(BaseModel):
     session_id: str
 
 # Rebuild models for forward refs (Agent.model -> LLM)
-Agent.model_rebuild()
\ No newline at end of file
+Agent.model_rebuild()
+AgentSlim.model_rebuild()
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Full-text search over message content, agents (name, description, system
+prompt) and skills (name, description, prompt).
+
+The indexes are maintained by the database itself on every write (migration
+0008): on SQLite a contentless FTS5 table fed by triggers, ranked by bm25
+with names weighted over text; on Postgres a generated tsvector column per
+table with a GIN index, ranked by ts_rank_cd. Results are ordered by
+relevance, best first, and paged by offset (`encode_cursor`), since a
+ranking has no stable key to page on.
+
+User input never reaches the query syntax: on SQLite every word becomes a
+quoted phrase (the last one also matches as a prefix, for search-as-you-type),
+on Postgres it goes through websearch_to_tsquery.
+"""
+import base64
+import re
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Float, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+KINDS = {"messages": "message", "agents": "agent", "skills": "skill"}
+SNIPPET_CHARS = 160
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# bm25 weights per FTS column (kind, title, body): a name hit outranks a text hit
+_SQLITE_SCORE = "-bm25(search_fts, 0.0, 10.0, 1.0)"
+
+_SQLITE = {
+    "message": """
+        SELECT m.id, m.session_id, m.role, m.content AS body, NULL AS title, m.created_at, {score} AS score
+        FROM search_fts
+        JOIN search_docs d ON d.rowid = search_fts.rowid
+        JOIN messages m ON m.id = d.ref_id
+        WHERE search_fts MATCH :match {session_filter}
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+    "agent": """
+        SELECT a.id, NULL AS session_id, NULL AS role,
+               coalesce(a.description, '') || ' ' || coalesce(a.system_prompt, '') AS body,
+               a.name AS title, a.created_at, {score} AS score
+        FROM search_fts
+        JOIN search_docs d ON d.rowid = search_fts.rowid
+        JOIN agents a ON a.id = d.ref_id
+        WHERE search_fts MATCH :match
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+    "skill": """
+        SELECT s.id, NULL AS session_id, NULL AS role,
+               coalesce(s.description, '') || ' ' || coalesce(s.prompt, '') AS body,
+               s.name AS title, s.created_at, {score} AS score
+        FROM search_fts
+        JOIN search_docs d ON d.rowid = search_fts.rowid
+        JOIN skills s ON s.id = d.ref_id
+        WHERE search_fts MATCH :match
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+}
+
+_POSTGRES = {
+    "message": """
+        SELECT id, session_id, role, content AS body, NULL AS title, created_at,
+               ts_rank_cd(search_vector, q) AS score
+        FROM messages, websearch_to_tsquery('simple', :query) q
+        WHERE search_vector @@ q {session_filter}
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+    "agent": """
+        SELECT id, NULL AS session_id, NULL AS role,
+               coalesce(description, '') || ' ' || coalesce(system_prompt, '') AS body,
+               name AS title, created_at, ts_rank_cd(search_vector, q) AS score
+        FROM agents, websearch_to_tsquery('simple', :query) q
+        WHERE search_vector @@ q
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+    "skill": """
+        SELECT id, NULL AS session_id, NULL AS role,
+               coalesce(description, '') || ' ' || coalesce(prompt, '') AS body,
+               name AS title, created_at, ts_rank_cd(search_vector, q) AS score
+        FROM skills, websearch_to_tsquery('simple', :query) q
+        WHERE search_vector @@ q
+        ORDER BY score DESC LIMIT :limit OFFSET :offset
+    """,
+}
+
+
+def fts5_match(kind: str, query: str) -> Optional[str]:
+    """FTS5 MATCH expression for a user query: every word must appear (in the name or text) of a `kind` row."""
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += " *"
+    return f"kind : {kind} AND {{title body}} : ({' AND '.join(terms)})"
+
+
+def snippet(body: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """The part of `body` around the first query word it contains."""
+    body = " ".join(body.split())
+    if len(body) <= width:
+        return body
+    lowered = body.lower()
+    hits = [i for i in (lowered.find(word.lower()) for word in _WORD.findall(query)) if i >= 0]
+    start = max(0, min(hits) - width // 4) if hits else 0
+    end = start + width
+    return ("…" if start else "") + body[start:end].strip() + ("…" if end < len(body) else "")
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if raw[:1] == "o" and raw[1:].isdigit():
+            return int(raw[1:])
+    except ValueError:
+        pass
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def search(db: AsyncSession, query: str, kind: str, limit: int, cursor: Optional[str] = None,
+                 session_id: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of `kind` ("message", "agent", "skill") rows matching `query`, best first; (hits, next_cursor)."""
+    offset = decode_cursor(cursor)
+    params = {"limit": limit + 1, "offset": offset}
+    session_filter = ""
+    if db.bind.dialect.name == "postgresql":
+        if session_id:
+            session_filter = "AND session_id = :session_id"
+        sql = _POSTGRES[kind].format(session_filter=session_filter)
+        params["query"] = query
+    else:
+        match = fts5_match(kind, query)
+        if match is None:
+            return [], None
+        if session_id:
+            session_filter = "AND m.session_id = :session_id"
+        sql = _SQLITE[kind].format(score=_SQLITE_SCORE, session_filter=session_filter)
+        params["match"] = match
+    if session_id:
+        params["session_id"] = session_id
+
+    statement = text(sql).columns(created_at=DateTime(), score=Float())
+    rows = (await db.execute(statement, params)).mappings().all()
+    next_cursor = encode_cursor(offset + limit) if len(rows) > limit else None
+    hits = [
+        {
+            "kind": kind,
+            "id": row["id"],
+            "title": row["title"],
+            "snippet": snippet(row["body"] or "", query),
+            "score": float(row["score"] or 0),
+            "session_id": row["session_id"],
+            "role": row["role"],
+            "created_at": row["created_at"],
+        }
+        for row in rows[:limit]
+    ]
+    return hits, next_cursor
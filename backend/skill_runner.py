@@ -0,0 +1,489 @@
+"""
+Isolated execution of Skill.code in a pool of warm worker processes.
+
+Off unless GPOST_SKILL_EXECUTION=1: skill code is arbitrary Python, and
+anyone who can save a skill can run it. Before it runs any, every worker
+(`_isolate`):
+
+- replaces the inherited environment (provider API keys, database URL)
+  with SKILL_ENV;
+- moves to its own network namespace, with no interfaces up;
+- as root: chroots into an empty directory (GPOST_SKILL_CHROOT; modules
+  listed in GPOST_SKILL_PRELOAD are imported first, as nothing can be
+  imported from inside), then drops to GPOST_SKILL_USER with no
+  supplementary groups;
+- may not start processes or threads (RLIMIT_NPROC 0).
+
+The pool refuses to start when the network or the privileges cannot be
+dropped (not root, no namespaces), unless GPOST_SKILL_REQUIRE_ISOLATION=0.
+
+Skill code is a Python module defining
+
+    def run(arguments: dict, data: memoryview | None):
+        return <JSON-serializable value>
+
+It never runs in the uvicorn worker: `run` hands each call to one of
+GPOST_SKILL_WORKERS pre-started processes (forkserver, so they do not inherit
+the server's threads or sockets) and awaits the reply without blocking the
+event loop. Calls queue FIFO for a free worker.
+
+- Bytecode is compiled once per content hash (sha256 of the code) in the
+  server and shipped marshalled; each worker keeps an LRU of loaded modules
+  by hash, so a warm call sends only the hash and the arguments.
+- Each call runs under CPU-time and address-space limits (RLIMIT_CPU /
+  RLIMIT_AS, where the platform has them). A call that exceeds its wall-clock
+  timeout, or is cancelled, kills its worker; a replacement is started.
+- Arguments and `data` of GPOST_SKILL_SHM_THRESHOLD bytes or more go through
+  multiprocessing.shared_memory: copied once into a segment the worker maps,
+  instead of being pickled through the pipe. `data` reaches the skill as a
+  memoryview of that segment. Chrooted workers cannot reach /dev/shm, so
+  they get everything through the pipe.
+
+Module-level state of skill code lives as long as the worker that loaded it
+(at most GPOST_SKILL_MAX_CALLS calls); skills must not rely on it.
+"""
+import asyncio
+import ctypes
+import hashlib
+import importlib
+import logging
+import marshal
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional
+
+from . import jsoncodec
+
+try:
+    import resource
+except ImportError:  # not on Windows: calls then run without CPU/memory limits
+    resource = None
+
+try:
+    import pwd
+except ImportError:  # not on Windows
+    pwd = None
+
+logger = logging.getLogger(__name__)
+
+SKILL_WORKERS = int(os.getenv("GPOST_SKILL_WORKERS", str(min(4, os.cpu_count() or 1))))
+SKILL_TIMEOUT = float(os.getenv("GPOST_SKILL_TIMEOUT", "30"))
+SKILL_CPU_SECONDS = int(os.getenv("GPOST_SKILL_CPU_SECONDS", "10"))
+SKILL_MEMORY_MB = int(os.getenv("GPOST_SKILL_MEMORY_MB", "512"))
+SKILL_MAX_CALLS = int(os.getenv("GPOST_SKILL_MAX_CALLS", "1000"))
+SKILL_CODE_CACHE_SIZE = int(os.getenv("GPOST_SKILL_CODE_CACHE_SIZE", "128"))
+SKILL_SHM_THRESHOLD = int(os.getenv("GPOST_SKILL_SHM_THRESHOLD", str(1 << 20)))
+
+SKILL_EXECUTION = os.getenv("GPOST_SKILL_EXECUTION", "0") == "1"
+SKILL_REQUIRE_ISOLATION = os.getenv("GPOST_SKILL_REQUIRE_ISOLATION", "1") == "1"
+SKILL_USER = os.getenv("GPOST_SKILL_USER", "nobody")
+# "auto": a fresh empty directory; "" to skip the chroot
+SKILL_CHROOT = os.getenv("GPOST_SKILL_CHROOT", "auto")
+SKILL_PRELOAD = [m for m in os.getenv(
+    "GPOST_SKILL_PRELOAD",
+    "base64,collections,datetime,decimal,functools,hashlib,itertools,json,math,random,re,statistics,string,textwrap",
+).split(",") if m]
+# The whole environment of a worker: nothing is inherited from the server
+SKILL_ENV = {"PATH": "/usr/bin:/bin", "LANG": "C.UTF-8", "HOME": "/"}
+
+_CLONE_NEWNET = 0x40000000
+_CLONE_NEWUSER = 0x10000000
+_ROOT = hasattr(os, "geteuid") and os.geteuid() == 0
+_CHROOTED = _ROOT and bool(SKILL_CHROOT)
+
+ENTRY_POINT = "run"
+
+
+class SkillError(Exception):
+    """Skill code could not be run or raised; the message is meant for the caller."""
+
+
+class SkillTimeout(SkillError):
+    pass
+
+
+class SkillDisabled(SkillError):
+    """Skill execution is switched off (GPOST_SKILL_EXECUTION)."""
+
+
+# --- Worker process ---
+
+class _CPULimitExceeded(Exception):
+    pass
+
+
+def _on_sigxcpu(signum, frame):
+    raise _CPULimitExceeded("CPU time limit exceeded")
+
+
+def _set_soft_limit(which: int, soft: int):
+    _, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY and (soft == resource.RLIM_INFINITY or soft > hard):
+        soft = hard
+    resource.setrlimit(which, (soft, hard))
+
+
+def _attach(ref):
+    """(inline bytes) or (shared memory name, size) -> (buffer, segment or None)."""
+    if ref is None or isinstance(ref, bytes):
+        return ref, None
+    name, size = ref
+    # Workers share the server's resource tracker, which already knows the
+    # segment: attaching registers it again (a no-op), and the server unlinks it
+    shm = SharedMemory(name=name)
+    return shm.buf[:size], shm
+
+
+def _detach(view, shm):
+    if shm is None:
+        return
+    view.release()
+    try:
+        shm.close()
+    except BufferError:
+        pass  # the skill kept a view of its data; the mapping goes with the worker
+
+
+def _load(modules: "OrderedDict[str, Any]", code_hash: str, bytecode: Optional[bytes]):
+    fn = modules.get(code_hash)
+    if fn is not None:
+        modules.move_to_end(code_hash)
+        return fn
+    if bytecode is None:
+        return None
+    namespace = {"__name__": f"skill_{code_hash[:12]}"}
+    exec(marshal.loads(bytecode), namespace)
+    fn = namespace.get(ENTRY_POINT)
+    if not callable(fn):
+        raise SkillError(f"Skill code must define {ENTRY_POINT}(arguments, data)")
+    modules[code_hash] = fn
+    while len(modules) > SKILL_CODE_CACHE_SIZE:
+        modules.popitem(last=False)
+    return fn
+
+
+def _unshare_network() -> bool:
+    """Move to a new network namespace (a new user namespace too when not root): no interfaces, no network."""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.unshare(_CLONE_NEWNET if _ROOT else _CLONE_NEWUSER | _CLONE_NEWNET) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _isolate(chroot: Optional[str]) -> Dict[str, Any]:
+    """Confine this worker before it runs any skill code; reports what was applied."""
+    os.environ.clear()
+    os.environ.update(SKILL_ENV)
+    for module in SKILL_PRELOAD:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    report: Dict[str, Any] = {"network": _unshare_network(), "chroot": None, "user": None}
+    if _ROOT and pwd is not None:
+        try:
+            user = pwd.getpwnam(SKILL_USER)  # before the chroot hides /etc/passwd
+            if chroot:
+                os.chroot(chroot)
+                os.chdir("/")
+                report["chroot"] = chroot
+            os.setgroups([])
+            os.setgid(user.pw_gid)
+            os.setuid(user.pw_uid)
+            report["user"] = SKILL_USER
+        except (OSError, KeyError) as e:
+            report["error"] = str(e)
+    if resource is not None and hasattr(resource, "RLIMIT_NPROC"):
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    return report
+
+
+def _worker_main(conn, memory_limit: int, chroot: Optional[str]):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # shut down by the server, not by Ctrl-C
+    conn.send(("ready", _isolate(chroot)))
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+        if memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    modules: "OrderedDict[str, Any]" = OrderedDict()
+    while True:
+        try:
+            code_hash, bytecode, args_ref, data_ref, cpu_seconds, memory = conn.recv()
+        except (EOFError, OSError):
+            return
+        args_view = data_view = None
+        args_shm = data_shm = None
+        try:
+            fn = _load(modules, code_hash, bytecode)
+            if fn is None:
+                conn.send(("reload", None))
+                continue
+            args_view, args_shm = _attach(args_ref)
+            data_view, data_shm = _attach(data_ref)
+            arguments = jsoncodec.loads(args_view)
+            if resource is not None:
+                used = resource.getrusage(resource.RUSAGE_SELF)
+                _set_soft_limit(resource.RLIMIT_CPU, int(used.ru_utime + used.ru_stime) + cpu_seconds)
+                if memory:
+                    _set_soft_limit(resource.RLIMIT_AS, memory)
+            try:
+                value = fn(arguments, data_view)
+            finally:
+                if resource is not None:
+                    _set_soft_limit(resource.RLIMIT_CPU, resource.RLIM_INFINITY)
+                    _set_soft_limit(resource.RLIMIT_AS, memory_limit or resource.RLIM_INFINITY)
+            conn.send(("ok", jsoncodec.dumpb(value)))
+        except BaseException as e:  # skill code may raise anything, SystemExit included
+            if isinstance(e, MemoryError):
+                message = "Memory limit exceeded"
+            elif isinstance(e, _CPULimitExceeded):
+                message = f"CPU time limit exceeded ({cpu_seconds}s)"
+            else:
+                message = f"{type(e).__name__}: {e}"
+            conn.send(("error", message))
+        finally:
+            _detach(args_view, args_shm)
+            _detach(data_view, data_shm)
+
+
+# --- Server side ---
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child = _mp_context().Pipe()
+        self.process = _mp_context().Process(
+            target=_worker_main, args=(child, SKILL_MEMORY_MB << 20, _chroot), daemon=True, name="gpost-skill",
+        )
+        self.process.start()
+        child.close()
+        self.calls = 0
+        self.known: set = set()  # code hashes this worker has been sent
+        self.isolation = self._handshake()
+
+    def _handshake(self) -> Dict[str, Any]:
+        """Wait for the worker's isolation report; a worker that is not confined enough is killed."""
+        try:
+            if not self.conn.poll(30):
+                raise SkillError("Skill worker did not start")
+            _, report = self.conn.recv()
+        except (EOFError, OSError):
+            self.kill()
+            raise SkillError(f"Skill worker exited on start (code {self.process.exitcode})")
+        except SkillError:
+            self.kill()
+            raise
+        missing = [name for name, ok in (("network", report["network"]), ("privileges", report["user"])) if not ok]
+        if missing and SKILL_REQUIRE_ISOLATION:
+            self.kill()
+            detail = f" ({report['error']})" if report.get("error") else ""
+            raise SkillError(
+                f"Skill workers cannot drop {' and '.join(missing)}{detail}: run the server as root on Linux, "
+                "or set GPOST_SKILL_REQUIRE_ISOLATION=0 to run skills without that isolation"
+            )
+        return report
+
+    async def request(self, message: tuple):
+        """Send one call and await the reply without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            self.conn.send(message)
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise SkillError(f"Skill worker exited (code {self.process.exitcode})")
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+_idle: Optional[asyncio.Queue] = None
+_workers: List[_Worker] = []
+_chroot: Optional[str] = None
+_bytecode: "OrderedDict[str, bytes]" = OrderedDict()
+_stats = {"calls": 0, "errors": 0, "timeouts": 0, "restarts": 0, "code_compiles": 0, "shm_transfers": 0}
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def compile_code(code: str) -> tuple:
+    """(hash, marshalled bytecode) of skill code, compiled once per content hash."""
+    key = code_hash(code)
+    bytecode = _bytecode.get(key)
+    if bytecode is None:
+        try:
+            compiled = compile(code, f"<skill {key[:12]}>", "exec")
+        except SyntaxError as e:
+            raise SkillError(f"SyntaxError: {e}")
+        bytecode = _bytecode[key] = marshal.dumps(compiled)
+        _stats["code_compiles"] += 1
+        while len(_bytecode) > SKILL_CODE_CACHE_SIZE:
+            _bytecode.popitem(last=False)
+    else:
+        _bytecode.move_to_end(key)
+    return key, bytecode
+
+
+async def start():
+    """Start the worker pool (app startup, when enabled); `run` also starts it on first use."""
+    global _idle, _chroot
+    if _idle is not None or not SKILL_EXECUTION:
+        return
+    if _CHROOTED:
+        _chroot = tempfile.mkdtemp(prefix="gpost-skill-") if SKILL_CHROOT == "auto" else SKILL_CHROOT
+    results = await asyncio.gather(*(asyncio.to_thread(_Worker) for _ in range(SKILL_WORKERS)),
+                                   return_exceptions=True)
+    workers = [w for w in results if isinstance(w, _Worker)]
+    failed = [e for e in results if isinstance(e, BaseException)]
+    if failed:
+        for worker in workers:
+            worker.kill()
+        _remove_chroot()
+        raise failed[0]
+    _idle = asyncio.Queue()
+    for worker in workers:
+        _workers.append(worker)
+        _idle.put_nowait(worker)
+
+
+def _remove_chroot():
+    global _chroot
+    if _chroot is not None and SKILL_CHROOT == "auto":
+        shutil.rmtree(_chroot, ignore_errors=True)
+    _chroot = None
+
+
+async def stop():
+    global _idle
+    for worker in _workers:
+        worker.kill()
+    _workers.clear()
+    _idle = None
+    _remove_chroot()
+
+
+_spawning = set()
+
+
+async def _respawn():
+    try:
+        fresh = await asyncio.to_thread(_Worker)
+    except SkillError as e:
+        logger.error("Replacing a skill worker failed: %s", e)
+        return
+    if _idle is None:  # stopped meanwhile
+        fresh.kill()
+        return
+    _workers.append(fresh)
+    _idle.put_nowait(fresh)
+
+
+def _replace(worker: _Worker):
+    """Kill a worker and start its replacement in the background (also safe while being cancelled)."""
+    worker.kill()
+    if worker in _workers:
+        _workers.remove(worker)
+    if _idle is None:
+        return
+    _stats["restarts"] += 1
+    task = asyncio.create_task(_respawn())
+    _spawning.add(task)
+    task.add_done_callback(_spawning.discard)
+
+
+def _share(payload: Optional[bytes], segments: list):
+    if payload is None or len(payload) < SKILL_SHM_THRESHOLD or _CHROOTED:
+        return payload
+    shm = SharedMemory(create=True, size=len(payload))
+    segments.append(shm)
+    shm.buf[:len(payload)] = payload
+    _stats["shm_transfers"] += 1
+    return (shm.name, len(payload))
+
+
+async def run(code: str, arguments: dict, data: Optional[bytes] = None, timeout: Optional[float] = None,
+              cpu_seconds: Optional[int] = None, memory_mb: Optional[int] = None) -> Any:
+    """Run skill code's `run(arguments, data)` in a worker and return its (decoded) result."""
+    if not SKILL_EXECUTION:
+        raise SkillDisabled("Skill code execution is disabled (GPOST_SKILL_EXECUTION)")
+    key, bytecode = compile_code(code)
+    if _idle is None:
+        await start()
+    _stats["calls"] += 1
+    worker = await _idle.get()
+    segments: List[SharedMemory] = []
+    healthy = True
+    try:
+        message = [
+            key, None,
+            _share(jsoncodec.dumpb(arguments), segments),
+            _share(data, segments),
+            cpu_seconds or SKILL_CPU_SECONDS,
+            (memory_mb << 20) if memory_mb else 0,
+        ]
+        deadline = time.monotonic() + (timeout or SKILL_TIMEOUT)
+        for _ in range(2):
+            if key not in worker.known:
+                message[1] = bytecode
+            remaining = deadline - time.monotonic()
+            status, value = await asyncio.wait_for(worker.request(tuple(message)), max(remaining, 0))
+            worker.known.add(key)
+            if status != "reload":
+                break
+            worker.known.discard(key)  # evicted from the worker's LRU: send the bytecode again
+        worker.calls += 1
+    except asyncio.TimeoutError:
+        healthy = False
+        _stats["timeouts"] += 1
+        raise SkillTimeout(f"Skill timed out after {timeout or SKILL_TIMEOUT:g}s")
+    except BaseException:
+        # Cancelled or the worker died: its state (and pipe) can no longer be trusted
+        healthy = False
+        raise
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+        if not healthy or worker.calls >= SKILL_MAX_CALLS:
+            _replace(worker)
+        elif _idle is not None:
+            _idle.put_nowait(worker)
+        if len(worker.known) > SKILL_CODE_CACHE_SIZE:
+            worker.known.clear()
+
+    if status == "error":
+        _stats["errors"] += 1
+        raise SkillError(value)
+    return jsoncodec.loads(value)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "workers": len(_workers),
+        "idle_workers": _idle.qsize() if _idle is not None else 0,
+        "cached_bytecode": len(_bytecode),
+        "enabled": SKILL_EXECUTION,
+        "isolation": _workers[0].isolation if _workers else None,
+    }
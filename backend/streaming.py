@@ -0,0 +1,219 @@
+"""
+Chat stream events and the SSE writer.
+
+Producers (the orchestrator, the mock stream) yield typed ChatEvent objects.
+`Transcript` accumulates them in-process for persistence, and `sse_stream` is
+the only place they are turned into SSE frames. Consecutive `text`
+chunks are coalesced (`coalesce`, applied once per run by backend/runs.py)
+into one frame, flushed when the batch reaches COALESCE_MAX_CHARS or when
+COALESCE_WINDOW seconds have passed since its first chunk, so frame count
+tracks time rather than characters. Agent metadata is not repeated in text
+frames: it is carried by `start` and `handoff` events.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import AsyncGenerator, AsyncIterator, List, Optional, Tuple
+
+from . import jsoncodec
+
+COALESCE_MAX_CHARS = int(os.getenv("GPOST_SSE_COALESCE_CHARS", "256"))
+COALESCE_WINDOW = float(os.getenv("GPOST_SSE_COALESCE_WINDOW", "0.02"))
+
+_DONE = object()
+
+
+class ChatEvent:
+    """Base of the typed stream events; `event` is the SSE event name."""
+    __slots__ = ()
+    event = ""
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Thinking(ChatEvent):
+    __slots__ = ("text",)
+    event = "thinking"
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class AgentStart(ChatEvent):
+    __slots__ = ("agent_id", "agent_name")
+    event = "start"
+
+    def __init__(self, agent_id: Optional[str], agent_name: str):
+        self.agent_id = agent_id
+        self.agent_name = agent_name
+
+
+class TextChunk(ChatEvent):
+    __slots__ = ("chunk",)
+    event = "text"
+
+    def __init__(self, chunk: str):
+        self.chunk = chunk
+
+
+class Handoff(ChatEvent):
+    __slots__ = ("from_agent_id", "from_agent_name", "to_agent_id", "to_agent_name")
+    event = "handoff"
+
+    def __init__(self, from_agent_id: Optional[str], from_agent_name: str,
+                 to_agent_id: Optional[str], to_agent_name: str):
+        self.from_agent_id = from_agent_id
+        self.from_agent_name = from_agent_name
+        self.to_agent_id = to_agent_id
+        self.to_agent_name = to_agent_name
+
+
+class ToolCall(ChatEvent):
+    __slots__ = ("call_id", "tool_name", "arguments", "agent_id")
+    event = "tool_call"
+
+    def __init__(self, call_id: str, tool_name: str, arguments: str, agent_id: Optional[str]):
+        self.call_id = call_id
+        self.tool_name = tool_name
+        self.arguments = arguments
+        self.agent_id = agent_id
+
+
+class ToolResult(ChatEvent):
+    __slots__ = ("call_id", "tool_name", "content", "is_error", "elapsed_ms")
+    event = "tool_result"
+
+    def __init__(self, call_id: str, tool_name: str, content: str, is_error: bool, elapsed_ms: float):
+        self.call_id = call_id
+        self.tool_name = tool_name
+        self.content = content
+        self.is_error = is_error
+        self.elapsed_ms = elapsed_ms
+
+
+class End(ChatEvent):
+    __slots__ = ("message_id",)
+    event = "end"
+
+    def __init__(self, message_id: str = ""):
+        self.message_id = message_id
+
+
+class Snapshot(ChatEvent):
+    """The turn so far, for a resuming client whose missed events were dropped from the replay buffer."""
+    __slots__ = ("content", "thought_process")
+    event = "snapshot"
+
+    def __init__(self, content: str, thought_process: List[dict]):
+        self.content = content
+        self.thought_process = thought_process
+
+
+class Transcript:
+    """
+    Builds the assistant message of a turn from its events: the reply text,
+    and thought_process steps for reasoning traces and agent handoffs. Tool
+    calls and results are kept, with the time they happened, in `tool_events`
+    to be stored as their own tool_call / tool_result messages.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.thought_process: List[dict] = []
+        self.tool_events: List[tuple] = []
+
+    def add(self, ev: ChatEvent):
+        if isinstance(ev, (ToolCall, ToolResult)):
+            self.tool_events.append((datetime.utcnow(), ev))
+        elif isinstance(ev, TextChunk):
+            self.parts.append(ev.chunk)
+        elif isinstance(ev, Thinking):
+            self.thought_process.append({"step": "thinking", "text": ev.text})
+        elif isinstance(ev, Handoff):
+            self.thought_process.append({
+                "step": "handoff",
+                "text": f"{ev.from_agent_name} → {ev.to_agent_name}",
+                "from_agent_id": ev.from_agent_id,
+                "to_agent_id": ev.to_agent_id,
+            })
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+
+def sse_event(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    frame = f"event: {event}\ndata: {jsoncodec.dumps(data)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id else frame
+
+
+async def coalesce(
+    events: AsyncIterator[ChatEvent],
+    max_chars: int = COALESCE_MAX_CHARS,
+    window: float = COALESCE_WINDOW,
+) -> AsyncGenerator[ChatEvent, None]:
+    """Merge runs of `text` events; every other event flushes the pending batch."""
+    if max_chars <= 1 and window <= 0:
+        async for item in events:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in events:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_DONE)
+
+    pump_task = asyncio.create_task(pump())
+    buffer = []
+    size = 0
+    flush_at = 0.0
+    try:
+        while True:
+            if buffer:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, flush_at - loop.time()))
+                except asyncio.TimeoutError:
+                    yield TextChunk("".join(buffer))
+                    buffer, size = [], 0
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            if isinstance(item, TextChunk):
+                if not buffer:
+                    flush_at = loop.time() + window
+                buffer.append(item.chunk)
+                size += len(item.chunk)
+                if size >= max_chars:
+                    yield TextChunk("".join(buffer))
+                    buffer, size = [], 0
+                continue
+
+            if buffer:
+                yield TextChunk("".join(buffer))
+                buffer, size = [], 0
+            yield item
+
+        if buffer:
+            yield TextChunk("".join(buffer))
+    finally:
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)
+
+
+async def sse_stream(events: AsyncIterator[Tuple[str, ChatEvent]]) -> AsyncGenerator[str, None]:
+    """Serialize (event id, event) pairs (see runs.Run.stream) for StreamingResponse."""
+    async for event_id, ev in events:
+        yield sse_event(ev.event, ev.to_dict(), event_id)
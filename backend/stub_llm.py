@@ -0,0 +1,101 @@
+"""
+Minimal OpenAI-compatible server for local load testing.
+
+    uvicorn backend.stub_llm:app --port 9999
+
+Point a provider's base_url at http://127.0.0.1:9999/v1. Every model listed by
+GET /v1/models answers chat completions (streamed or not) with a fixed number
+of tokens; models whose id starts with "embed-" reject chat requests, which
+exercises the refresh probe's negative path. With STUB_TOOL_CALLS=N, a
+streamed request that offers tools (and does not already end with tool
+results) is answered with N parallel calls of its first tool instead.
+"""
+import asyncio
+import json
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MODEL_COUNT = int(os.getenv("STUB_MODEL_COUNT", "20"))
+TOKENS = int(os.getenv("STUB_TOKENS", "50"))
+TOKEN_DELAY = float(os.getenv("STUB_TOKEN_DELAY", "0.01"))
+FIRST_TOKEN_DELAY = float(os.getenv("STUB_FIRST_TOKEN_DELAY", "0.2"))
+TOOL_CALLS = int(os.getenv("STUB_TOOL_CALLS", "0"))
+TOOL_ARGUMENTS = os.getenv("STUB_TOOL_ARGUMENTS", '{"seconds": 0.2}')
+
+app = FastAPI(title="Stub LLM")
+
+
+def _model_ids():
+    return [f"stub-{i}" for i in range(MODEL_COUNT)] + ["embed-0"]
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [{"id": m, "object": "model", "created": 0, "owned_by": "stub"} for m in _model_ids()],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    if model.startswith("embed-"):
+        return JSONResponse(status_code=400, content={"error": {"message": f"{model} is not a chat model"}})
+
+    max_tokens = body.get("max_tokens") or TOKENS
+    tokens = [f"tok{i} " for i in range(min(TOKENS, max_tokens))]
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(FIRST_TOKEN_DELAY + TOKEN_DELAY * len(tokens))
+        return {
+            "id": "stub", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1},
+        }
+
+    tools = body.get("tools") or []
+    messages = body.get("messages") or []
+    if TOOL_CALLS and tools and not (messages and messages[-1].get("role") == "tool"):
+        return StreamingResponse(_tool_call_stream(model, created, tools[0]["function"]["name"]),
+                                 media_type="text/event-stream")
+
+    async def stream():
+        await asyncio.sleep(FIRST_TOKEN_DELAY)
+        for tok in tokens:
+            chunk = {
+                "id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_DELAY)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+async def _tool_call_stream(model: str, created: int, name: str):
+    await asyncio.sleep(FIRST_TOKEN_DELAY)
+    for i in range(TOOL_CALLS):
+        # Name first, arguments in a second delta, like the real API splits them
+        for delta in (
+            {"index": i, "id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": ""}},
+            {"index": i, "function": {"arguments": TOOL_ARGUMENTS}},
+        ):
+            chunk = {
+                "id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"tool_calls": [delta]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_DELAY)
+    chunk = {
+        "id": "stub", "object": "chat.completion.chunk", "created": created, "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}],
+    }
+    yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
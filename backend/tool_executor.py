@@ -0,0 +1,149 @@
+"""
+Tool execution for agent tool calls.
+
+A Tool row only describes a tool (name, JSON schema); the code that runs it is
+a handler registered here with `@register("<name>")`. Which handler a tool
+uses, and how it may be run, comes from the skill's binding of the tool
+(skills_tools.config):
+
+    {"handler": "fake.sleep", "timeout": 10, "max_concurrency": 2}
+
+"handler" defaults to the tool's name, "timeout" to GPOST_TOOL_TIMEOUT and
+"max_concurrency" to GPOST_TOOL_CONCURRENCY. The "skill.code" handler runs
+the binding skill's own code in skill_runner's process pool ("cpu_seconds"
+and "memory_mb" set its limits). All calls a model makes in one
+turn run concurrently in a TaskGroup; calls to the same tool share a
+semaphore of max_concurrency slots (process-wide), and each call is cut off at
+its timeout. `execute` emits a ToolCall event per call up front and a
+ToolResult event per call as it finishes; a failing call becomes an error
+result rather than failing the turn.
+"""
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from . import jsoncodec, skill_runner
+from .streaming import ChatEvent, ToolCall, ToolResult
+
+TOOL_TIMEOUT = float(os.getenv("GPOST_TOOL_TIMEOUT", "30"))
+TOOL_CONCURRENCY = int(os.getenv("GPOST_TOOL_CONCURRENCY", "4"))
+
+Handler = Callable[[dict, "ToolBinding"], Any]
+
+_handlers: Dict[str, Handler] = {}
+_semaphores: Dict[tuple, asyncio.Semaphore] = {}
+
+
+def register(name: str):
+    """Decorator registering a tool handler: `fn(arguments: dict, binding) -> result` (sync or async)."""
+    def decorator(fn: Handler) -> Handler:
+        _handlers[name] = fn
+        return fn
+    return decorator
+
+
+class ToolBinding:
+    """A tool as bound to an agent through one of its skills, detached from the ORM."""
+
+    def __init__(self, tool_id: str, name: str, spec: dict, config: Optional[dict] = None,
+                 credentials: Optional[dict] = None, skill_id: Optional[str] = None,
+                 skill_code: Optional[str] = None):
+        config = config or {}
+        self.tool_id = tool_id
+        self.name = name
+        self.spec = spec
+        self.skill_id = skill_id
+        self.skill_code = skill_code
+        self.handler = config.get("handler") or name
+        self.timeout = float(config.get("timeout") or TOOL_TIMEOUT)
+        self.max_concurrency = max(1, int(config.get("max_concurrency") or TOOL_CONCURRENCY))
+        self.config = config
+        self.credentials = credentials or {}
+
+
+def _semaphore(binding: ToolBinding) -> asyncio.Semaphore:
+    # Keyed by the limit too, so a config change takes effect without a restart
+    key = (binding.tool_id, binding.max_concurrency)
+    sem = _semaphores.get(key)
+    if sem is None:
+        sem = _semaphores[key] = asyncio.Semaphore(binding.max_concurrency)
+    return sem
+
+
+async def _call(handler: Handler, arguments: dict, binding: ToolBinding):
+    if inspect.iscoroutinefunction(handler):
+        return await handler(arguments, binding)
+    return await asyncio.to_thread(handler, arguments, binding)
+
+
+async def run_one(binding: Optional[ToolBinding], call: dict) -> ToolResult:
+    """Run one tool call ({"id", "name", "arguments"}) and report its outcome."""
+    started = time.perf_counter()
+
+    def result(content: str, is_error: bool = False) -> ToolResult:
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return ToolResult(call["id"], call["name"], content, is_error, elapsed_ms)
+
+    if binding is None:
+        return result(f"Unknown tool {call['name']!r}", True)
+    handler = _handlers.get(binding.handler)
+    if handler is None:
+        return result(f"No handler registered for {binding.handler!r}", True)
+    try:
+        arguments = jsoncodec.loads(call["arguments"] or "{}")
+    except jsoncodec.JSONDecodeError as e:
+        return result(f"Invalid arguments: {e}", True)
+    if not isinstance(arguments, dict):
+        return result("Invalid arguments: expected a JSON object", True)
+
+    try:
+        async with _semaphore(binding):
+            value = await asyncio.wait_for(_call(handler, arguments, binding), binding.timeout)
+    except asyncio.TimeoutError:
+        return result(f"{binding.name} timed out after {binding.timeout:g}s", True)
+    except Exception as e:
+        return result(f"{binding.name} failed: {e}", True)
+    return result(value if isinstance(value, str) else jsoncodec.dumps(value))
+
+
+async def execute(bindings: Dict[str, ToolBinding], calls: List[dict], agent_id: Optional[str],
+                  emit: Callable[[ChatEvent], Awaitable[None]]) -> List[ToolResult]:
+    """
+    Run a turn's tool calls concurrently. Events go to `emit` as they happen;
+    the results are returned in call order.
+    """
+    for call in calls:
+        await emit(ToolCall(call["id"], call["name"], call["arguments"], agent_id))
+
+    results: Dict[str, ToolResult] = {}
+
+    async def run(call: dict):
+        res = results[call["id"]] = await run_one(bindings.get(call["name"]), call)
+        await emit(res)
+
+    async with asyncio.TaskGroup() as tg:
+        for call in calls:
+            tg.create_task(run(call))
+    return [results[call["id"]] for call in calls]
+
+
+# --- Built-in handlers ---
+
+@register("fake.sleep")
+async def fake_sleep(arguments: dict, binding: ToolBinding):
+    """Local fake tool for tests and benchmarks: waits `seconds`, then echoes its arguments."""
+    await asyncio.sleep(float(arguments.get("seconds", 0.1)))
+    return {"tool": binding.name, "echo": arguments}
+
+
+@register("skill.code")
+async def skill_code(arguments: dict, binding: ToolBinding):
+    """Run the code of the skill the tool is bound through (see skill_runner)."""
+    if not binding.skill_code:
+        raise skill_runner.SkillError("the skill has no code")
+    return await skill_runner.run(
+        binding.skill_code, arguments, timeout=binding.timeout,
+        cpu_seconds=binding.config.get("cpu_seconds"), memory_mb=binding.config.get("memory_mb"),
+    )
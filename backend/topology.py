@@ -0,0 +1,222 @@
+"""
+Compiled session topologies.
+
+A session's graph_config is compiled once into adjacency lists, its entry node,
+topologically ordered stages and any cycles, and kept in an LRU keyed by
+(session id, graph_version). PUT /api/sessions/{id}/graph validates the graph
+and bumps graph_version, so an outdated entry is never hit again and simply
+ages out. The agent-only reduction the orchestrator needs (graph nodes without
+an agent folded away) is memoized on the compiled graph per set of agent
+nodes, so routing a chat turn costs a few dict lookups instead of a graph walk.
+"""
+import os
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+TOPOLOGY_CACHE_SIZE = int(os.getenv("GPOST_TOPOLOGY_CACHE_SIZE", "256"))
+
+
+class GraphError(ValueError):
+    """Raised by `validate` with every problem found in a graph."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+class Reduction:
+    """Agent-only view of a graph: edges between agent nodes and their run order."""
+
+    def __init__(self, succ: Dict[str, List[str]], preds: Dict[str, List[str]], order: List[str]):
+        self.succ = succ
+        self.preds = preds
+        self.order = order
+
+
+class CompiledGraph:
+    def __init__(self, nodes: List[dict], succ: Dict[str, List[str]], preds: Dict[str, List[str]],
+                 entry: Optional[str], stages: List[List[str]], cycles: List[List[str]], errors: List[str]):
+        self.nodes = nodes
+        self.succ = succ
+        self.preds = preds
+        self.entry = entry
+        self.stages = stages
+        self.cycles = cycles
+        self.errors = errors
+        self._reductions: Dict[FrozenSet[str], Reduction] = {}
+
+    def summary(self) -> dict:
+        return {"entry": self.entry, "stages": self.stages, "cycles": self.cycles}
+
+    def reduce(self, agent_nodes: Iterable[str]) -> Reduction:
+        """Edges between the given (agent) nodes, looking through the others."""
+        key = frozenset(agent_nodes)
+        reduction = self._reductions.get(key)
+        if reduction is None:
+            reduction = self._reductions[key] = self._reduce(key)
+        return reduction
+
+    def _reduce(self, keep: FrozenSet[str]) -> Reduction:
+        ordered = [n["id"] for n in self.nodes if n["id"] in keep]
+        position = {node_id: i for i, node_id in enumerate(ordered)}
+
+        # Nearest kept descendants of each node, looking through the rest
+        def kept_children(node_id: str) -> List[str]:
+            out, seen, stack = [], set(), list(self.succ.get(node_id, []))
+            while stack:
+                child = stack.pop()
+                if child in seen:
+                    continue
+                seen.add(child)
+                if child in keep:
+                    out.append(child)
+                else:
+                    stack.extend(self.succ.get(child, []))
+            return sorted(out, key=position.__getitem__)
+
+        succ = {node_id: kept_children(node_id) for node_id in ordered}
+        preds: Dict[str, List[str]] = {node_id: [] for node_id in ordered}
+        for a, children in succ.items():
+            for b in children:
+                preds[b].append(a)
+        order = [node_id for stage in _stages(ordered, succ, preds)[0] for node_id in stage]
+        return Reduction(succ, preds, order)
+
+
+def _parse_edges(edges, errors: List[str]) -> List[Tuple[str, str]]:
+    out = []
+    for e in edges or []:
+        if isinstance(e, (list, tuple)) and len(e) == 2:
+            out.append((e[0], e[1]))
+        elif isinstance(e, dict) and "from" in e and "to" in e:
+            out.append((e["from"], e["to"]))
+        else:
+            errors.append(f"malformed edge {e!r}")
+    return out
+
+
+def _stages(node_ids: List[str], succ: Dict[str, List[str]], preds: Dict[str, List[str]]):
+    """Kahn's algorithm by levels. Returns (stages, node ids never scheduled)."""
+    indegree = {node_id: len(preds[node_id]) for node_id in node_ids}
+    stage = [node_id for node_id in node_ids if indegree[node_id] == 0]
+    stages, scheduled = [], 0
+    while stage:
+        stages.append(stage)
+        scheduled += len(stage)
+        following = []
+        for node_id in stage:
+            for child in succ[node_id]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    following.append(child)
+        stage = following
+    blocked = [node_id for node_id in node_ids if indegree[node_id] > 0] if scheduled < len(node_ids) else []
+    return stages, blocked
+
+
+def _cycles(node_ids: List[str], succ: Dict[str, List[str]]) -> List[List[str]]:
+    """Strongly connected components that form a cycle (Tarjan, iterative)."""
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack = set()
+    cycles = []
+    for root in node_ids:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node_id, i = work.pop()
+            if i == 0:
+                index[node_id] = low[node_id] = len(index)
+                stack.append(node_id)
+                on_stack.add(node_id)
+            children = succ[node_id]
+            if i < len(children):
+                work.append((node_id, i + 1))
+                child = children[i]
+                if child not in index:
+                    work.append((child, 0))
+                elif child in on_stack:
+                    low[node_id] = min(low[node_id], index[child])
+                continue
+            if low[node_id] == index[node_id]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node_id:
+                        break
+                if len(component) > 1 or node_id in succ[node_id]:
+                    cycles.append(component[::-1])
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node_id])
+    return cycles
+
+
+def compile_graph(graph: Optional[dict]) -> CompiledGraph:
+    """
+    Compile a graph_config ({"nodes": [...], "edges": [...]}). Problems are
+    collected in `errors` rather than raised; malformed nodes and edges are
+    left out of the result.
+    """
+    graph = graph if isinstance(graph, dict) else {}
+    errors: List[str] = []
+    nodes, seen = [], set()
+    for n in graph.get("nodes") or []:
+        node_id = n.get("id") if isinstance(n, dict) else None
+        if not isinstance(node_id, str) or not node_id:
+            errors.append(f"node without an id: {n!r}")
+        elif node_id in seen:
+            errors.append(f"duplicate node id {node_id!r}")
+        else:
+            seen.add(node_id)
+            nodes.append(n)
+
+    node_ids = [n["id"] for n in nodes]
+    succ: Dict[str, List[str]] = {node_id: [] for node_id in node_ids}
+    preds: Dict[str, List[str]] = {node_id: [] for node_id in node_ids}
+    for a, b in _parse_edges(graph.get("edges"), errors):
+        if not (isinstance(a, str) and isinstance(b, str) and a in succ and b in succ):
+            errors.append(f"edge {a!r} -> {b!r} references an unknown node")
+        elif b not in succ[a]:
+            succ[a].append(b)
+            preds[b].append(a)
+
+    stages, blocked = _stages(node_ids, succ, preds)
+    cycles = _cycles(node_ids, succ) if blocked else []
+    for cycle in cycles:
+        errors.append("cycle " + " -> ".join(cycle + cycle[:1]))
+
+    entry = next((n["id"] for n in nodes if n.get("type") == "start"), None)
+    if entry is None and stages:
+        entry = stages[0][0]
+    return CompiledGraph(nodes, succ, preds, entry, stages, cycles, errors)
+
+
+def validate(compiled: CompiledGraph) -> CompiledGraph:
+    if compiled.errors:
+        raise GraphError(compiled.errors)
+    return compiled
+
+
+_cache: "OrderedDict[Tuple[str, int], CompiledGraph]" = OrderedDict()
+
+
+def get_compiled(session_id: str, version: int, graph: Optional[dict]) -> CompiledGraph:
+    """Compiled graph of a session at `version`, compiling `graph` on a miss."""
+    key = (session_id, version or 0)
+    compiled = _cache.get(key)
+    if compiled is not None:
+        _cache.move_to_end(key)
+        return compiled
+    return put_compiled(session_id, version, compile_graph(graph))
+
+
+def put_compiled(session_id: str, version: int, compiled: CompiledGraph) -> CompiledGraph:
+    _cache[(session_id, version or 0)] = compiled
+    while len(_cache) > TOPOLOGY_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return compiled
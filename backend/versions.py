@@ -0,0 +1,90 @@
+"""
+Version counters behind conditional GETs.
+
+Write routes call `bump(<scope>, ...)` after committing. Read routes derive
+an ETag from the counters of the scopes their response is built from
+(`etag`), before reading anything, and answer a matching If-None-Match
+with 304 (`matches`) without touching the database. Scopes are table names
+("agents", "skills", ...) or per-session ones (`session_scope`).
+
+Counters live in process memory, and ETags carry a per-process epoch, so a
+tag issued by an earlier process never matches. With
+GPOST_VERSIONS_REDIS_URL set (requires the `redis` package) the counters
+live in Redis and are shared by every uvicorn worker; without it, run a
+single worker, or a write handled by one worker goes unseen by the others.
+"""
+import hashlib
+import os
+import uuid
+from typing import Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: only needed to share counters between workers
+    aioredis = None
+
+VERSIONS_REDIS_URL = os.getenv("GPOST_VERSIONS_REDIS_URL", "")
+VERSIONS_KEY_PREFIX = os.getenv("GPOST_VERSIONS_KEY_PREFIX", "gpost:version:")
+
+_epoch = uuid.uuid4().hex[:12]
+_counters: Dict[str, int] = {}
+_redis = None
+
+
+def session_scope(session_id: str, part: str) -> str:
+    """Scope of one part of a session ("agents", ...), so e.g. new messages leave its agents' ETags alone."""
+    return f"session:{session_id}:{part}"
+
+
+async def bump(*scopes: str):
+    """Mark everything built from these scopes as changed (call after the commit)."""
+    if _redis is not None:
+        async with _redis.pipeline(transaction=False) as pipe:
+            for scope in scopes:
+                pipe.incr(VERSIONS_KEY_PREFIX + scope)
+            await pipe.execute()
+        return
+    for scope in scopes:
+        _counters[scope] = _counters.get(scope, 0) + 1
+
+
+async def etag(*scopes: str, variant: str = "") -> str:
+    """Strong ETag of the current versions of these scopes; `variant` tells resources apart (path and query)."""
+    if _redis is not None:
+        values = await _redis.mget([VERSIONS_KEY_PREFIX + scope for scope in scopes])
+        counts = [int(v or 0) for v in values]
+    else:
+        counts = [_counters.get(scope, 0) for scope in scopes]
+    key = ",".join(f"{scope}={count}" for scope, count in zip(scopes, counts)) + " " + variant
+    return f'"{_epoch}-{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Whether an If-None-Match header covers `tag` (weak comparison, as RFC 9110 asks for)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == tag:
+            return True
+    return False
+
+
+async def start():
+    """Connect to Redis when GPOST_VERSIONS_REDIS_URL is set (app startup)."""
+    global _redis, _epoch
+    if not VERSIONS_REDIS_URL:
+        return
+    if aioredis is None:
+        raise RuntimeError("GPOST_VERSIONS_REDIS_URL is set but the redis package is not installed")
+    _redis = aioredis.from_url(VERSIONS_REDIS_URL)
+    # Shared by the workers; reset along with the counters if Redis loses them
+    await _redis.set(VERSIONS_KEY_PREFIX + "epoch", _epoch, nx=True)
+    _epoch = (await _redis.get(VERSIONS_KEY_PREFIX + "epoch")).decode()
+
+
+async def stop():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -48,6 +48,7 @@ interface AgentDisplay {
   providerId: string | null
   modelLabel: string
   temperature: number
+  cacheCompletions: boolean
   prompt: string
   icon: React.ComponentType<{ className?: string }>
   skillIds: string[]
@@ -64,6 +65,7 @@ function toDisplayAgent(a: ApiAgent): AgentDisplay {
     providerId: a.model?.provider_id || null,
     modelLabel,
     temperature: a.temperature ?? 0.7,
+    cacheCompletions: a.cache_completions ?? false,
     prompt: a.system_prompt || "",
     icon: Icon,
     skillIds: a.skills?.map((s) => s.id) ?? [],
@@ -123,6 +125,7 @@ function AgentDetail({
   const [providerId, setProviderId] = useState<string>(agent.providerId || "")
   const [modelId, setModelId] = useState<string>(agent.modelId || "")
   const [temperature, setTemperature] = useState(agent.temperature)
+  const [cacheCompletions, setCacheCompletions] = useState(agent.cacheCompletions)
   const [prompt, setPrompt] = useState(agent.prompt)
   const [equippedSkills, setEquippedSkills] = useState<Set<string>>(new Set(agent.skillIds))
   const [saving, setSaving] = useState(false)
@@ -152,6 +155,7 @@ function AgentDetail({
         modelId: modelId || null,
         providerId: providerId || null,
         temperature,
+        cacheCompletions,
         prompt,
         skillIds: Array.from(equippedSkills),
       })
@@ -267,6 +271,20 @@ function AgentDetail({
             />
           </div>
 
+          <label className="flex items-center gap-2 text-xs text-foreground" htmlFor="cache-completions">
+            <input
+              id="cache-completions"
+              type="checkbox"
+              checked={cacheCompletions}
+              onChange={(e) => setCacheCompletions(e.target.checked)}
+              className="h-3.5 w-3.5 accent-primary"
+            />
+            Cache completions
+            <span className="text-[10px] text-muted-foreground">
+              {temperature === 0 ? "reuses replies to identical prompts" : "only at temperature 0"}
+            </span>
+          </label>
+
           <div className="flex flex-col gap-1.5">
             <label className="text-xs font-medium text-foreground" htmlFor="system-prompt">
               System Prompt
@@ -514,8 +532,8 @@ export function AgentMarketView() {
   const fetchData = useCallback(async () => {
     try {
       const [agentsRes, skillsRes, providersRes, llmsRes] = await Promise.all([
-        api.get<ApiAgent[]>("/api/agents"),
-        api.get<ApiSkill[]>("/api/skills"),
+        api.get<ApiAgent[]>("/api/agents?view=slim"),
+        api.get<ApiSkill[]>("/api/skills?view=slim"),
         api.get<Provider[]>("/api/providers"),
         api.get<LLM[]>("/api/llms"),
       ])
@@ -550,6 +568,7 @@ export function AgentMarketView() {
       role: updates.role ?? selectedAgent.role,
       model_id: updates.modelId ?? selectedAgent.modelId,
       temperature: updates.temperature ?? selectedAgent.temperature,
+      cache_completions: updates.cacheCompletions ?? selectedAgent.cacheCompletions,
       system_prompt: updates.prompt ?? selectedAgent.prompt,
       skill_ids: updates.skillIds ?? selectedAgent.skillIds,
     })
@@ -18,7 +18,7 @@ import {
   X,
 } from "lucide-react"
 import { cn } from "@/lib/utils"
-import { api, type Agent as ApiAgent, type Skill as ApiSkill, type SessionAgent, type Provider, type LLM } from "@/lib/api"
+import { api, type WorkspaceAgent, type Workspace, type Provider, type LLM } from "@/lib/api"
 
 const ROLE_ICONS: Record<string, React.ComponentType<{ className?: string; "aria-hidden"?: boolean }>> = {
   Orchestrator: Bot,
@@ -29,7 +29,7 @@ const ROLE_ICONS: Record<string, React.ComponentType<{ className?: string; "aria
   default: Bot,
 }
 
-function getIconForAgent(agent: ApiAgent) {
+function getIconForAgent(agent: { role?: string }) {
   const role = agent.role || ""
   return ROLE_ICONS[role] || ROLE_ICONS.default
 }
@@ -42,26 +42,29 @@ interface AgentDisplay {
   providerId: string | null
   modelLabel: string
   temperature: number
+  cacheCompletions: boolean
   prompt: string
   icon: React.ComponentType<{ className?: string; "aria-hidden"?: boolean }>
   status: "active" | "idle"
   skillIds: string[]
 }
 
-function toDisplayAgent(a: ApiAgent): AgentDisplay {
+function toDisplayAgent(a: WorkspaceAgent, llms: Record<string, LLM>): AgentDisplay {
   const Icon = getIconForAgent(a)
+  const model = a.model_id ? llms[a.model_id] : undefined
   return {
     id: a.id,
     name: a.name,
     role: a.role || "assistant",
     modelId: a.model_id || null,
-    providerId: a.model?.provider_id || null,
-    modelLabel: a.model?.remote_id || a.model_name || "—",
+    providerId: model?.provider_id || null,
+    modelLabel: model?.remote_id || a.model_name || "—",
     temperature: a.temperature ?? 0.7,
+    cacheCompletions: a.cache_completions ?? false,
     prompt: a.system_prompt || "",
     icon: Icon,
     status: "active",
-    skillIds: a.skills?.map((s) => s.id) ?? [],
+    skillIds: a.skill_ids,
   }
 }
 
@@ -239,6 +242,7 @@ function AgentConfig({
   const [providerId, setProviderId] = useState(agent.providerId || "")
   const [modelId, setModelId] = useState(agent.modelId || "")
   const [temperature, setTemperature] = useState(agent.temperature)
+  const [cacheCompletions, setCacheCompletions] = useState(agent.cacheCompletions)
   const [prompt, setPrompt] = useState(agent.prompt)
   const [equippedSkills, setEquippedSkills] = useState<Set<string>>(new Set(agent.skillIds))
   const [saving, setSaving] = useState(false)
@@ -261,6 +265,7 @@ function AgentConfig({
         modelId: modelId || null,
         providerId: providerId || null,
         temperature,
+        cacheCompletions,
         prompt,
         skillIds: Array.from(equippedSkills),
       })
@@ -355,6 +360,20 @@ function AgentConfig({
           </div>
         </div>
 
+        <label className="flex items-center gap-2 text-xs text-foreground" htmlFor="cache-completions">
+          <input
+            id="cache-completions"
+            type="checkbox"
+            checked={cacheCompletions}
+            onChange={(e) => setCacheCompletions(e.target.checked)}
+            className="h-3.5 w-3.5 accent-primary"
+          />
+          Cache completions
+          <span className="text-[10px] text-muted-foreground">
+            {temperature === 0 ? "reuses replies to identical prompts" : "only at temperature 0"}
+          </span>
+        </label>
+
         <div className="flex flex-col gap-1.5">
           <label className="text-xs font-medium text-foreground" htmlFor="system-prompt">
             System Prompt
@@ -447,18 +466,14 @@ export function AgentSidebar({ sessionId }: AgentSidebarProps) {
 
   const fetchData = useCallback(async () => {
     try {
-      const [agentsRes, skillsRes, providersRes, llmsRes] = await Promise.all([
-        api.get<ApiAgent[]>("/api/agents"),
-        api.get<ApiSkill[]>("/api/skills"),
-        api.get<Provider[]>("/api/providers"),
-        api.get<LLM[]>("/api/llms"),
-      ])
-      const agentsMap = new Map(agentsRes.map((a) => [a.id, toDisplayAgent(a)]))
+      // One request (revalidated with its ETag by the browser) instead of one per entity type
+      const ws = await api.get<Workspace>(sessionId ? `/api/sessions/${sessionId}/workspace` : "/api/workspace")
+      const agentsMap = new Map(Object.values(ws.agents).map((a) => [a.id, toDisplayAgent(a, ws.llms)]))
       setAllAgents(Array.from(agentsMap.values()))
-      setProviders(providersRes)
-      setLlms(llmsRes)
+      setProviders(Object.values(ws.providers))
+      setLlms(Object.values(ws.llms))
       setSkills(
-        skillsRes.map((s) => ({
+        Object.values(ws.skills).map((s) => ({
           id: s.id,
           name: s.name,
           icon: BUILTIN_SKILL_ICONS[s.name.toLowerCase().replace(/\s+/g, "-")] || Wrench,
@@ -466,8 +481,7 @@ export function AgentSidebar({ sessionId }: AgentSidebarProps) {
       )
 
       if (sessionId) {
-        const sessAgents = await api.get<SessionAgent[]>(`/api/sessions/${sessionId}/agents`)
-        const resolved = sessAgents
+        const resolved = ws.session_agents
           .map((sa) => agentsMap.get(sa.original_agent_id))
           .filter((a): a is AgentDisplay => a != null)
         setSessionAgents(resolved)
@@ -509,6 +523,7 @@ export function AgentSidebar({ sessionId }: AgentSidebarProps) {
       role: selectedAgent.role,
       model_id: updates.modelId ?? selectedAgent.modelId,
       temperature: updates.temperature ?? selectedAgent.temperature,
+      cache_completions: updates.cacheCompletions ?? selectedAgent.cacheCompletions,
       system_prompt: updates.prompt ?? selectedAgent.prompt,
       skill_ids: updates.skillIds ?? selectedAgent.skillIds,
     })
@@ -3,7 +3,7 @@
 import { useState, useEffect, useCallback } from "react"
 import { Eye, EyeOff, CheckCircle2, AlertCircle, Plus, Trash2, RefreshCw } from "lucide-react"
 import { cn } from "@/lib/utils"
-import { api, type Provider, type LLM } from "@/lib/api"
+import { api, type Provider, type LLM, type ProbeJob } from "@/lib/api"
 
 interface ProviderDisplay {
   id: string
@@ -67,7 +67,11 @@ function ProviderCard({
   const handleRefreshLlms = async () => {
     setRefreshing(true)
     try {
-      await api.post(`/api/providers/${provider.id}/models/refresh`, {})
+      let job = await api.post<ProbeJob>(`/api/providers/${provider.id}/models/refresh`, {})
+      while (job.status === "pending" || job.status === "running") {
+        await new Promise((r) => setTimeout(r, 1000))
+        job = await api.get<ProbeJob>(`/api/providers/${provider.id}/models/refresh/${job.job_id}`)
+      }
       await fetchLlms()
     } catch {
       setLlms([])
@@ -1,10 +1,13 @@
 "use client"
 
 import { useState, useRef, useEffect, useCallback } from "react"
-import { Send, GitGraph, Bot, ChevronDown } from "lucide-react"
+import { Send, Square, GitGraph, Bot, ChevronDown } from "lucide-react"
 import { cn } from "@/lib/utils"
 import { api, type SessionDetail, type Message } from "@/lib/api"
 
+/** Reconnects to a running turn after its stream drops */
+const MAX_RESUME_ATTEMPTS = 3
+
 type MessageType = "user" | "agent" | "system" | "thought"
 
 interface DisplayMessage {
@@ -35,11 +38,29 @@ function thoughtContentFromMessage(m: Message): string | undefined {
   return undefined
 }
 
+function toolTrace(m: Message): string {
+  if (m.msg_type === "tool_result") return `← ${m.content}`
+  try {
+    const call = JSON.parse(m.content)
+    return `→ ${call.name}(${call.arguments || ""})`
+  } catch {
+    return `→ ${m.content}`
+  }
+}
+
 function messagesToDisplay(messages: Message[]): DisplayMessage[] {
   const out: DisplayMessage[] = []
   for (const m of messages) {
     const thought = thoughtContentFromMessage(m)
-    if (m.role === "user") {
+    if (m.msg_type === "tool_call" || m.msg_type === "tool_result") {
+      // Consecutive tool messages of a turn share one trace block
+      const last = out[out.length - 1]
+      if (last?.id.endsWith("-tools")) {
+        last.thoughtContent += "\n" + toolTrace(m)
+      } else {
+        out.push({ id: m.id + "-tools", type: "thought", content: "", thoughtContent: toolTrace(m) })
+      }
+    } else if (m.role === "user") {
       out.push({ id: m.id, type: "user", content: m.content })
     } else if (m.role === "assistant") {
       if (thought) {
@@ -157,6 +178,22 @@ export function ChatArea({ sessionId, sessionTitle, onViewTopology }: ChatAreaPr
     fetchSession()
   }, [fetchSession])
 
+  /** After a turn: append only the messages saved after the last one shown */
+  const fetchNewMessages = async (replyId: string) => {
+    const known = session?.messages
+    const lastId = known?.length ? known[known.length - 1].id : null
+    if (!sessionId || !lastId) return fetchSession()
+    try {
+      const newer = await api.get<Message[]>(
+        `/api/sessions/${sessionId}/messages?since=${encodeURIComponent(lastId)}`
+      )
+      if (replyId && !newer.some((m) => m.id === replyId)) return fetchSession()
+      setSession((prev) => (prev && prev.id === sessionId ? { ...prev, messages: [...prev.messages, ...newer] } : prev))
+    } catch {
+      await fetchSession()
+    }
+  }
+
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" })
   }, [session?.messages, streamBlocks])
@@ -171,89 +208,135 @@ export function ChatArea({ sessionId, sessionTitle, onViewTopology }: ChatAreaPr
       setPendingUserMsg(msg)
       setStreamBlocks([])
 
-      const res = await api.chatStream(sessionId, msg)
+      let res = await api.chatStream(sessionId, msg)
       if (!res.ok) {
         const err = await res.text()
         throw new Error(err)
       }
 
-      const reader = res.body?.getReader()
       const decoder = new TextDecoder()
-      let buffer = ""
-      let currentEvent = ""
       let thoughtContent = ""
       let agentBlocks: StreamBlock[] = []
       let currentBlock: StreamBlock | null = null
-
-      if (reader) {
-        while (true) {
-          const { done, value } = await reader.read()
-          if (done) break
-          buffer += decoder.decode(value, { stream: true })
-          const lines = buffer.split("\n\n")
-          buffer = lines.pop() || ""
-
-          for (const chunk of lines) {
-            let eventType = ""
-            let dataStr = ""
-            for (const line of chunk.split("\n")) {
-              if (line.startsWith("event: ")) eventType = line.slice(7).trim()
-              if (line.startsWith("data: ")) dataStr = line.slice(6).trim()
-            }
-            if (!eventType || !dataStr) continue
-
-            try {
-              const data = JSON.parse(dataStr)
-              switch (eventType) {
-                case "thinking":
-                  thoughtContent += (thoughtContent ? "\n" : "") + (data.text || "")
-                  setStreamBlocks([
-                    ...agentBlocks,
-                    { type: "thought", thoughtContent, content: "" },
-                  ])
-                  break
-                case "text":
-                  const chunk = data.chunk || ""
-                  const agentName = data.agent_name || "Assistant"
-                  if (!currentBlock || currentBlock.agentName !== agentName) {
-                    if (currentBlock) agentBlocks.push(currentBlock)
-                    currentBlock = { type: "agent", agentName, content: chunk }
-                  } else {
-                    currentBlock.content += chunk
-                  }
-                  setStreamBlocks([
-                    ...(thoughtContent ? [{ type: "thought" as const, thoughtContent, content: "" }] : []),
-                    ...agentBlocks,
-                    ...(currentBlock ? [currentBlock] : []),
-                  ])
-                  break
-                case "handoff":
-                  if (currentBlock) {
-                    agentBlocks.push(currentBlock)
-                    currentBlock = null
-                  }
-                  agentBlocks.push({
-                    type: "handoff",
-                    content: `${data.from_agent_name || "Agent"} → ${data.to_agent_name || "Agent"}`,
-                  })
-                  setStreamBlocks([
-                    ...(thoughtContent ? [{ type: "thought" as const, thoughtContent, content: "" }] : []),
-                    ...agentBlocks,
-                  ])
-                  break
-                case "end":
-                  break
+      // Text frames may omit agent fields; they belong to the agent set by start/handoff
+      let currentAgentName = "Assistant"
+      // A dropped stream is resumed from the last event seen (the turn keeps running server-side)
+      let lastEventId = ""
+      let ended = false
+      let replyId = ""
+
+      for (let attempt = 0; ; attempt++) {
+        let buffer = ""
+        try {
+          const reader = res.body?.getReader()
+          while (reader) {
+            const { done, value } = await reader.read()
+            if (done) break
+            buffer += decoder.decode(value, { stream: true })
+            const lines = buffer.split("\n\n")
+            buffer = lines.pop() || ""
+
+            for (const chunk of lines) {
+              let eventType = ""
+              let dataStr = ""
+              for (const line of chunk.split("\n")) {
+                if (line.startsWith("id: ")) lastEventId = line.slice(4).trim()
+                if (line.startsWith("event: ")) eventType = line.slice(7).trim()
+                if (line.startsWith("data: ")) dataStr = line.slice(6).trim()
+              }
+              if (!eventType || !dataStr) continue
+
+              try {
+                const data = JSON.parse(dataStr)
+                switch (eventType) {
+                  case "thinking":
+                    thoughtContent += (thoughtContent ? "\n" : "") + (data.text || "")
+                    setStreamBlocks([
+                      ...agentBlocks,
+                      { type: "thought", thoughtContent, content: "" },
+                    ])
+                    break
+                  case "tool_call":
+                  case "tool_result":
+                    thoughtContent += (thoughtContent ? "\n" : "") + (eventType === "tool_call"
+                      ? `→ ${data.tool_name}(${data.arguments || ""})`
+                      : `← ${data.tool_name}${data.is_error ? " failed" : ""}: ${data.content}`)
+                    setStreamBlocks([
+                      { type: "thought", thoughtContent, content: "" },
+                      ...agentBlocks,
+                      ...(currentBlock ? [currentBlock] : []),
+                    ])
+                    break
+                  case "start":
+                    currentAgentName = data.agent_name || currentAgentName
+                    break
+                  case "text":
+                    const chunk = data.chunk || ""
+                    const agentName = data.agent_name || currentAgentName
+                    if (!currentBlock || currentBlock.agentName !== agentName) {
+                      if (currentBlock) agentBlocks.push(currentBlock)
+                      currentBlock = { type: "agent", agentName, content: chunk }
+                    } else {
+                      currentBlock.content += chunk
+                    }
+                    setStreamBlocks([
+                      ...(thoughtContent ? [{ type: "thought" as const, thoughtContent, content: "" }] : []),
+                      ...agentBlocks,
+                      ...(currentBlock ? [currentBlock] : []),
+                    ])
+                    break
+                  case "handoff":
+                    currentAgentName = data.to_agent_name || currentAgentName
+                    if (currentBlock) {
+                      agentBlocks.push(currentBlock)
+                      currentBlock = null
+                    }
+                    agentBlocks.push({
+                      type: "handoff",
+                      content: `${data.from_agent_name || "Agent"} → ${data.to_agent_name || "Agent"}`,
+                    })
+                    setStreamBlocks([
+                      ...(thoughtContent ? [{ type: "thought" as const, thoughtContent, content: "" }] : []),
+                      ...agentBlocks,
+                    ])
+                    break
+                  case "snapshot":
+                    // Resumed past the server's replay buffer: the turn so far replaces what is shown
+                    thoughtContent = (data.thought_process || []).map((step: { text?: string }) => step.text || "").join("\n")
+                    agentBlocks = []
+                    currentBlock = { type: "agent", agentName: currentAgentName, content: data.content || "" }
+                    setStreamBlocks([
+                      ...(thoughtContent ? [{ type: "thought" as const, thoughtContent, content: "" }] : []),
+                      currentBlock,
+                    ])
+                    break
+                  case "end":
+                    ended = true
+                    replyId = data.message_id || ""
+                    break
+                }
+              } catch {
+                /* ignore parse errors */
               }
-            } catch {
-              /* ignore parse errors */
             }
           }
+        } catch {
+          /* connection dropped: resumed below */
+        }
+        if (ended || !lastEventId || attempt >= MAX_RESUME_ATTEMPTS) break
+        await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)))
+        try {
+          res = await api.chatResume(sessionId, lastEventId)
+        } catch {
+          continue
         }
+        // 204/410: the turn is over and saved; the session reload below shows it
+        if (!res.ok || res.status === 204) break
       }
 
       setPendingUserMsg(null)
       setStreamBlocks([])
-      await fetchSession()
+      await fetchNewMessages(replyId)
     } catch (e) {
       setError(e instanceof Error ? e.message : "Failed to send message")
       setPendingUserMsg(null)
@@ -362,6 +445,15 @@ export function ChatArea({ sessionId, sessionTitle, onViewTopology }: ChatAreaPr
               }
             }}
           />
+          {sending && (
+            <button
+              onClick={() => sessionId && api.chatStop(sessionId).catch(() => {})}
+              className="flex h-10 w-10 items-center justify-center rounded-lg border border-border bg-card text-foreground transition-colors hover:bg-muted"
+              aria-label="Stop generating"
+            >
+              <Square className="h-4 w-4" aria-hidden="true" />
+            </button>
+          )}
           <button
             onClick={handleSend}
             disabled={!inputValue.trim() || sending}
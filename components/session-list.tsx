@@ -3,7 +3,7 @@
 import { useState, useEffect, useCallback } from "react"
 import { Search, Plus } from "lucide-react"
 import { cn } from "@/lib/utils"
-import { api, type Session } from "@/lib/api"
+import { api, type Session, type SearchHit } from "@/lib/api"
 import { formatDistanceToNow } from "date-fns"
 
 interface SessionListProps {
@@ -16,6 +16,8 @@ export function SessionList({ activeSessionId, onSessionSelect }: SessionListPro
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [searchQuery, setSearchQuery] = useState("")
+  // Sessions whose messages match the query (server-side full-text search)
+  const [matchedSessionIds, setMatchedSessionIds] = useState<Set<string>>(new Set())
   const [creating, setCreating] = useState(false)
 
   const fetchSessions = useCallback(async () => {
@@ -61,8 +63,32 @@ export function SessionList({ activeSessionId, onSessionSelect }: SessionListPro
     }
   }
 
-  const filtered = sessions.filter((s) =>
-    (s.title || "").toLowerCase().includes(searchQuery.toLowerCase())
+  useEffect(() => {
+    const q = searchQuery.trim()
+    if (!q) {
+      setMatchedSessionIds(new Set())
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      try {
+        const hits = await api.get<SearchHit[]>(
+          `/api/search?kind=messages&limit=200&q=${encodeURIComponent(q)}`
+        )
+        if (!cancelled) setMatchedSessionIds(new Set(hits.map((h) => h.session_id || "")))
+      } catch {
+        if (!cancelled) setMatchedSessionIds(new Set())
+      }
+    }, 250)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [searchQuery])
+
+  const filtered = sessions.filter(
+    (s) =>
+      (s.title || "").toLowerCase().includes(searchQuery.toLowerCase()) || matchedSessionIds.has(s.id)
   )
 
   if (loading) {
@@ -34,6 +34,17 @@ export const api = {
       body: JSON.stringify({ session_id: sessionId, message }),
     })
   },
+  /** Reattach to the session's running turn after a dropped stream (204: nothing running) */
+  chatResume: (sessionId: string, lastEventId: string): Promise<Response> =>
+    fetch(`${API_BASE}/api/chat/stream/${sessionId}`, {
+      headers: { "Last-Event-ID": lastEventId },
+    }),
+  /** Cancel the session's running turn; its partial reply is saved */
+  chatStop: (sessionId: string) =>
+    request<{ status: string; message_ids: string[] }>("/api/chat/stop", {
+      method: "POST",
+      body: JSON.stringify({ session_id: sessionId }),
+    }),
   put: <T>(path: string, body: unknown) =>
     request<T>(path, { method: "PUT", body: JSON.stringify(body) }),
   patch: <T>(path: string, body: unknown) =>
@@ -59,7 +70,8 @@ export interface Skill {
   prompt?: string
   code?: string
   created_at: string
-  tools: Tool[]
+  /** Omitted by `?view=slim` listings */
+  tools?: Tool[]
 }
 
 export interface Agent {
@@ -73,6 +85,8 @@ export interface Agent {
   model_name?: string
   model?: LLM
   temperature?: number
+  /** Reuse completions of identical requests; only applies at temperature 0 */
+  cache_completions?: boolean
   system_prompt?: string
   created_at: string
   skills: Skill[]
@@ -93,6 +107,19 @@ export interface LLM {
   is_llm: boolean
 }
 
+export interface ProbeJob {
+  job_id: string
+  provider_id: string
+  status: "pending" | "running" | "completed" | "partial" | "failed"
+  total: number
+  probed: number
+  cached: number
+  models: string[]
+  error?: string
+  started_at: string
+  finished_at?: string
+}
+
 export interface Message {
   id: string
   session_id: string
@@ -128,6 +155,40 @@ export interface SessionDetail extends Session {
   session_agents: SessionAgent[]
 }
 
+/** Normalized sidebar payload: entities by id, referencing each other by id */
+export interface WorkspaceAgent extends Omit<Agent, "skills" | "model"> {
+  skill_ids: string[]
+}
+
+export interface WorkspaceSkill {
+  id: string
+  name: string
+  description?: string
+  tool_ids: string[]
+}
+
+export interface Workspace {
+  session_id?: string
+  agents: Record<string, WorkspaceAgent>
+  skills: Record<string, WorkspaceSkill>
+  tools: Record<string, Tool>
+  providers: Record<string, Provider>
+  llms: Record<string, LLM>
+  session_agents: Omit<SessionAgent, "session_id" | "memory_context">[]
+}
+
+export interface SearchHit {
+  kind: "message" | "agent" | "skill"
+  id: string
+  /** Agent / skill name */
+  title?: string
+  snippet: string
+  score: number
+  session_id?: string
+  role?: string
+  created_at?: string
+}
+
 export interface GraphNode {
   id: string
   label?: string